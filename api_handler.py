@@ -1,9 +1,17 @@
 import aiohttp
 import asyncio
-import requests
-from bs4 import BeautifulSoup
+import heapq
+import itertools
+import os
+import random
+import re
+import time
+from collections import OrderedDict
+from bs4 import BeautifulSoup, SoupStrainer
 
-from clan_war import reset_war_reminder_flags, room_storage
+import json_codec
+from coc_models import War, ClanMember, CapitalRaid, LeagueGroup
+from database import get_cached_cwl_war, save_cached_cwl_war, run_db
 
 
 # === Inicializace hlaviček a základní URL ===
@@ -15,165 +23,619 @@ def get_headers(config: dict) -> dict:
         "Authorization": f"Bearer {config['COC_API_KEY']}"
     }
 
-BASE_URL = "https://cocproxy.royaleapi.dev/v1"
+# Základní URL lze přesměrovat (např. na lokální mock_coc_api.py) přes COC_API_BASE_URL
+BASE_URL = os.getenv("COC_API_BASE_URL", "https://cocproxy.royaleapi.dev/v1")
+REQUEST_TIMEOUT = 10                # výchozí timeout jednoho požadavku (s)
+POOL_LIMIT = 20                     # max. počet otevřených spojení v poolu
+POOL_LIMIT_PER_HOST = 10            # max. počet spojení na jednoho hosta
+DNS_CACHE_TTL = 300                 # jak dlouho držet DNS záznam (s)
+KEEPALIVE_TIMEOUT = 60              # jak dlouho držet nečinné spojení otevřené (s)
+MAX_CACHE_ENTRIES = 128             # max. počet endpointů držených v cache odpovědí
+DEFAULT_RATE = 10.0                 # výchozí počet požadavků za sekundu (token bucket)
+DEFAULT_BURST = 20                  # kapacita bucketu (kolik požadavků může projít naráz)
+MAX_RETRIES = 3                     # kolikrát zopakovat požadavek po 429/5xx/timeoutu
+BACKOFF_BASE = 1.0                  # základ exponenciálního backoffu (s)
+BACKOFF_MAX = 30.0                  # horní strop jednoho čekání (s)
+
+CLASH_NINJA_URL = "https://www.clash.ninja/guides/when-are-the-next-ingame-events"
+EVENTS_CACHE_TTL = 30 * 60          # rozpis eventů se mění jen párkrát denně (s)
+
+try:
+    import lxml  # noqa: F401 – rychlejší HTML parser, pokud je nainstalovaný
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+# Priority požadavků – nižší číslo je obslouženo dřív
+PRIORITY_INTERACTIVE = 0            # slash příkazy, na které čeká uživatel
+PRIORITY_BACKGROUND = 1             # pravidelné dotazy scheduleru
+
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+_revision_counter = itertools.count(1)
+
+
+class ApiResponse:
+    """Výsledek jednoho GET požadavku na CoC API."""
+    __slots__ = ("status", "data", "text", "endpoint", "revision", "from_cache")
+
+    def __init__(self, status: int, data: dict | None = None, text: str = "",
+                 endpoint: str | None = None, revision: int | None = None, from_cache: bool = False):
+        self.status = status
+        self.data = data
+        self.text = text
+        self.endpoint = endpoint
+        self.revision = revision        # číslo verze obsahu endpointu (mění se jen při změně dat)
+        self.from_cache = from_cache    # True = odpověď z paměti nebo 304 Not Modified
+
+
+class ApiPayload(dict):
+    """
+    JSON odpověď z API (obyčejný dict) doplněná o endpoint a revizi obsahu.
+    Díky revizi pozná konzument (viz ChangeTracker), že se data od minula nezměnila.
+    """
+    __slots__ = ("endpoint", "revision")
+
+    def __init__(self, data: dict, endpoint: str | None = None, revision: int | None = None):
+        super().__init__(data)
+        self.endpoint = endpoint
+        self.revision = revision
+
+
+class ChangeTracker:
+    """
+    Pamatuje si, kterou revizi kterého endpointu už daný konzument zpracoval.
+    Každý handler má vlastní instanci, takže si navzájem „nespotřebují“ změny.
+    """
+
+    def __init__(self):
+        self._seen: dict[str, int] = {}
+
+    def is_unchanged(self, payload) -> bool:
+        """True, pokud konzument tuto revizi dat už zpracoval."""
+        endpoint = getattr(payload, "endpoint", None)
+        revision = getattr(payload, "revision", None)
+        if endpoint is None or revision is None:
+            return False
+        return self._seen.get(endpoint) == revision
+
+    def mark_seen(self, payload):
+        """Zaznamená revizi jako zpracovanou (volat až po úspěšném zpracování)."""
+        endpoint = getattr(payload, "endpoint", None)
+        revision = getattr(payload, "revision", None)
+        if endpoint is not None and revision is not None:
+            self._seen[endpoint] = revision
+
+
+class _CacheEntry:
+    __slots__ = ("data", "etag", "expires_at", "revision")
+
+    def __init__(self, data: dict, etag: str | None, expires_at: float, revision: int):
+        self.data = data
+        self.etag = etag
+        self.expires_at = expires_at
+        self.revision = revision
+
+
+def _parse_max_age(headers) -> int:
+    """Vrátí max-age z hlavičky Cache-Control (0 pokud chybí nebo je no-cache/no-store)."""
+    cache_control = headers.get("Cache-Control", "")
+    if "no-cache" in cache_control or "no-store" in cache_control:
+        return 0
+    match = _MAX_AGE_RE.search(cache_control)
+    return int(match.group(1)) if match else 0
+
+
+class TokenBucket:
+    """
+    Token bucket sdílený všemi požadavky na CoC API.
+    Doplňuje `rate` tokenů za sekundu až do `capacity`. Když tokeny dojdou, čekající
+    požadavky se řadí podle priority (interaktivní před scheduler) a pak podle pořadí příchodu.
+    Po 429 lze bucket na čas úplně zastavit (`pause`) podle Retry-After.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []   # halda (priorita, pořadí, future)
+        self._seq = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+        self.throttled = 0              # kolikrát musel požadavek čekat na token
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def level(self) -> float:
+        """Aktuální počet dostupných tokenů."""
+        self._refill()
+        return self._tokens
+
+    def pause(self, seconds: float):
+        """Zastaví výdej tokenů na `seconds` sekund (např. podle Retry-After)."""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    async def acquire(self, priority: int = PRIORITY_BACKGROUND):
+        """Počká na volný token; požadavky s vyšší prioritou předbíhají ve frontě."""
+        self._refill()
+        if not self._waiters and self._tokens >= 1 and time.monotonic() >= self._blocked_until:
+            self._tokens -= 1
+            return
+
+        self.throttled += 1
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._schedule()
+        await future
+
+    def _schedule(self):
+        if self._timer is not None or not self._waiters:
+            return
+        now = time.monotonic()
+        delay = max(self._blocked_until - now, (1 - self._tokens) / self.rate, 0)
+        self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    def _dispatch(self):
+        self._timer = None
+        self._refill()
+        while self._waiters and self._tokens >= 1 and time.monotonic() >= self._blocked_until:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():  # volající mezitím zrušen
+                continue
+            self._tokens -= 1
+            future.set_result(None)
+        self._schedule()
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Exponenciální backoff s jitterem (náhodně mezi polovinou a celou hodnotou)."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt))
+    return random.uniform(delay / 2, delay)
+
+
+def _parse_retry_after(headers) -> float | None:
+    try:
+        return max(float(headers.get("Retry-After")), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class CocApiClient:
+    """
+    Dlouho žijící klient pro Clash of Clans API.
+    Drží jednu aiohttp session s keep-alive poolem spojení, takže se TCP+TLS
+    handshake neplatí při každém požadavku znovu. Vlastní ho MyBot a zavírá se při vypnutí bota.
+    """
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.base_url = (config.get("COC_API_BASE_URL") or BASE_URL).rstrip("/")
+        self._session: aiohttp.ClientSession | None = None
+        self._cache: dict[str, _CacheEntry] = {}
+        rate = float(config.get("COC_API_RATE") or DEFAULT_RATE)
+        self.bucket = TokenBucket(rate=rate, capacity=max(DEFAULT_BURST, int(rate)))
+        self.cache_hits = 0             # odpovědi obsloužené z paměti (čerstvé dle max-age)
+        self.not_modified = 0           # revalidace zakončené 304 Not Modified
+        self.rate_limited = 0           # kolikrát API vrátilo 429
+        self.retries = 0                # počet opakovaných pokusů (429/5xx/timeout)
+        self._inflight: dict[tuple[str, bool, int], asyncio.Future] = {}   # (endpoint, cache, priorita) -> výsledek
+        self.coalesced = 0              # požadavky obsloužené přes již běžící dotaz
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """Vrátí sdílenou session, při prvním volání (nebo po zavření) ji vytvoří."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=POOL_LIMIT,
+                limit_per_host=POOL_LIMIT_PER_HOST,
+                ttl_dns_cache=DNS_CACHE_TTL,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+            )
+        return self._session
+
+    async def _send(self, endpoint: str, headers: dict, timeout: float, priority: int):
+        """
+        Odešle GET přes token bucket. Při 429 (s ohledem na Retry-After), 5xx a timeoutu
+        zkouší znovu s exponenciálním backoffem a jitterem.
+        Vrací (status, hlavičky, data, text); po vyčerpání pokusů vrátí poslední chybový status
+        nebo propustí poslední síťovou výjimku.
+        """
+        session = await self.get_session()
+        for attempt in range(MAX_RETRIES + 1):
+            await self.bucket.acquire(priority)
+            try:
+                async with session.get(f"{self.base_url}/{endpoint}", headers=headers, timeout=timeout) as resp:
+                    retryable = resp.status == 429 or resp.status >= 500
+                    if not retryable or attempt == MAX_RETRIES:
+                        if resp.status == 200:
+                            return resp.status, resp.headers, json_codec.loads(await resp.read()), ""
+                        return resp.status, resp.headers, None, await resp.text()
+
+                    delay = _backoff_delay(attempt)
+                    if resp.status == 429:
+                        self.rate_limited += 1
+                        delay = _parse_retry_after(resp.headers) or delay
+                        self.bucket.pause(delay)
+                        print(f"⚠️ [api_handler] Rate limit (429) pro {endpoint}, další pokus za {delay:.1f}s")
+                    else:
+                        print(f"⚠️ [api_handler] Chyba {resp.status} pro {endpoint}, další pokus za {delay:.1f}s")
+            except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                delay = _backoff_delay(attempt)
+                print(f"⚠️ [api_handler] {type(e).__name__} pro {endpoint}, další pokus za {delay:.1f}s")
+
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    async def get(self, endpoint: str, timeout: float = REQUEST_TIMEOUT, cache: bool = False,
+                  priority: int = PRIORITY_BACKGROUND) -> ApiResponse:
+        """
+        Provede GET na `base_url/endpoint` přes sdílený pool a rate limiter.
+        Při 200 vrací naparsovaný JSON v `data`, jinak jen status (a text odpovědi).
+        S `cache=True` respektuje Cache-Control/ETag: čerstvý záznam vrátí z paměti,
+        prošlý revaliduje přes If-None-Match a při 304 vrátí uložená data se stejnou revizí.
+        `priority` určuje pořadí ve frontě rate limiteru (PRIORITY_INTERACTIVE má přednost).
+        Souběžné požadavky na stejný endpoint sdílí jeden síťový dotaz (single-flight), ale jen
+        se stejným `cache` a `priority`: interaktivní požadavek tak nikdy nečeká ve frontě za
+        dotazem scheduleru a odpověď bez cache (bez revize) nedostane volající s `cache=True`.
+        Síťové výjimky (timeout, ClientError) propouští volajícímu.
+        """
+        entry = self._cache.get(endpoint) if cache else None
+        if entry is not None and time.monotonic() < entry.expires_at:
+            self.cache_hits += 1
+            return ApiResponse(200, entry.data, endpoint=endpoint, revision=entry.revision, from_cache=True)
+
+        # Stejný požadavek už letí → počkáme na jeho výsledek místo dalšího round-tripu
+        key = (endpoint, cache, priority)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise  # zrušen byl tento volající, ne sdílený dotaz
+                # Zrušil se jen úkol, který dotaz vedl – zkusíme to znovu sami
+                # (případně se připojíme k novému dotazu jiného volajícího)
+                return await self.get(endpoint, timeout, cache, priority)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            resp = await self._fetch(endpoint, entry, timeout, cache, priority)
+        except asyncio.CancelledError:
+            # Čekající volající nebyli zrušeni – uvolníme endpoint a oni si dotaz zopakují
+            self._inflight.pop(key, None)
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # označí výjimku jako převzatou, i když nikdo další nečeká
+            raise
+        else:
+            future.set_result(resp)
+            return resp
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _fetch(self, endpoint: str, entry: "_CacheEntry | None", timeout: float, cache: bool,
+                     priority: int) -> ApiResponse:
+        """Síťová část `get`: (re)validace přes ETag a aktualizace cache."""
+        headers = get_headers(self.config)
+        if entry is not None and entry.etag:
+            headers["If-None-Match"] = entry.etag
+
+        status, resp_headers, data, text = await self._send(endpoint, headers, timeout, priority)
+        if status == 304 and entry is not None:
+            self.not_modified += 1
+            entry.expires_at = time.monotonic() + _parse_max_age(resp_headers)
+            return ApiResponse(200, entry.data, endpoint=endpoint, revision=entry.revision, from_cache=True)
+        if status != 200:
+            return ApiResponse(status, text=text, endpoint=endpoint)
+        if not cache:
+            return ApiResponse(200, data, endpoint=endpoint)
+
+        etag = resp_headers.get("ETag")
+        max_age = _parse_max_age(resp_headers)
+
+        # Stejný obsah (podle ETagu, případně podle dat) si ponechá původní revizi
+        if entry is not None and ((etag and etag == entry.etag) or data == entry.data):
+            revision = entry.revision
+        else:
+            revision = next(_revision_counter)
+
+        self._cache.pop(endpoint, None)
+        self._cache[endpoint] = _CacheEntry(data, etag, time.monotonic() + max_age, revision)
+        if len(self._cache) > MAX_CACHE_ENTRIES:
+            # Zahodíme nejdéle neobnovený záznam
+            self._cache.pop(next(iter(self._cache)))
+
+        return ApiResponse(200, data, endpoint=endpoint, revision=revision)
+
+    def stats(self) -> dict:
+        """Statistiky pro monitoring (/infolog)."""
+        return {
+            "bucket_level": round(self.bucket.level, 2),
+            "bucket_capacity": self.bucket.capacity,
+            "rate": self.bucket.rate,
+            "throttled": self.bucket.throttled,
+            "rate_limited": self.rate_limited,
+            "retries": self.retries,
+            "cache_hits": self.cache_hits,
+            "not_modified": self.not_modified,
+            "coalesced": self.coalesced,
+        }
+
+    async def close(self):
+        """Zavře session a všechna spojení v poolu."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            print("🔌 [api_handler] HTTP session k CoC API uzavřena.")
+        self._session = None
+
+
+_client: CocApiClient | None = None
+
+
+def init_client(config: dict) -> CocApiClient:
+    """Vytvoří (nebo vrátí existující) sdíleného klienta. Volá MyBot při startu."""
+    global _client
+    if _client is None:
+        _client = CocApiClient(config)
+    return _client
+
+
+def get_client(config: dict) -> CocApiClient:
+    """Vrátí sdíleného klienta; pokud ho ještě nikdo nevytvořil (např. samostatný skript), vytvoří ho."""
+    return _client or init_client(config)
+
+
+def api_stats() -> dict:
+    """Vrátí statistiky sdíleného klienta (prázdný dict, pokud klient ještě neexistuje)."""
+    return _client.stats() if _client is not None else {}
+
+
+async def close_client():
+    """Zavře sdíleného klienta (volá se při vypnutí bota)."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def _encode_tag(tag: str) -> str:
+    return tag.replace('#', '%23')
+
+
+def _payload(resp: ApiResponse, data: dict | None = None) -> ApiPayload:
+    """
+    Zabalí data odpovědi do ApiPayload s endpointem a revizí.
+    Data z cache (odpověď s revizí) sdílí i další volání, proto dostane volající hlubokou
+    kopii (znovu dekódovanou přes json_codec) – jeho úpravy do cache ani k dalším konzumentům nedoletí.
+    """
+    data = resp.data if data is None else data
+    if resp.revision is not None:
+        data = json_codec.loads(json_codec.dumps(data))
+    return ApiPayload(data, resp.endpoint, resp.revision)
+
+
+# === Převod odpovědí na typované modely (coc_models) ===
+_parsed: OrderedDict[tuple, object] = OrderedDict()  # (druh, endpoint, revize, extra) -> model, LRU
+
+
+def _parse_once(kind: str, payload: dict, build, extra: str = ""):
+    """
+    Převede payload na model a výsledek si zapamatuje podle revize obsahu.
+    Dokud API vrací stejná data (cache/304), všichni konzumenti dostanou tentýž objekt.
+    Po naplnění MAX_CACHE_ENTRIES se zahodí nejdéle nepoužitý model.
+    """
+    revision = getattr(payload, "revision", None)
+    if revision is None:
+        return build(payload)
+    key = (kind, payload.endpoint, revision, extra)
+    model = _parsed.get(key)
+    if model is None:
+        model = build(payload)
+        _parsed[key] = model
+        if len(_parsed) > MAX_CACHE_ENTRIES:
+            _parsed.popitem(last=False)
+    else:
+        _parsed.move_to_end(key)
+    return model
+
+
+def parse_war(war_data: dict, our_tag: str = "") -> War:
+    """Válka (currentwar / CWL válka) orientovaná tak, že `clan` je náš klan."""
+    return _parse_once("war", war_data, lambda d: War.from_api(d, our_tag), our_tag.strip().upper())
+
+
+def parse_members(members_data: dict) -> list[ClanMember]:
+    """Seznam členů z odpovědi /members (klíč `items`)."""
+    return _parse_once("members", members_data,
+                       lambda d: [ClanMember.from_api(m) for m in d.get("items", [])])
+
+
+def parse_capital(capital_data: dict) -> CapitalRaid:
+    """Jeden Capital Raid (položka z /capitalraidseasons)."""
+    return _parse_once("capital", capital_data, CapitalRaid.from_api)
+
+
+def parse_league_group(group_data: dict) -> LeagueGroup:
+    """CWL skupina (/currentwar/leaguegroup)."""
+    return _parse_once("league_group", group_data, LeagueGroup.from_api)
 
 # === Funkce pro stažení seznamu členů klanu ===
-async def fetch_clan_members_list(clan_tag: str, config: dict) -> dict | None:
+async def fetch_clan_members_list(clan_tag: str, config: dict, priority: int = PRIORITY_BACKGROUND) -> dict | None:
     """
     Volá Clash of Clans API pro získání seznamu členů klanu.
     Vstup: clan_tag (např. #ABCD123)
     Výstup: dict s daty nebo None při chybě
     """
-    headers = get_headers(config)
-    async with aiohttp.ClientSession(headers=headers) as session:
-        url = f"{BASE_URL}/clans/{clan_tag.replace('#', '%23')}/members"
-        async with session.get(url) as response:
-            if response.status == 200:
-                print("✅ [api_handler] Úspěšně načten seznam členů klanu.")
-                return await response.json()
-            else:
-                print(f"❌ [api_handler] Chyba při načítání členů klanu: {response.status}")
-                return None
+    resp = await get_client(config).get(f"clans/{_encode_tag(clan_tag)}/members", cache=True, priority=priority)
+    if resp.status == 200:
+        print("✅ [api_handler] Úspěšně načten seznam členů klanu.")
+        return _payload(resp)
+    else:
+        print(f"❌ [api_handler] Chyba při načítání členů klanu: {resp.status}")
+        return None
 
 # === Funkce pro stažení dat konkrétního hráče ===
-async def fetch_player_data(player_tag: str, config: dict) -> dict | None:
+async def fetch_player_data(player_tag: str, config: dict, priority: int = PRIORITY_BACKGROUND) -> dict | None:
     """
     Volá Clash of Clans API pro získání informací o konkrétním hráči.
     Vstup: player_tag (např. #PLAYER123)
     Výstup: dict s daty nebo None při chybě nebo překročení limitu
     """
-    headers = get_headers(config)
-    async with aiohttp.ClientSession(headers=headers) as session:
-        url = f"{BASE_URL}/players/{player_tag.replace('#', '%23')}"
-        async with session.get(url) as response:
-            if response.status == 200:
-                print(f"✅ [api_handler] Načten hráč {player_tag}")
-                return await response.json()
-            elif response.status == 429:
-                print(f"⚠️ [api_handler] Překročen limit API požadavků (rate limit) při hráči {player_tag}")
-                return None
-            else:
-                print(f"❌ [api_handler] Chyba při načítání hráče {player_tag}: {response.status}")
-                return None
+    resp = await get_client(config).get(f"players/{_encode_tag(player_tag)}", priority=priority)
+    if resp.status == 200:
+        print(f"✅ [api_handler] Načten hráč {player_tag}")
+        return resp.data
+    elif resp.status == 429:
+        print(f"⚠️ [api_handler] Překročen limit API požadavků (rate limit) při hráči {player_tag}")
+        return None
+    else:
+        print(f"❌ [api_handler] Chyba při načítání hráče {player_tag}: {resp.status}")
+        return None
 
 
-async def fetch_current_war(clan_tag: str, config: dict) -> dict | None:
+async def fetch_current_war(clan_tag: str, config: dict, priority: int = PRIORITY_BACKGROUND) -> dict | None:
     """
     Získává data o aktuální válce z API Clash of Clans přes proxy.
     """
-    url = f"{BASE_URL}/clans/{clan_tag.replace('#', '%23')}/currentwar"
-    headers = get_headers(config)
-
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(url, headers=headers, timeout=10) as resp:
-                if resp.status == 200:
-                    print(f"✅ [api_handler] Úspěšně získána data o válce pro klan {clan_tag}")
-                    return await resp.json()
-                elif resp.status == 404:
-                    print(f"❌ [api_handler] Data o válce nenalezena (404) pro klan {clan_tag}")
-                else:
-                    print(f"❌ [api_handler] Chyba při získávání dat o válce: {resp.status} - {await resp.text()}")
-        except asyncio.TimeoutError:
-            print("❌ [api_handler] Timeout při získávání dat o válce")
-        except Exception as e:
-            print(f"❌ [api_handler] Neočekávaná chyba: {str(e)}")
+    try:
+        resp = await get_client(config).get(f"clans/{_encode_tag(clan_tag)}/currentwar", cache=True, priority=priority)
+        if resp.status == 200:
+            print(f"✅ [api_handler] Úspěšně získána data o válce pro klan {clan_tag}")
+            return _payload(resp)
+        elif resp.status == 404:
+            print(f"❌ [api_handler] Data o válce nenalezena (404) pro klan {clan_tag}")
+        else:
+            print(f"❌ [api_handler] Chyba při získávání dat o válce: {resp.status} - {resp.text}")
+    except asyncio.TimeoutError:
+        print("❌ [api_handler] Timeout při získávání dat o válce")
+    except Exception as e:
+        print(f"❌ [api_handler] Neočekávaná chyba: {str(e)}")
 
     return None
 
 
-async def fetch_current_capital(clan_tag: str, config: dict) -> dict | None:
+async def fetch_current_capital(clan_tag: str, config: dict, priority: int = PRIORITY_BACKGROUND) -> dict | None:
     """
     Získává aktuální Capital Raid sezónu z API Clash of Clans přes proxy.
     Vrací nejnovější raid ze seznamu.
     """
-    url = f"{BASE_URL}/clans/{clan_tag.replace('#', '%23')}/capitalraidseasons"
-    headers = get_headers(config)
-
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.get(url, headers=headers, timeout=10) as resp:
-                if resp.status == 200:
-                    print(f"✅ [api_handler] Úspěšně získána Capital Raid data pro klan {clan_tag}")
-                    data = await resp.json()
-                    return data["items"][0] if data.get("items") else None
-                elif resp.status == 403:
-                    print(f"❌ [api_handler] Přístup odepřen při získávání Capital Raid dat (403)")
-                elif resp.status == 404:
-                    print(f"❌ [api_handler] Capital Raid data nenalezena (404) pro klan {clan_tag}")
-                else:
-                    print(f"❌ [api_handler] Chyba při získávání Capital Raid dat: {resp.status} - {await resp.text()}")
-        except asyncio.TimeoutError:
-            print("❌ [api_handler] Timeout při získávání Capital Raid dat")
-        except Exception as e:
-            print(f"❌ [api_handler] Neočekávaná chyba při získávání Capital Raid dat: {str(e)}")
+    try:
+        resp = await get_client(config).get(f"clans/{_encode_tag(clan_tag)}/capitalraidseasons", cache=True, priority=priority)
+        if resp.status == 200:
+            print(f"✅ [api_handler] Úspěšně získána Capital Raid data pro klan {clan_tag}")
+            data = resp.data
+            return _payload(resp, data["items"][0]) if data.get("items") else None
+        elif resp.status == 403:
+            print(f"❌ [api_handler] Přístup odepřen při získávání Capital Raid dat (403)")
+        elif resp.status == 404:
+            print(f"❌ [api_handler] Capital Raid data nenalezena (404) pro klan {clan_tag}")
+        else:
+            print(f"❌ [api_handler] Chyba při získávání Capital Raid dat: {resp.status} - {resp.text}")
+    except asyncio.TimeoutError:
+        print("❌ [api_handler] Timeout při získávání Capital Raid dat")
+    except Exception as e:
+        print(f"❌ [api_handler] Neočekávaná chyba při získávání Capital Raid dat: {str(e)}")
 
     return None
 
-def fetch_events_from_clash_ninja():
+_events_cache: tuple[float, list[dict]] | None = None   # (čas stažení, události)
+
+
+def _parse_events_html(html: str) -> list[dict]:
     """
-    Načte nadcházející události z clash.ninja a vrátí je jako seznam slovníků.
+    Vytáhne události z HTML stránky clash.ninja. Běží mimo event loop (v threadu),
+    parsuje jen bloky `div.event-holder`.
     """
-    url = "https://www.clash.ninja/guides/when-are-the-next-ingame-events"
-    headers = {"User-Agent": "Mozilla/5.0"}
-    try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
-        events_divs = soup.find_all("div", class_="event-holder")
-
-        events = []
-        for div in events_divs:
-            title_raw = div.find("h3")
-            if not title_raw:
-                continue
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=SoupStrainer("div", class_="event-holder"))
+    events_divs = soup.find_all("div", class_="event-holder")
+
+    events = []
+    for div in events_divs:
+        title_raw = div.find("h3")
+        if not title_raw:
+            continue
 
-            title = title_raw.get_text(strip=True).replace("(Active Until)", "").strip()
-            is_active = "(Active Until)" in title_raw.text
+        title = title_raw.get_text(strip=True).replace("(Active Until)", "").strip()
+        is_active = "(Active Until)" in title_raw.text
 
-            ts = int(div.get("data-ed", 0)) // 1000  # safe fallback
+        ts = int(div.get("data-ed", 0)) // 1000  # safe fallback
 
-            timer_div = div.find("div", class_="event-timer")
-            remaining = timer_div.get_text(strip=True) if timer_div else ""
+        timer_div = div.find("div", class_="event-timer")
+        remaining = timer_div.get_text(strip=True) if timer_div else ""
 
-            if ts > 0:
-                events.append({
-                    "title": title,
-                    "timestamp": ts,
-                    "remaining": remaining,
-                    "active": is_active
-                })
+        if ts > 0:
+            events.append({
+                "title": title,
+                "timestamp": ts,
+                "remaining": remaining,
+                "active": is_active
+            })
 
-        return events
+    return events
+
+
+async def fetch_events_from_clash_ninja(config: dict) -> list[dict]:
+    """
+    Načte nadcházející události z clash.ninja a vrátí je jako seznam slovníků.
+    Stahuje asynchronně přes sdílenou HTTP session, HTML parsuje v threadu a výsledek
+    drží EVENTS_CACHE_TTL sekund v paměti. Při chybě vrátí poslední známá data (nebo []).
+    """
+    global _events_cache
+    if _events_cache is not None and time.monotonic() - _events_cache[0] < EVENTS_CACHE_TTL:
+        return list(_events_cache[1])
+
+    headers = {"User-Agent": "Mozilla/5.0"}
+    try:
+        session = await get_client(config).get_session()
+        async with session.get(CLASH_NINJA_URL, headers=headers, timeout=REQUEST_TIMEOUT) as response:
+            response.raise_for_status()
+            html = await response.text()
+
+        events = await asyncio.to_thread(_parse_events_html, html)
+        _events_cache = (time.monotonic(), events)
+        return list(events)
 
     except Exception as e:
         print(f"❌ [clash_events_api] Chyba při načítání: {e}")
-        return []
+        return list(_events_cache[1]) if _events_cache is not None else []
 
 
-async def make_request(endpoint: str, config: dict) -> dict | None:
+async def make_request(endpoint: str, config: dict, cache: bool = False,
+                       priority: int = PRIORITY_BACKGROUND) -> dict | None:
     """
     Provede HTTP GET požadavek na Clash of Clans API
 
     :param endpoint: API endpoint (bez základní URL)
+    :param cache: použít cache odpovědí (Cache-Control/ETag)
+    :param priority: priorita ve frontě rate limiteru
     :return: JSON response jako dictionary nebo None při chybě
     """
-    headers = get_headers(config)
-
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{BASE_URL}/{endpoint}", headers=headers, timeout=10) as response:
-                if response.status == 200:
-                    return await response.json()
-                elif response.status == 404:
-                    print(f"❌ [api_handler] Data nenalezena (404) pro endpoint: {endpoint}")
-                    return None
-                elif response.status == 403:
-                    print(f"❌ [api_handler] Přístup odepřen (403) pro endpoint: {endpoint}")
-                    return None
-                else:
-                    print(f"❌ [api_handler] Chyba {response.status} pro endpoint: {endpoint}")
-                    return None
+        resp = await get_client(config).get(endpoint, cache=cache, priority=priority)
+        if resp.status == 200:
+            return _payload(resp)
+        elif resp.status == 404:
+            print(f"❌ [api_handler] Data nenalezena (404) pro endpoint: {endpoint}")
+            return None
+        elif resp.status == 403:
+            print(f"❌ [api_handler] Přístup odepřen (403) pro endpoint: {endpoint}")
+            return None
+        else:
+            print(f"❌ [api_handler] Chyba {resp.status} pro endpoint: {endpoint}")
+            return None
     except asyncio.TimeoutError:
         print(f"❌ [api_handler] Timeout při požadavku na endpoint: {endpoint}")
         return None
@@ -182,7 +644,7 @@ async def make_request(endpoint: str, config: dict) -> dict | None:
         return None
 
 
-async def fetch_league_group(clan_tag: str, config: dict) -> dict | None | bool:
+async def fetch_league_group(clan_tag: str, config: dict, priority: int = PRIORITY_BACKGROUND) -> dict | None | bool:
     """
     Získá data ligové skupiny pro aktuální CWL.
     Vrací:
@@ -191,37 +653,46 @@ async def fetch_league_group(clan_tag: str, config: dict) -> dict | None | bool:
       None  – dočasná chyba (síť, timeout), stav neznámý
     """
     formatted_tag = f"%23{clan_tag.replace('#', '').upper()}"
-    url = f"{BASE_URL}/clans/{formatted_tag}/currentwar/leaguegroup"
-    headers = get_headers(config)
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers, timeout=10) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if data.get('state') in ['warEnded', 'inWar', 'preparation']:
-                        print(f"✅ [api_handler] Úspěšně získána CWL skupina pro klan {clan_tag}")
-                        return data
-                    print(f"❌ [api_handler] Nenalezena aktivní CWL skupina pro klan {clan_tag}")
-                    return False
-                elif response.status == 404:
-                    print(f"❌ [api_handler] CWL skupina nenalezena (404) pro klan {clan_tag} — CWL skončila.")
-                    return False
-                else:
-                    print(f"❌ [api_handler] Chyba {response.status} při načítání CWL skupiny pro {clan_tag}")
-                    return None
+        resp = await get_client(config).get(f"clans/{formatted_tag}/currentwar/leaguegroup", cache=True, priority=priority)
+        if resp.status == 200:
+            data = resp.data
+            if data.get('state') in ['warEnded', 'inWar', 'preparation']:
+                print(f"✅ [api_handler] Úspěšně získána CWL skupina pro klan {clan_tag}")
+                return _payload(resp)
+            print(f"❌ [api_handler] Nenalezena aktivní CWL skupina pro klan {clan_tag}")
+            return False
+        elif resp.status == 404:
+            print(f"❌ [api_handler] CWL skupina nenalezena (404) pro klan {clan_tag} — CWL skončila.")
+            return False
+        else:
+            print(f"❌ [api_handler] Chyba {resp.status} při načítání CWL skupiny pro {clan_tag}")
+            return None
     except (asyncio.TimeoutError, aiohttp.ClientError) as e:
         print(f"❌ [api_handler] Síťová chyba při načítání CWL skupiny: {e}")
         return None
 
 
-async def fetch_league_war(war_tag: str, config: dict) -> dict | None:
+async def fetch_league_war(war_tag: str, config: dict, priority: int = PRIORITY_BACKGROUND) -> dict | None:
     """
-    Získá data konkrétní ligové války
+    Získá data konkrétní ligové války.
+    Ukončené války (warEnded) se už nemění, proto se ukládají do SQLite
+    a další dotazy na ně se obslouží lokálně bez požadavku na API.
 
     :param war_tag: Tag války (včetně #)
+    :param priority: priorita ve frontě rate limiteru
     :return: Data války nebo None při chybě
     """
     formatted_tag = f"%23{war_tag.replace('#', '').upper()}"
     endpoint = f"clanwarleagues/wars/{formatted_tag}"
-    return await make_request(endpoint, config)
+
+    cached = await run_db(get_cached_cwl_war, war_tag)
+    if cached is not None:
+        # Neměnná data → konstantní revize, ChangeTracker je zpracuje jen jednou
+        return ApiPayload(cached, endpoint, 0)
+
+    war = await make_request(endpoint, config, cache=True, priority=priority)
+    if war and war.get("state") == "warEnded":
+        await run_db(save_cached_cwl_war, war_tag, war)
+    return war
@@ -0,0 +1,75 @@
+"""
+Mikrobenchmark JSON kodeku: standardní `json` vs. json_codec (orjson, pokud je nainstalovaný).
+
+Měří dekódování odpovědí API a kódování s odsazením (jako /infolog) na velkých payloadech:
+50v50 currentwar po skončení (všechny útoky) a Capital Raid s kompletním attackLogem.
+Payloady se berou z nahraných fixture souborů (viz `mock_coc_api.py --record`),
+jinak se vygenerují synteticky stejnými generátory, jaké používá mock server.
+
+Spuštění:
+    python bench_json.py
+    python bench_json.py --fixtures fixtures --number 500
+"""
+import argparse
+import json
+import os
+import random
+import time
+import timeit
+
+import json_codec
+from mock_coc_api import WarScript, make_capital_raid, make_members
+
+
+def _load_payloads(fixtures_dir: str | None) -> dict[str, bytes]:
+    payloads = {}
+    if fixtures_dir:
+        for name in ("currentwar", "capitalraidseasons", "members", "leaguegroup"):
+            path = os.path.join(fixtures_dir, f"{name}.json")
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    payloads[name] = f.read()
+
+    if "currentwar" not in payloads:
+        war = WarScript("#BENCH", "#BENCHOPP", team_size=50, attacks_per_member=2,
+                        prep_seconds=0, battle_seconds=1, start_at=0, seed=1, fill_ratio=1.0)
+        payloads["currentwar (50v50, synt.)"] = json.dumps(war.snapshot(time.time())).encode("utf-8")
+    if "capitalraidseasons" not in payloads:
+        rng = random.Random(1)
+        members = make_members("#BENCH", 50, rng)
+        raid = make_capital_raid(members, time.time(), rng)
+        payloads["capitalraidseasons (synt.)"] = json.dumps({"items": [raid] * 10}).encode("utf-8")
+    return payloads
+
+
+def _best(stmt, number: int) -> float:
+    """Nejlepší čas jednoho volání v mikrosekundách (min z 5 opakování)."""
+    return min(timeit.repeat(stmt, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON kodeku")
+    parser.add_argument("--fixtures", help="adresář s nahranými JSON odpověďmi")
+    parser.add_argument("--number", type=int, default=200, help="počet volání v jednom měření")
+    args = parser.parse_args()
+
+    print(f"Backend json_codec: {json_codec.BACKEND}")
+    print(f"{'payload':32} {'velikost':>9} {'operace':>14} {'json µs':>10} {'codec µs':>10} {'zrychlení':>10}")
+
+    for name, raw in _load_payloads(args.fixtures).items():
+        obj = json.loads(raw)
+        cases = [
+            ("loads", lambda: json.loads(raw), lambda: json_codec.loads(raw)),
+            ("dumps", lambda: json.dumps(obj), lambda: json_codec.dumps(obj)),
+            ("dumps indent", lambda: json.dumps(obj, indent=2, ensure_ascii=False),
+             lambda: json_codec.dumps(obj, indent=True)),
+        ]
+        for op, stdlib_call, codec_call in cases:
+            stdlib_us = _best(stdlib_call, args.number)
+            codec_us = _best(codec_call, args.number)
+            print(f"{name:32} {len(raw) // 1024:>7}kB {op:>14} {stdlib_us:>10.1f} {codec_us:>10.1f} "
+                  f"{stdlib_us / codec_us:>9.1f}×")
+
+
+if __name__ == "__main__":
+    main()
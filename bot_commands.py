@@ -1,7 +1,7 @@
 import discord
 from discord import app_commands
 from typing import Optional
-from database import get_all_members, get_all_links
+from database import get_all_members, get_all_links, run_db
 from role_giver import update_roles
 from verification import start_verification_permission
 from constants import TOWN_HALL_EMOJIS
@@ -79,7 +79,7 @@ class VerifikaceModal(discord.ui.Modal, title="Ověření Clash of Clans účtu"
 
     async def on_submit(self, interaction: discord.Interaction):
         zadany_text = self.hledat.value
-        clenove = get_all_members()
+        clenove = await run_db(get_all_members)
 
         await interaction.response.defer(ephemeral=True, thinking=True)
 
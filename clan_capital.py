@@ -1,43 +1,23 @@
 import discord
 from datetime import datetime, timezone, timedelta
 from typing import Optional
-import json
-import json
 import os
 
-from database import notify_single_warning
+import json_codec
+import live_message
+from api_handler import ChangeTracker, parse_capital
+from coc_models import CapitalRaid
+from state_store import bot_state, CAPITAL_STATUS_MESSAGE, CAPITAL_START_TIME
+from database import (
+    notify_single_warning, load_capital_warnings, add_capital_sent_warnings,
+    set_capital_pending, delete_capital_pending, import_capital_warnings, run_db,
+)
 from constants import CAPITAL_STATUS_CHANNEL_ID, PRAISE_CHANNEL_ID, EVENT_EMOJIS
 
 
 
-# === Nastavení cesty k JSON souboru ===
+# === Nastavení cesty k JSON souboru s varováními ===
 THIS_DIR = os.path.dirname(os.path.abspath(__file__))
-ROOM_IDS_PATH = os.path.join(THIS_DIR, "discord_rooms_ids.json")
-
-def load_room_id(key: str):
-    if os.path.exists(ROOM_IDS_PATH):
-        try:
-            with open(ROOM_IDS_PATH, "r") as f:
-                data = json.load(f)
-                return data.get(key)
-        except Exception as e:
-            print(f"❌ [discord_rooms_ids] Chyba při čtení: {e}")
-    return None
-
-def save_room_id(key: str, message_id: Optional[int]):
-    try:
-        data = {}
-        if os.path.exists(ROOM_IDS_PATH):
-            with open(ROOM_IDS_PATH, "r") as f:
-                data = json.load(f)
-        if message_id is None:
-            data.pop(key, None)
-        else:
-            data[key] = message_id
-        with open(ROOM_IDS_PATH, "w") as f:
-            json.dump(data, f)
-    except Exception as e:
-        print(f"❌ [discord_rooms_ids] Chyba při zápisu: {e}")
 
 
 class ClanCapitalHandler:
@@ -49,164 +29,150 @@ class ClanCapitalHandler:
         self.config = config                                                            # Konfigurační slovník (obsahuje např. COC API klíč, GUILD_ID apod.)
         self.capital_status_channel_id = CAPITAL_STATUS_CHANNEL_ID                      # ID Discord kanálu, kam se bude embed posílat
         self.announcement_channel_id = PRAISE_CHANNEL_ID                                # ID kanálu pro oznámení nejlepšího výsledku
-        self.current_capital_message_id = load_room_id("capital_status_message")        # načtení ID zprávy z JSON souboru
+        self.current_capital_message_id = bot_state.get(CAPITAL_STATUS_MESSAGE)        # načtení ID zprávy ze sdíleného stavu
+        bot_state.subscribe(CAPITAL_STATUS_MESSAGE, self._on_message_id_changed)       # ID zprávy může změnit i jiný modul
         self._last_state = None                                                         # Sleduje předchozí stav (např. 'ongoing', 'ended')
         self._has_announced_end = False                                                 # Flag pro sledování, zda byl oznámen konec raidu
         self._best_result_sent = False                                                  # Flag pro sledování, zda byl odeslán nejlepší výsledek
-        self.warnings_file = os.path.join(THIS_DIR, "capital_warnings.json")
-        self.pending_warnings = {}                                                      # {district_id: {attacker_tag: timestamp}}
-        self.sent_warnings = set()                                                      # {unique_id}
-        self.load_warnings()
+        self.warnings_file = os.path.join(THIS_DIR, "capital_warnings.json")            # starý soubor, jen pro migraci do DB
+        self.pending_warnings = {}                                                      # {"district_id-attacker_tag": timestamp}
+        self.sent_warnings = set()                                                      # {unique_id}, v DB s expirací
+        self._changes = ChangeTracker()                                                 # které revize dat z API už byly zpracovány
+
+    def _on_message_id_changed(self, _key: str, message_id: Optional[int]):
+        """Udržuje ID embed zprávy v souladu se sdíleným stavem."""
+        self.current_capital_message_id = message_id
+
+    async def load_warnings(self):
+        """
+        Načte stav varování z databáze (starý capital_warnings.json se jednorázově převede).
+        Volá se jednou po vytvoření handleru; databáze se čte v DB vlákně.
+        """
+        self.pending_warnings, self.sent_warnings = await run_db(self._load_warnings_sync)
 
-    def load_warnings(self):
-        """Načte stav varování z JSON souboru."""
+    def _load_warnings_sync(self):
         if os.path.exists(self.warnings_file):
             try:
-                with open(self.warnings_file, "r") as f:
-                    data = json.load(f)
-                    self.pending_warnings = data.get("pending", {})
-                    self.sent_warnings = set(data.get("sent_ids", []))
+                data = json_codec.load_file(self.warnings_file)
+                # Import v jedné transakci; při chybě soubor zůstane a migrace se zopakuje
+                imported = import_capital_warnings(data.get("pending", {}), data.get("sent_ids", []))
+                os.replace(self.warnings_file, f"{self.warnings_file}.migrated")
+                print(f"✅ [clan_capital] {imported} varování z {self.warnings_file} převedeno do databáze")
             except Exception as e:
-                print(f"❌ [clan_capital] Chyba při načítání varování: {e}")
+                print(f"❌ [clan_capital] Chyba při migraci varování (soubor ponechán): {e}")
+        return load_capital_warnings()
 
-    def save_warnings(self):
-        """Uloží stav varování do JSON souboru."""
-        try:
-            data = {
-                "pending": self.pending_warnings,
-                "sent_ids": list(self.sent_warnings)
-            }
-            with open(self.warnings_file, "w") as f:
-                json.dump(data, f)
-        except Exception as e:
-            print(f"❌ [clan_capital] Chyba při ukládání varování: {e}")
+    async def _mark_sent(self, warning_id: str):
+        """Zapamatuje si odeslané varování (v paměti i v DB, s expirací)."""
+        self.sent_warnings.add(warning_id)
+        await run_db(add_capital_sent_warnings, [warning_id])
+
+    async def _start_pending(self, pending_key: str, started_at: float):
+        self.pending_warnings[pending_key] = started_at
+        await run_db(set_capital_pending, pending_key, started_at)
+
+    async def _clear_pending(self, pending_key: str):
+        if pending_key in self.pending_warnings:
+            del self.pending_warnings[pending_key]
+            await run_db(delete_capital_pending, pending_key)
 
-    async def check_warnings(self, capital_data: dict):
+    async def check_warnings(self, raid: CapitalRaid):
         """
         Zkontroluje podmínky pro varování:
         1. Hráč nechal district na >75% a má ještě útok (trvá > 6 minut).
         2. Hráč nechal district na >75% a někdo jiný ho dodělal (a původní měl útoky).
         """
-        if not capital_data:
+        if not raid:
             return
 
-        # 1. Zjistíme zbývající útoky pro všechny členy
-        members_map = {} # tag -> remaining_attacks
-        for m in capital_data.get("members", []):
-            limit = m.get("attackLimit", 0) + m.get("bonusAttackLimit", 0)
-            used = m.get("attacks", 0)
-            remaining = limit - used
-            members_map[m.get("tag")] = remaining
-
-        # 2. Projdeme aktivní/nedávný raid (hledáme ten ongoing nebo ended, který je relevantní)
-        # Většinou nás zajímá ongoing, nebo ended pokud zrovna skončil.
-        # Ale pozor, warningy chceme posílat hlavně live.
-        # V example JSON je 'items' s jedním 'ongoing' prvkem.
-        # capital_data je obvykle ten jeden prvek (z process_capital_data se volá s `capital_data` což je item).
-        
-        attack_log = capital_data.get("attackLog", [])
-        
-        # Projdeme všechny defendery v attackLogu (což jsou klany, na které útočíme)
-        for raid_clan in attack_log:
-            districts = raid_clan.get("districts", [])
-            for district in districts:
-                district_id = str(district.get("id"))
-                district_name = district.get("name")
-                attacks = district.get("attacks", []) # Seznam útoků, předpokládáme [nejnovější, ..., nejstarší]
-                
-                if not attacks:
-                    continue
-
-                # --- SCÉNÁŘ B: Někdo to "vyžral" (Stolen) ---
-                # Procházíme útoky a hledáme situaci: Útok A (>75%), pak Útok B (jiný hráč).
-                # attacks je [Last, Prev, PrevPrev...]
-                for i in range(len(attacks) - 1):
-                    current_attack = attacks[i]      # Novější
-                    previous_attack = attacks[i+1]   # Starší (ten co to nechal)
-                    
-                    prev_percent = previous_attack.get("destructionPercent", 0)
-                    
-                    # Pokud ten předchozí to nechal na >= 75% a < 100%
-                    if 75 < prev_percent < 100:
-                        prev_tag = previous_attack.get("attacker", {}).get("tag")
-                        curr_tag = current_attack.get("attacker", {}).get("tag")
-                        
-                        # A útočník se změnil
-                        if prev_tag != curr_tag:
-                            # A ten předchozí MÁ (stále) k dispozici útoky
-                            if members_map.get(prev_tag, 0) > 0:
-                                warning_id = f"stolen-{district_id}-{prev_tag}-{i}" # Unique ID pro tuto událost
-                                
-                                if warning_id not in self.sent_warnings:
-                                    prev_name = previous_attack.get("attacker", {}).get("name")
-                                    curr_name = current_attack.get("attacker", {}).get("name")
-                                    
-                                    msg = (f"⚠️ **Clan Capital Warning (Stolen Warning)**\n"
-                                           f"Hráč **{prev_name}** nechal district `{district_name}` na **{prev_percent}%** "
-                                           f"a měl ještě útoky!\n"
-                                           f"District následně napadl/dodelal **{curr_name}**.")
-                                           
-                                    await self.send_log_message(msg)
-                                    self.sent_warnings.add(warning_id)
-                                    self.save_warnings()
-
-                                    # Přidání varování
-                                    await notify_single_warning(
-                                        bot=self.bot,
-                                        coc_tag=prev_tag,
-                                        date_time=datetime.now().strftime("%d/%m/%Y %H:%M"),
-                                        reason="nedokončený district v clan capital"
-                                    )
-
-                # --- SCÉNÁŘ A: Ongoing "zaseknutí" ---
-                # Zajímá nás jen nejnovější stav districtu
-                latest_attack = attacks[0]
-                latest_percent = latest_attack.get("destructionPercent", 0)
-                
-                # Pokud je district "živý" (není 100%) a je > 75%
-                if 75 < latest_percent < 100:
-                    attacker_tag = latest_attack.get("attacker", {}).get("tag")
-                    attacker_name = latest_attack.get("attacker", {}).get("name")
-                    
-                    # Má útočník ještě útoky?
-                    if members_map.get(attacker_tag, 0) > 0:
-                        pending_key = f"{district_id}-{attacker_tag}"
-                        now_ts = datetime.now(timezone.utc).timestamp()
-                        
-                        warning_id = f"stuck-{district_id}-{attacker_tag}"
-                        
-                        # Pokud o něm ještě nevíme, začneme stopovat čas
-                        if pending_key not in self.pending_warnings:
-                            self.pending_warnings[pending_key] = now_ts
-                            self.save_warnings()
-                            print(f"[TIME] [clan_capital] Warning countdown started for {attacker_name} on {district_name} ({latest_percent}%).")
-                        else:
-                            # Už o něm víme, zkontrolujeme čas
-                            start_ts = self.pending_warnings[pending_key]
-                            # 6 minut = 360 sekund
-                            if (now_ts - start_ts) > 360:
-                                if warning_id not in self.sent_warnings:
-                                    msg = (f"⚠️ **Clan Capital Warning (Incomplete District)**\n"
-                                           f"Hráč **{attacker_name}** nechal district `{district_name}` na **{latest_percent}%** "
-                                           f"již déle než 6 minut a stále má nevyužité útoky!")
-                                    
-                                    await self.send_log_message(msg)
-                                    self.sent_warnings.add(warning_id)
-                                    self.save_warnings()
+        # Zbývající útoky členů poskytuje model (raid.remaining_attacks(tag)).
+        # Projdeme všechny districty napadených klanů (attackLog), útoky jsou [nejnovější, ..., nejstarší].
+        for district in raid.districts:
+            district_id = district.id
+            district_name = district.name
+            attacks = district.attacks
+
+            if not attacks:
+                continue
+
+            # --- SCÉNÁŘ B: Někdo to "vyžral" (Stolen) ---
+            # Procházíme útoky a hledáme situaci: Útok A (>75%), pak Útok B (jiný hráč).
+            for i in range(len(attacks) - 1):
+                current_attack = attacks[i]      # Novější
+                previous_attack = attacks[i+1]   # Starší (ten co to nechal)
+
+                prev_percent = previous_attack.destruction
+
+                # Pokud ten předchozí to nechal na >= 75% a < 100%
+                if 75 < prev_percent < 100:
+                    prev_tag = previous_attack.attacker_tag
+                    curr_tag = current_attack.attacker_tag
+
+                    # A útočník se změnil
+                    if prev_tag != curr_tag:
+                        # A ten předchozí MÁ (stále) k dispozici útoky
+                        if raid.remaining_attacks(prev_tag) > 0:
+                            warning_id = f"stolen-{district_id}-{prev_tag}-{i}" # Unique ID pro tuto událost
+
+                            if warning_id not in self.sent_warnings:
+                                prev_name = previous_attack.attacker_name
+                                curr_name = current_attack.attacker_name
+
+                                msg = (f"⚠️ **Clan Capital Warning (Stolen Warning)**\n"
+                                       f"Hráč **{prev_name}** nechal district `{district_name}` na **{prev_percent}%** "
+                                       f"a měl ještě útoky!\n"
+                                       f"District následně napadl/dodelal **{curr_name}**.")
+
+                                await self.send_log_message(msg)
+                                await self._mark_sent(warning_id)
+
+                                # Přidání varování
+                                await notify_single_warning(
+                                    bot=self.bot,
+                                    coc_tag=prev_tag,
+                                    date_time=datetime.now().strftime("%d/%m/%Y %H:%M"),
+                                    reason="nedokončený district v clan capital"
+                                )
+
+            # --- SCÉNÁŘ A: Ongoing "zaseknutí" ---
+            # Zajímá nás jen nejnovější stav districtu
+            latest_attack = attacks[0]
+            latest_percent = latest_attack.destruction
+            attacker_tag = latest_attack.attacker_tag
+            pending_key = f"{district_id}-{attacker_tag}"
+
+            # Pokud je district "živý" (není 100%) a je > 75%
+            if 75 < latest_percent < 100:
+                attacker_name = latest_attack.attacker_name
+
+                # Má útočník ještě útoky?
+                if raid.remaining_attacks(attacker_tag) > 0:
+                    now_ts = datetime.now(timezone.utc).timestamp()
+
+                    warning_id = f"stuck-{district_id}-{attacker_tag}"
+
+                    # Pokud o něm ještě nevíme, začneme stopovat čas
+                    if pending_key not in self.pending_warnings:
+                        await self._start_pending(pending_key, now_ts)
+                        print(f"[TIME] [clan_capital] Warning countdown started for {attacker_name} on {district_name} ({latest_percent}%).")
                     else:
-                        # Pokud už nemá útoky, vyhodíme z pending (už nemůže dokončit)
-                        pending_key = f"{district_id}-{attacker_tag}"
-                        if pending_key in self.pending_warnings:
-                            del self.pending_warnings[pending_key]
-                            self.save_warnings()
+                        # Už o něm víme, zkontrolujeme čas
+                        start_ts = self.pending_warnings[pending_key]
+                        # 6 minut = 360 sekund
+                        if (now_ts - start_ts) > 360:
+                            if warning_id not in self.sent_warnings:
+                                msg = (f"⚠️ **Clan Capital Warning (Incomplete District)**\n"
+                                       f"Hráč **{attacker_name}** nechal district `{district_name}` na **{latest_percent}%** "
+                                       f"již déle než 6 minut a stále má nevyužité útoky!")
+
+                                await self.send_log_message(msg)
+                                await self._mark_sent(warning_id)
                 else:
-                    # District je 100% nebo < 75%, vyčistíme pending pokud existuje pro posledního útočníka
-                    if attacks:
-                        attacker_tag = attacks[0].get("attacker", {}).get("tag")
-                        pending_key = f"{district_id}-{attacker_tag}"
-                        if pending_key in self.pending_warnings:
-                            del self.pending_warnings[pending_key]
-                            self.save_warnings()
+                    # Pokud už nemá útoky, vyhodíme z pending (už nemůže dokončit)
+                    await self._clear_pending(pending_key)
+            else:
+                # District je 100% nebo < 75%, vyčistíme pending pokud existuje pro posledního útočníka
+                await self._clear_pending(pending_key)
 
     async def send_log_message(self, content: str):
         """Odešle zprávu do logovacího kanálu."""
@@ -224,14 +190,14 @@ class ClanCapitalHandler:
             print("❌ [clan_capital] ID logovacího kanálu není nastaveno.")
 
 
-    def _create_capital_embed(self, state: str, data: dict) -> discord.Embed:
+    def _create_capital_embed(self, state: str, raid: CapitalRaid) -> discord.Embed:
         """
         Vytvoří a vrátí embed podle stavu capital raidu ('ongoing' nebo 'ended').
         """
 
         # Embed pro probíhající raid
-        start = self._parse_time(data.get("startTime"))      # začátek jako datetime
-        end = self._parse_time(data.get("endTime"))          # konec jako datetime
+        start = raid.start                                   # začátek jako datetime
+        end = raid.end                                       # konec jako datetime
         start_ts = int(start.timestamp()) if start else 0    # timestamp pro Discord tag
         end_ts = int(end.timestamp()) if end else 0
         emoji = EVENT_EMOJIS.get("Capital District", "🏰")
@@ -255,25 +221,25 @@ class ClanCapitalHandler:
         # Statistiky s centrovaným formátem a monospaced fontem
         embed.add_field(
             name=f"{emoji} Loot",
-            value=f"`{data.get('capitalTotalLoot', 0):^10,}`",
+            value=f"`{raid.total_loot:^10,}`",
             inline=True
         )
         emoji = EVENT_EMOJIS.get("Capital Destroyed District", "⚔️️")
         embed.add_field(
             name=f"️{emoji} Raidů dokončeno",
-            value=f"`{data.get('raidsCompleted', 0):^10}`",
+            value=f"`{raid.raids_completed:^10}`",
             inline=True
         )
         emoji = EVENT_EMOJIS.get("Clan Capital", "⚔️️")
         embed.add_field(
             name=f"{emoji} Attacks",
-            value=f"`{data.get('totalAttacks', 0):^10}`",
+            value=f"`{raid.total_attacks:^10}`",
             inline=True
         )
         emoji = EVENT_EMOJIS.get("Capital District", "🏙️")
         embed.add_field(
             name=f"{emoji} Zničeno Disctrictů",
-            value=f"`{data.get('enemyDistrictsDestroyed', 0):^10}`",
+            value=f"`{raid.districts_destroyed:^10}`",
             inline=True
         )
 
@@ -285,23 +251,31 @@ class ClanCapitalHandler:
         Zpracuje předaná data z Clash of Clans API a aktualizuje embed.
         Pokud došlo ke změně stavu raidu, zapíše do konzole.
         """
-        self.current_capital_message_id = load_room_id("capital_status_message")
         if not capital_data:
             print("❌ [clan_capital] Žádná data o raidu ke zpracování")
             return
 
         # Získáme aktuální stav (např. 'ongoing' nebo 'ended')
-        state = capital_data.get('state', 'unknown')
+        raid = parse_capital(capital_data)
+        state = raid.state
+
+        # Data se od minula nezměnila (cache/304) → embed ani stav se nemění,
+        # zkontrolujeme jen časově závislá varování (6 min „zaseknutý“ district)
+        if self._changes.is_unchanged(capital_data):
+            if state == "ongoing":
+                await self.check_warnings(raid)
+            return
 
         # --- Detekce nového raidu podle startTime ---
         current_start_time = capital_data.get('startTime')
-        stored_start_time = load_room_id("capital_start_time")
+        stored_start_time = bot_state.get(CAPITAL_START_TIME)
 
         if current_start_time and current_start_time != stored_start_time:
             print(f"🆕 [clan_capital] Detekován nový Clan Capital raid! Čas: {current_start_time}. Resetuji ID zprávy.")
+            live_message.forget(self.current_capital_message_id)
             self.current_capital_message_id = None
-            save_room_id("capital_status_message", None)
-            save_room_id("capital_start_time", current_start_time)
+            bot_state.set(CAPITAL_STATUS_MESSAGE, None)
+            bot_state.set(CAPITAL_START_TIME, current_start_time)
             self._has_announced_end = False
 
         # Pokud se stav změnil od minula, informujeme v konzoli
@@ -319,30 +293,24 @@ class ClanCapitalHandler:
             if self.current_capital_message_id:
                 channel = self.bot.get_channel(self.capital_status_channel_id)
                 try:
-                    msg = await channel.fetch_message(self.current_capital_message_id)
-                    embed = msg.embeds[0]
-                    embed.set_footer(text="Stav: ended")
-                    await msg.edit(embed=embed)
+                    await live_message.set_footer(channel, self.current_capital_message_id, "Stav: ended")
                     print("✅ [clan_capital] Footer embedu upraven na 'Stav: ended'.")
                     
                     # Zapomeneme ID zprávy, aby příští raid začal nový
+                    live_message.forget(self.current_capital_message_id)
                     self.current_capital_message_id = None
-                    save_room_id("capital_status_message", None)
+                    bot_state.set(CAPITAL_STATUS_MESSAGE, None)
                     print("🗑️ [clan_capital] ID zprávy smazáno z paměti pro příští raid.")
 
                 except Exception as e:
                     print(f"⚠️ [clan_capital] Nepodařilo se upravit embed: {e}")
 
             # ✅ Najdeme hráče s nejvyšším capitalResourcesLooted
-            best_player = max(
-                capital_data.get("members", []),
-                key=lambda m: m.get("capitalResourcesLooted", 0),
-                default=None
-            )
-
-            if best_player and best_player.get("capitalResourcesLooted", 0) > 0:
-                name = best_player.get("name", "Neznámý hráč")
-                gold = best_player.get("capitalResourcesLooted", 0)
+            best_player = max(raid.members, key=lambda m: m.looted, default=None)
+
+            if best_player and best_player.looted > 0:
+                name = best_player.name
+                gold = best_player.looted
                 mention = f"@{name}"
                 channel = self.bot.get_channel(self.announcement_channel_id)
                 if channel:
@@ -361,14 +329,15 @@ class ClanCapitalHandler:
         elif state == "ongoing":
             # Reset stavů
             self._has_announced_end = False
-            embed = self._create_capital_embed(state, capital_data)
+            embed = self._create_capital_embed(state, raid)
             await self.update_capital_message(embed)
-            await self.check_warnings(capital_data)
+            await self.check_warnings(raid)
 
         else:
             print("ℹ️ [clan_capital] Stav 'ended' – embed se již dál nemění.")
 
         self._last_state = state
+        self._changes.mark_seen(capital_data)
 
     async def update_capital_message(self, embed: discord.Embed):
         """
@@ -380,23 +349,12 @@ class ClanCapitalHandler:
             return
 
         try:
-            # Pokud máme uložené ID zprávy, pokusíme se ji upravit
-            if self.current_capital_message_id:
-                try:
-                    msg = await channel.fetch_message(self.current_capital_message_id)
-                    await msg.edit(embed=embed)
-                    print("✅ [clan_capital] Embed byl upraven.")
-                    return
-                except discord.NotFound:
-                    # Pokud zpráva s daným ID neexistuje (např. byla smazána), pošleme novou
-                    print("⚠️ [clan_capital] Zpráva nenalezena, posílám novou.")
-                    self.current_capital_message_id = None
-
-            # Nové odeslání zprávy
-            msg = await channel.send(embed=embed)
-            self.current_capital_message_id = msg.id
-            save_room_id("capital_status_message", msg.id)
-            print("✅ [clan_capital] Embed byl odeslán.")
+            # Úprava přes PartialMessage, stejný embed se neposílá; smazaná zpráva → nová
+            message_id = await live_message.publish(channel, self.current_capital_message_id, embed=embed)
+            if message_id != self.current_capital_message_id:
+                self.current_capital_message_id = message_id
+                bot_state.set(CAPITAL_STATUS_MESSAGE, message_id)
+                print("✅ [clan_capital] Embed byl odeslán.")
 
         except Exception as e:
             print(f"❌ [clan_capital] Chyba při aktualizaci embed zprávy: {str(e)}")
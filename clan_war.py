@@ -1,11 +1,35 @@
+import asyncio
+
 import discord
 from discord.utils import escape_markdown
 from datetime import datetime, timezone
 from typing import Optional
-import json
-import os
 
-from database import notify_single_warning, get_all_links
+import live_message
+from api_handler import ChangeTracker, parse_war
+from state_store import (
+    bot_state,
+    WAR_STATUS_MESSAGE,
+    LAST_WAR_EVENT_ORDER,
+    LAST_WAR_RULES_ORDER,
+    CURRENT_WAR_START_TIME,
+    LAST_NO_WAR_REMINDER_DATE,
+    CWL_ACTIVE,
+    WAR_REMINDER_PREFIX,
+    war_reminder_key,
+)
+from coc_models import War, WarAttack
+from database import notify_single_warning, get_discord_id_by_tag
+from war_diff import (
+    WarDiffer,
+    WarEventBus,
+    WarEvent,
+    NewWar,
+    StateChanged,
+    NewAttack,
+    MembersChanged,
+    DestructionChanged,
+)
 from constants import (
     TOWN_HALL_EMOJIS,
     WAR_INFO_CHANNEL_ID,
@@ -15,6 +39,9 @@ from constants import (
     PRAISE_CHANNEL_ID
 )
 
+DM_CONCURRENCY = 5  # kolik DM / varování se posílá souběžně
+ATTACK_FEED_BATCH = 10  # max. embedů v jedné zprávě (limit Discordu)
+
 STATE_MAP = {
     "inWar": "Probíhá",
     "preparation": "Příprava",
@@ -22,56 +49,13 @@ STATE_MAP = {
     "notInWar": "Žádná válka"
 }
 
-# === Sdílené ID úložiště ===
-THIS_DIR = os.path.dirname(os.path.abspath(__file__))
-ROOM_IDS_PATH = os.path.join(THIS_DIR, "discord_rooms_ids.json")
-
-
-class RoomIdStorage:
-    def __init__(self):
-        self.data = {}
-        self.load()
-
-    def load(self):
-        try:
-            if os.path.exists(ROOM_IDS_PATH):
-                with open(ROOM_IDS_PATH, "r") as f:
-                    self.data = json.load(f)
-        except Exception as e:
-            print(f"[clan_war] [discord_rooms_ids] Chyba při čtení: {e}")
-            self.data = {}
-
-    def save(self):
-        try:
-            with open(ROOM_IDS_PATH, "w") as f:
-                json.dump(self.data, f)
-        except Exception as e:
-            print(f"[clan_war] [discord_rooms_ids] Chyba při zápisu: {e}")
-
-    def get(self, key: str, default=None):
-        self.load()
-        return self.data.get(key, default)
-
-    def set(self, key: str, value):
-        self.load()
-        self.data[key] = value
-        self.save()
-
-    def remove(self, key: str):
-        self.load()
-        if key in self.data:
-            del self.data[key]
-            self.save()
 
 def reset_war_reminder_flags(self):
     """Smaže všechny klíče začínající na 'war_reminder_'"""
-    room_storage.set("last_war_event_order", 0)
-    keys_to_remove = [key for key in room_storage.data if key.startswith("war_reminder_")]
-    for key in keys_to_remove:
-        del room_storage.data[key]
-    if keys_to_remove:
-        room_storage.save()
-        print(f"♻️ [clan_war] Resetováno {len(keys_to_remove)} war reminder flagů.")
+    bot_state.set(LAST_WAR_EVENT_ORDER, self._differ.last_order)
+    removed = bot_state.delete_prefix(WAR_REMINDER_PREFIX)
+    if removed:
+        print(f"♻️ [clan_war] Resetováno {removed} war reminder flagů.")
 
 
 async def force_end_war_status(self):
@@ -85,25 +69,22 @@ async def force_end_war_status(self):
         return
 
     try:
-        message = await channel.fetch_message(self.current_war_message_id)
-        if message.embeds:
-            embed = message.embeds[0]
-            embed.set_footer(text="Stav války: Ukončeno")
-            await message.edit(embed=embed)
+        await live_message.set_footer(channel, self.current_war_message_id, "Stav války: Ukončeno")
 
         # Clear the stored message ID
+        live_message.forget(self.current_war_message_id)
         self.current_war_message_id = None
-        room_storage.set("war_status_message", None)
+        bot_state.set(WAR_STATUS_MESSAGE, None)
         print("♻️ [clan_war] War status byl ručně ukončen")
 
     except discord.NotFound:
         print("⚠️ [clan_war] War status zpráva nenalezena")
+        live_message.forget(self.current_war_message_id)
         self.current_war_message_id = None
-        room_storage.set("war_status_message", None)
+        bot_state.set(WAR_STATUS_MESSAGE, None)
     except Exception as e:
         print(f"❌ [clan_war] Chyba při ručním ukončení war statusu: {str(e)}")
 
-room_storage = RoomIdStorage()
 
 
 class ClanWarHandler:
@@ -113,9 +94,25 @@ class ClanWarHandler:
         self.war_status_channel_id = WAR_INFO_CHANNEL_ID
         self.war_events_channel_id = WAR_EVENTS_CHANNEL_ID
         self.war_ping_channel_id = LOG_CHANNEL_ID
-        self.last_processed_order = room_storage.get("last_war_event_order") or 0
-        self.current_war_message_id = room_storage.get("war_status_message")
-        self._last_state = None
+        self.current_war_message_id = bot_state.get(WAR_STATUS_MESSAGE)
+        self._changes = ChangeTracker()  # které revize dat z API už byly zpracovány
+
+        # Porovnání snapshotů a rozesílání událostí (war_diff)
+        self._differ = WarDiffer(bot_state.get(CURRENT_WAR_START_TIME), bot_state.get(LAST_WAR_EVENT_ORDER))
+        # Checkpoint pochval / varování za útoky; feed útoků se posouvá až po pravidlech,
+        # takže jeho checkpoint je spodní mez (i pro stav uložený starší verzí)
+        self._rules_order = max(bot_state.get(LAST_WAR_RULES_ORDER), self._differ.last_order)
+        self._end_warned: set[str] = set()  # komu už bylo uděleno varování za neodehranou válku
+        self._status_stale = False
+        self._attacks_per_member = 2
+        self._feed: list[tuple[int, Optional[discord.Embed]]] = []  # (order, embed) čekající na odeslání
+        self.events = WarEventBus()
+        self.events.subscribe(NewWar, self._on_new_war)
+        self.events.subscribe(StateChanged, self._on_state_changed)
+        for event_type in (StateChanged, MembersChanged, DestructionChanged):
+            self.events.subscribe(event_type, self._mark_status_stale)
+        self.events.subscribe(NewAttack, self._on_attack_rules)
+        self.events.subscribe(NewAttack, self._on_new_attack)
 
         # Cache
         self._mention_cache = {}
@@ -157,12 +154,12 @@ class ClanWarHandler:
             self._escaped_names[name] = escape_markdown(name.replace('_', r'\_'))
         return self._escaped_names[name]
 
-    async def remind_missing_attacks(self, war_data: dict, send_warning: bool = True) -> Optional[str]:
+    async def remind_missing_attacks(self, war: War, send_warning: bool = True) -> Optional[str]:
         """
         Odešle upozornění do vybraného kanálu, pokud zbývá 6h, 2h nebo 1h do konce války
         a někteří hráči ještě neodehráli ani jeden útok. Každé upozornění se odešle jen jednou.
         """
-        end_time = self._parse_coc_time(war_data.get('endTime', ''))
+        end_time = war.end
         if not end_time:
             return None
 
@@ -171,19 +168,20 @@ class ClanWarHandler:
         remaining_hours = remaining_seconds / 3600
         hour_marks = [6, 2, 1]
 
-        # Seznam členů klanu, kteří zatím neútočili
-        missing_members = [m for m in war_data.get('clan', {}).get('members', []) if not m.get('attacks')]
+        # Seznam členů klanu, kteří zatím neútočili, a jejich Discord účty (jeden průchod, bez REST)
+        missing_members = war.clan.missing_attacks()
+        targets = self._resolve_discord_targets([m.tag for m in missing_members])
 
         # Pokud je povoleno zasílat varování
         if send_warning:
             for mark in hour_marks:
-                key = f"war_reminder_{mark}h"
-                already_sent = room_storage.get(key)
+                key = war_reminder_key(mark)
+                already_sent = bot_state.get(key)
 
                 # Kontrola časového intervalu a zda už nebylo upozornění odesláno
                 if remaining_hours <= mark and not already_sent:
                     if not missing_members:
-                        room_storage.set(key, True)
+                        bot_state.set(key, True)
                         continue
 
                     ping_channel = self.bot.get_channel(self.war_ping_channel_id)
@@ -200,34 +198,23 @@ class ClanWarHandler:
                         else:
                             msg = await ping_channel.send(f"{mention} Připomínka: zbývá {time_str} do konce války")
 
-                        # Odeslat zmínky hráčů
-                        mentions_list = []
-                        for m in missing_members:
-                            tag = m.get("tag")
-                            #name = self._escape_name(m.get("name", "Unknown")) # pro formátování jmena
-                            name = m.get("name", "Unknown")
-                            discord_mention = await self._get_discord_mention(tag)
-                            if discord_mention:
-                                try:
-                                    user = await self.bot.fetch_user(int(discord_mention.strip("<@!>")))
-                                    dm_message = (
-                                        f"⚠️ **Připomínka: Ve válce zbývá {time_str} do konce!**\n"
-                                        f"Ještě jsi neodehrál útok. Prosím, zaútoč co nejdříve!\n"
-                                        f"Pokud neodheraješ útok, dostaneš varování.\n"
-                                    )
-                                    await user.send(dm_message)
-                                    print(f"✉️ [clan_war] [DM] Upozornění odesláno hráči {name} ({tag})")
-                                except discord.Forbidden:
-                                    print(f"❌ [clan_war] [DM] Nelze poslat DM hráči {name} (blokované DMs?)")
-                                except Exception as e:
-                                    print(f"❌ [clan_war] [DM] Chyba při odesílání DM hráči {name}: {e}")
-                            mentions_list.append(discord_mention or f"@{name}")
+                        # DM propojeným hráčům (souběžně) a zmínky do kanálu
+                        dm_message = (
+                            f"⚠️ **Připomínka: Ve válce zbývá {time_str} do konce!**\n"
+                            f"Ještě jsi neodehrál útok. Prosím, zaútoč co nejdříve!\n"
+                            f"Pokud neodheraješ útok, dostaneš varování.\n"
+                        )
+                        await self._send_dms(
+                            [(m.name, m.tag, *targets[m.tag]) for m in missing_members if m.tag in targets],
+                            dm_message
+                        )
+                        mentions_list = [self._mention_for(targets.get(m.tag)) or f"@{m.name}" for m in missing_members]
 
                         for i in range(0, len(mentions_list), 5):
                             await ping_channel.send(" ".join(mentions_list[i:i + 5]) + " .")
 
                         # Uložení stavu, že upozornění bylo odesláno
-                        room_storage.set(key, True)
+                        bot_state.set(key, True)
                         print(f"♻️ [clan_war] [Reminder] Upozornění {mark}h odesláno (zbývá {remaining_hours:.2f}h)")
 
                     except Exception as e:
@@ -238,16 +225,10 @@ class ClanWarHandler:
         if not missing_members:
             return f"Do konce války zbývá {time_remaining_str}. ✅ Všichni členové klanu již provedli své útoky."
 
-        mentions_output = []
-        for m in missing_members:
-            tag = m.get("tag")
-            name = self._escape_name(m.get("name", "Unknown"))
-            discord_mention = await self._get_discord_mention(tag)
-
-            if discord_mention:
-                mentions_output.append(discord_mention)
-            else:
-                mentions_output.append(f"@{name} (ID nenalezeno)")
+        mentions_output = [
+            self._mention_for(targets.get(m.tag)) or f"@{self._escape_name(m.name)} (ID nenalezeno)"
+            for m in missing_members
+        ]
 
         return f"Do konce války zbývá {time_remaining_str}. Útok dosud neprovedli: " + " ".join(mentions_output)
 
@@ -258,77 +239,114 @@ class ClanWarHandler:
         else:
             mentions_output = []
             for m in missing_members:
-                tag = m.get("tag")
-                name = self._escape_name(m.get("name", "Unknown"))
+                tag = m.tag
+                name = self._escape_name(m.name)
                 discord_mention = await self._get_discord_mention(tag)
                 mentions_output.append(discord_mention or f"@{name}")
             return f"Do konce války zbývá {time_remaining_str}. Útok dosud neprovedli: " + " ".join(
                 mentions_output) + " ."
 
     async def process_war_data(self, war_data: dict, attacks_per_member: int = 2):
-        """Zpracuje data o válce a aktualizuje Discord"""
+        """
+        Zpracuje data o válce: porovná je s předchozím snapshotem (WarDiffer) a události
+        rozešle posluchačům (status embed, feed útoků, varování, oznámení).
+        Časové připomínky běží pro aktivní válku každý cyklus.
+        """
         if not war_data:
             print("❌ [clan_war] Žádná data o válce ke zpracování")
             return
 
-        # --- Detekce nové války podle startTime ---
-        current_start_time = war_data.get('startTime')
-        stored_start_time = room_storage.get("current_war_start_time")
-
-        if current_start_time and current_start_time != stored_start_time:
-            print(f"🆕 [clan_war] Detekován nový čas začátku války: {current_start_time} (původní: {stored_start_time}). Resetuji ID zprávy.")
-            
-            # Reset ID zprávy, aby se poslala nová
-            self.current_war_message_id = None
-            room_storage.set("war_status_message", None)
-            
-            # Uložení nového času začátku
-            room_storage.set("current_war_start_time", current_start_time)
-
-            # Reset pomocných proměnných pro novou válku
-            self.last_processed_order = 0
-            reset_war_reminder_flags(self)
-        # --- Konec detekce ---
-
-        # --- Kontrola, zda je náš tag v opponent a pokud ano prohodíme je ---
-        our_clan_tag = self.config.get("CLAN_TAG", "").strip().upper()
-        if war_data.get('opponent', {}).get('tag', '').strip().upper() == our_clan_tag:
-            print("🔄 [clan_war] Prohazuji klany (náš tag nalezen v opponent)")
-            # Prohození clan a opponent
-            clan_data = war_data['opponent']
-            opponent_data = war_data['clan']
-            war_data['clan'] = clan_data
-            war_data['opponent'] = opponent_data
-        # --- Konec kontroly ---
-
-        state = war_data.get('state', 'unknown')
-
-        # Reset při změně stavu
-        if self._last_state is not None and state == "warEnded" and self._last_state != "warEnded":
-            await self.update_war_status(war_data, attacks_per_member)
-            self.current_war_message_id = None
-            room_storage.set("war_status_message", None)
+        # Převod na model; `war.clan` je vždy náš klan (i když jsme v API jako opponent)
+        war = parse_war(war_data, self.config.get("CLAN_TAG", ""))
+        active = war.state in ('inWar', 'preparation')
+
+        # --- Data se od minula nezměnila (cache/304) → jen časové připomínky ---
+        if self._changes.is_unchanged(war_data):
+            if active:
+                try:
+                    await self.remind_missing_attacks(war)
+                except Exception as e:
+                    print(f"❌ [clan_war] Chyba při kontrole připomínek: {str(e)}")
+            return
+
+        self._attacks_per_member = attacks_per_member
+        start_time = war_data.get('startTime')
+        events = self._differ.diff(war, start_time)
+        failed = await self.events.publish(events)
+        feed_sent = await self._flush_attack_feed()
+
+        # Snapshot se potvrdí, jen když se doručily všechny události kromě útoků
+        # (ty se opakují samostatně od checkpointu) – jinak příští diff vrátí
+        # např. StateChanged znovu
+        if all(isinstance(e, NewAttack) for e in failed):
+            self._differ.commit(war, start_time)
+
+        if active:
+            try:
+                await self.remind_missing_attacks(war)
+                if self._status_stale:
+                    self._status_stale = not await self.update_war_status(war, attacks_per_member)
+            except Exception as e:
+                print(f"❌ [clan_war] Chyba při zpracování dat: {str(e)}")
+
+        # Nedoručené události i neaktualizovaný status embed se příští cyklus zopakují
+        # (stejná data se jinak přeskakují)
+        if not failed and feed_sent and not self._status_stale:
+            self._changes.mark_seen(war_data)
+
+    # === Posluchači událostí (war_diff) ===
+    async def _on_new_war(self, event: NewWar):
+        """Nová válka (jiný startTime) → nová status zpráva, reset checkpointů a připomínek."""
+        if bot_state.get(CURRENT_WAR_START_TIME) == event.start_time:
+            return  # opakované doručení – reset už proběhl
+        print(f"🆕 [clan_war] Detekován nový čas začátku války: {event.start_time}. Resetuji ID zprávy.")
+        live_message.forget(self.current_war_message_id)
+        self.current_war_message_id = None
+        bot_state.set(WAR_STATUS_MESSAGE, None)
+        bot_state.set(CURRENT_WAR_START_TIME, event.start_time)
+        self._rules_order = 0
+        bot_state.set(LAST_WAR_RULES_ORDER, 0)
+        self._end_warned.clear()
+        reset_war_reminder_flags(self)
+
+    async def _on_state_changed(self, event: StateChanged):
+        """Oznámení přechodů: konec války (report neodehraných útoků) a začátek Battle Day."""
+        war, previous, state = event.war, event.previous, event.current
+        if previous is None:
+            return  # první snapshot – žádný přechod
+
+        if state == "warEnded":
+            # Při opakovaném doručení (selhal předchozí pokus) se hotové kroky přeskočí
+            if self.current_war_message_id:
+                if not await self.update_war_status(war, self._attacks_per_member):
+                    raise RuntimeError("závěrečná aktualizace stavu války selhala")
+                live_message.forget(self.current_war_message_id)
+                self.current_war_message_id = None
+                bot_state.set(WAR_STATUS_MESSAGE, None)
 
             # Oznámení o neodehraných útocích
             war_end_channel = self.bot.get_channel(self.war_ping_channel_id)
-            missing = [m for m in war_data.get('clan', {}).get('members', []) if not m.get('attacks')]
+            missing = war.clan.missing_attacks()
             if war_end_channel and missing:
                 await war_end_channel.send("🚨 Následující hráči **neodehráli** útoky ve válce: 🚨")
-                mentions = []
-
-                for m in missing:
-                    tag = m.get("tag")
-                    name = self._escape_name(m.get("name", "Unknown"))
-                    discord_mention = await self._get_discord_mention(tag)
-                    mentions.append(discord_mention or f"@{name}")
-
-                    # Přidání varování
-                    await notify_single_warning(
-                        bot=self.bot,
-                        coc_tag=tag,
-                        date_time=datetime.now().strftime("%d/%m/%Y %H:%M"),
-                        reason="neodehraná clan war válka"
-                    )
+                targets = self._resolve_discord_targets([m.tag for m in missing])
+                mentions = [self._mention_for(targets.get(m.tag)) or f"@{self._escape_name(m.name)}" for m in missing]
+
+                # Přidání varování (souběžně, max DM_CONCURRENCY najednou)
+                date_time = datetime.now().strftime("%d/%m/%Y %H:%M")
+                semaphore = asyncio.Semaphore(DM_CONCURRENCY)
+
+                async def warn(tag: str):
+                    async with semaphore:
+                        await notify_single_warning(
+                            bot=self.bot,
+                            coc_tag=tag,
+                            date_time=date_time,
+                            reason="neodehraná clan war válka"
+                        )
+                        self._end_warned.add(tag)
+
+                await asyncio.gather(*(warn(m.tag) for m in missing if m.tag not in self._end_warned))
 
                 for i in range(0, len(mentions), 5):
                     await war_end_channel.send(" ".join(mentions[i:i + 5]) + " .")
@@ -341,14 +359,8 @@ class ClanWarHandler:
             except Exception as e:
                 print(f"❌ [clan_war] Chyba při odesílání zprávy o konci války: {e}")
 
-        # Reset událostí při nové válce
-        if self._last_state is not None and self._last_state != 'preparation' and state == 'preparation':
-            print("🔁 [clan_war] Detekována nová válka – resetuji pořadí útoků.")
-            self.last_processed_order = 0
-            reset_war_reminder_flags(self)
-
         # === Notifikace startu války (Battle Day) ===
-        if self._last_state == 'preparation' and state == 'inWar':
+        elif previous == 'preparation' and state == 'inWar':
             log_channel = self.bot.get_channel(self.war_ping_channel_id)
             if log_channel:
                 try:
@@ -357,90 +369,109 @@ class ClanWarHandler:
                 except Exception as e:
                     print(f"❌ [clan_war] Chyba při odesílání notifikace o začátku Battle Day: {e}")
 
-        self._last_state = state
+    async def _mark_status_stale(self, event: WarEvent):
+        """Status embed se překreslí jednou po doručení všech událostí snapshotu."""
+        self._status_stale = True
 
-        # Pokud není ve válce nebo přípravě, nedělej nic dalšího
-        if state not in ('inWar', 'preparation'):
+    async def _on_new_attack(self, event: NewAttack):
+        """Feed útoků: embed se zařadí do dávky, odešle ji `_flush_attack_feed`."""
+        attack = event.attack
+        if event.war.state not in ('inWar', 'preparation') or attack.order <= self._differ.last_order:
             return
+        self._feed.append((attack.order, await self._create_attack_embed(attack, event.war, event.is_repeat)))
 
-        try:
-            await self.remind_missing_attacks(war_data)
-            await self.update_war_status(war_data, attacks_per_member)
-
-            if war_data.get('state') in ('inWar', 'preparation'):
-                await self.process_war_events(war_data)
+    async def _flush_attack_feed(self) -> bool:
+        """
+        Odešle čekající embedy útoků v pořadí, po ATTACK_FEED_BATCH v jedné zprávě.
+        Checkpoint (LAST_WAR_EVENT_ORDER) se posune po každé odeslané dávce; při chybě
+        se zbytek zahodí a příští diff ho vrátí znovu. Vrací False, pokud něco zůstalo neodesláno.
+        """
+        feed, self._feed = self._feed, []
+        if not feed:
+            return True
 
-        except Exception as e:
-            print(f"❌ [clan_war] Chyba při zpracování dat: {str(e)}")
+        channel = self.bot.get_channel(self.war_events_channel_id)
+        if not channel:
+            print("❌ [clan_war] Kanál pro události války nebyl nalezen")
+            return False
 
-    async def update_war_status(self, war_data: dict, attacks_per_member: int = 2):
-        """Vytvoří nebo aktualizuje embed se stavem války"""
+        for i in range(0, len(feed), ATTACK_FEED_BATCH):
+            batch = feed[i:i + ATTACK_FEED_BATCH]
+            embeds = [embed for _, embed in batch if embed is not None]
+            try:
+                if embeds:
+                    await channel.send(embeds=embeds)
+            except Exception as e:
+                print(f"❌ [clan_war] Chyba při odesílání útoků #{batch[0][0]}–#{batch[-1][0]}: {e}")
+                return False
+            self._differ.checkpoint(batch[-1][0])
+            bot_state.set(LAST_WAR_EVENT_ORDER, self._differ.last_order)
+        return True
+
+    async def update_war_status(self, war: War, attacks_per_member: int = 2) -> bool:
+        """Vytvoří nebo aktualizuje embed se stavem války. Vrací False, pokud se to nepovedlo."""
         channel = self.bot.get_channel(self.war_status_channel_id)
         if not channel:
             print("❌ [clan_war] Kanál pro stav války nebyl nalezen")
-            return
+            return False
 
-        embed = self._create_war_status_embed(war_data, attacks_per_member)
+        embed = self._create_war_status_embed(war, attacks_per_member)
 
         try:
-            if self.current_war_message_id:
-                try:
-                    message = await channel.fetch_message(self.current_war_message_id)
-                    await message.edit(embed=embed)
-                except discord.NotFound:
-                    print("⚠️ [clan_war] Původní zpráva nenalezena, posílám novou.")
-                    self.current_war_message_id = None
-
-            if not self.current_war_message_id:
-                message = await channel.send(embed=embed)
-                self.current_war_message_id = message.id
-                room_storage.set("war_status_message", message.id)
+            # Úprava přes PartialMessage, stejný embed se neposílá; smazaná zpráva → nová
+            message_id = await live_message.publish(channel, self.current_war_message_id, embed=embed)
+            if message_id != self.current_war_message_id:
+                self.current_war_message_id = message_id
+                bot_state.set(WAR_STATUS_MESSAGE, message_id)
+            return True
 
         except Exception as e:
             print(f"❌ [clan_war] Chyba při aktualizaci stavu války: {str(e)}")
+            return False
 
-    def _create_war_status_embed(self, war_data: dict, attacks_per_member: int = 2) -> discord.Embed:
+    def _create_war_status_embed(self, war: War, attacks_per_member: int = 2) -> discord.Embed:
         """Vytvoří embed se stavem války s dynamickým rozdělením hráčů"""
-        clan = war_data.get('clan', {})
-        opponent = war_data.get('opponent', {})
-        state = war_data.get('state', 'unknown')
+        clan = war.clan
+        opponent = war.opponent
+        state = war.state
+        max_attacks = war.attacks_per_member or attacks_per_member
 
         embed = discord.Embed(
-            title=f"Clan War: {self._escape_name(clan.get('name', 'Náš klan'))} vs {self._escape_name(opponent.get('name', 'Protivník'))}",
+            title=f"Clan War: {self._escape_name(clan.name)} vs {self._escape_name(opponent.name)}",
             color=discord.Color.blue() if state == "inWar" else discord.Color.gold()
         )
 
         # Základní statistiky
-        our_attacks_count = clan.get('attacks', 0)
-        our_stars_count = clan.get('stars', 0)
+        our_attacks_count = clan.attacks
+        our_stars_count = clan.stars
         our_avg_stars = round(our_stars_count / our_attacks_count, 2) if our_attacks_count > 0 else 0
 
-        their_attacks_count = opponent.get('attacks', 0)
-        their_stars_count = opponent.get('stars', 0)
+        their_attacks_count = opponent.attacks
+        their_stars_count = opponent.stars
         their_avg_stars = round(their_stars_count / their_attacks_count, 2) if their_attacks_count > 0 else 0
 
         our_stats = (
             f"**{our_stars_count}⭐**\n"
-            f"Útoky: {our_attacks_count}/{war_data.get('teamSize', 0) * war_data.get('attacksPerMember', attacks_per_member)}\n"
-            f"{round(clan.get('destructionPercentage', 0), 1)}%\n"
+            f"Útoky: {our_attacks_count}/{war.team_size * max_attacks}\n"
+            f"{round(clan.destruction, 1)}%\n"
             f"Ø {our_avg_stars}⭐/útok"
         )
         their_stats = (
             f"**{their_stars_count}⭐**\n"
-            f"Útoky: {their_attacks_count}/{war_data.get('teamSize', 0) * war_data.get('attacksPerMember', attacks_per_member)}\n"
-            f"{round(opponent.get('destructionPercentage', 0), 1)}%\n"
+            f"Útoky: {their_attacks_count}/{war.team_size * max_attacks}\n"
+            f"{round(opponent.destruction, 1)}%\n"
             f"Ø {their_avg_stars}⭐/útok"
         )
 
-        embed.add_field(name=f"**{self._escape_name(clan.get('name', 'Náš klan'))}**", value=our_stats, inline=True)
+        embed.add_field(name=f"**{self._escape_name(clan.name)}**", value=our_stats, inline=True)
         embed.add_field(name="\u200b", value="⁣  **VS**", inline=True)
-        embed.add_field(name=f"**{self._escape_name(opponent.get('name', 'Protivník'))}**", value=their_stats,
+        embed.add_field(name=f"**{self._escape_name(opponent.name)}**", value=their_stats,
                         inline=True)
 
         # Časy
-        prep_time = self._parse_coc_time(war_data.get('preparationStartTime', ''))
-        start_time = self._parse_coc_time(war_data.get('startTime', ''))
-        end_time = self._parse_coc_time(war_data.get('endTime', ''))
+        prep_time = war.preparation_start
+        start_time = war.start
+        end_time = war.end
 
         time_fields = [
             ("🛡️ Příprava začala", prep_time),
@@ -457,17 +488,18 @@ class ClanWarHandler:
                 )
 
         # Hráči – dynamické dělení na více fieldů podle limitu 1024 znaků
-        if war_data.get('state') in ('inWar', 'preparation', 'warEnded'):
+        if state in ('inWar', 'preparation', 'warEnded'):
             def format_members(members):
+                # Členové jsou už seřazení podle mapPosition, m.position je 1-based pořadí
                 formatted = []
-                for idx, m in enumerate(sorted(members, key=lambda x: x.get('mapPosition', 0)), start=1):
+                for m in members:
                     formatted.append(
                         "{index}. {emoji} {name} ({attacks}/{max_attacks})".format(
-                            index=idx,
-                            emoji=TOWN_HALL_EMOJIS.get(m.get('townhallLevel', 10), ''),
-                            name=(m.get('name', 'Unknown')),
-                            attacks=len(m.get('attacks', [])),
-                            max_attacks=war_data.get('attacksPerMember', attacks_per_member)
+                            index=m.position,
+                            emoji=TOWN_HALL_EMOJIS.get(m.townhall, ''),
+                            name=m.name,
+                            attacks=len(m.attacks),
+                            max_attacks=max_attacks
                         )
                     )
                 return formatted
@@ -492,8 +524,8 @@ class ClanWarHandler:
                     chunks.append(("\n".join(current_left), "\n".join(current_right)))
                 return chunks
 
-            our_raw = format_members(clan.get('members', []))
-            their_raw = format_members(opponent.get('members', []))
+            our_raw = format_members(clan.members)
+            their_raw = format_members(opponent.members)
 
             # Zarovnej délky seznamů
             max_len = max(len(our_raw), len(their_raw))
@@ -517,81 +549,136 @@ class ClanWarHandler:
         embed.set_footer(text=f"Stav války: {friendly_state}")
         return embed
 
-    async def process_war_events(self, war_data: dict):
-        """Zpracuje nové události ve válce (útoky)"""
-        channel = self.bot.get_channel(self.war_events_channel_id)
-        if not channel:
-            print("❌ [clan_war] Kanál pro události války nebyl nalezen")
+    async def _on_attack_rules(self, event: NewAttack):
+        """
+        Pochvala za mirror a varování za non-mirror útok (jen naše útoky v aktivní válce).
+        Má vlastní checkpoint – feed útoků se po chybě opakuje, varování se znovu neudělují.
+        """
+        attack, war = event.attack, event.war
+        if (not event.is_ours or war.state not in ('inWar', 'preparation')
+                or attack.order <= self._rules_order):
             return
 
-        # Získání všech útoků
-        attacks = []
-        for side in ('clan', 'opponent'):
-            for member in war_data.get(side, {}).get('members', []):
-                attacks.extend(member.get('attacks', []))
+        self._rules_order = attack.order
+        bot_state.set(LAST_WAR_RULES_ORDER, attack.order)
+        attacker = war.member(attack.attacker_tag)
+        defender = war.member(attack.defender_tag)
+        remaining_hours = self._remaining_hours(war)
+        if not attacker or not defender or remaining_hours is None:
+            return
 
-        # Filtrace a řazení nových útoků
-        new_attacks = sorted(
-            (a for a in attacks if a.get('order', 0) > self.last_processed_order),
-            key=lambda x: x.get('order', 0)
-        )
+        attacker_pos = attacker.position
+        defender_pos = defender.position
+        attacker_name = attacker.name
+        defender_name = defender.name
+        discord_mention = await self._get_discord_mention(attacker.tag)
+
+        # Pochvala za mirror
+        if (attacker_pos == defender_pos and
+            attack.destruction == 100 and
+            remaining_hours >= 5):
+            praise_channel = self.bot.get_channel(PRAISE_CHANNEL_ID) # pošle do místnosti s pochvaly
+            name_or_mention = discord_mention or f"@{attacker.name}"
+            if praise_channel:
+                await praise_channel.send(f"{name_or_mention}\nPochvala za krásný útok na mirror včas!")
+
+        # Varování za non-mirror
+        if not event.is_repeat and attacker_pos != defender_pos:
+            if remaining_hours >= 5:
+                await notify_single_warning(
+                    bot=self.bot,
+                    coc_tag=attacker.tag,
+                    date_time=datetime.now().strftime("%d/%m/%Y %H:%M"),
+                    reason="clan wars útok který nebyl mirror"
+                )
 
-        if not new_attacks:
-            return
+                # Oznámení do log kanálu
+                log_channel = self.bot.get_channel(LOG_CHANNEL_ID)
+                if log_channel:
+                    # Zjisti mirror útočníka (soupeř na stejné pozici jako útočník)
+                    mirror_enemy = war.opponent.at(attacker_pos)
+                    mirror_name = mirror_enemy.name if mirror_enemy else "?"
+                    mirror_th = mirror_enemy.townhall if mirror_enemy else 10
+                    mirror_th_emoji = TOWN_HALL_EMOJIS.get(mirror_th, "")
+
+                    # Náš hráč na pozici obránce (komu útočník "vyzral" cíl)
+                    our_defender_pos_member = war.clan.at(defender_pos)
+                    our_at_defender_name = our_defender_pos_member.name if our_defender_pos_member else "?"
+                    our_at_defender_th = our_defender_pos_member.townhall if our_defender_pos_member else 10
+                    our_at_defender_th_emoji = TOWN_HALL_EMOJIS.get(our_at_defender_th, "")
+                    our_at_defender_mention = (
+                        await self._get_discord_mention(our_defender_pos_member.tag)
+                        if our_defender_pos_member else None
+                    )
+                    our_at_defender_display = our_at_defender_mention or f"**{our_at_defender_name}**"
+
+                    attacker_th_emoji = TOWN_HALL_EMOJIS.get(attacker.townhall, "")
+                    defender_th_emoji = TOWN_HALL_EMOJIS.get(defender.townhall, "")
+                    stars_str = "⭐" * attack.stars or "☆☆☆"
+                    destruction = attack.destruction
 
-        # Zpracování útoků
-        for attack in new_attacks:
-            await self._send_attack_embed(channel, attack, war_data)
+                    attacker_display = discord_mention or f"**{attacker_name}**"
 
-        # Uložení posledního orderu
-        self.last_processed_order = max(a.get('order', 0) for a in new_attacks)
-        room_storage.set("last_war_event_order", self.last_processed_order)
+                    log_embed = discord.Embed(
+                        title="⚠️ Non-mirror útok",
+                        color=discord.Color.orange()
+                    )
+                    log_embed.add_field(
+                        name="Útočník",
+                        value=f"**#{attacker_pos}** {attacker_th_emoji} {attacker_name}\n{attacker_display}",
+                        inline=True
+                    )
+                    log_embed.add_field(
+                        name="Zaútočil na",
+                        value=f"**#{defender_pos}** {defender_th_emoji} {defender_name}\n`{stars_str}  {destruction}%`",
+                        inline=True
+                    )
+                    log_embed.add_field(
+                        name="Mirror (měl zaútočit na)",
+                        value=f"**#{attacker_pos}** {mirror_th_emoji} {mirror_name}",
+                        inline=True
+                    )
+                    log_embed.add_field(
+                        name=f"Náš hráč na #{defender_pos} (vyžraný cíl)",
+                        value=f"**#{defender_pos}** {our_at_defender_th_emoji} {our_at_defender_name}\n{our_at_defender_display}",
+                        inline=False
+                    )
+                    log_embed.set_footer(text=f"Útok v pořadí #{attack.order} | Do konce war: {remaining_hours:.1f}h")
+                    await log_channel.send(embed=log_embed)
 
-    async def _send_attack_embed(self, channel, attack: dict, war_data: dict):
+    @staticmethod
+    def _remaining_hours(war: War) -> Optional[float]:
+        """Hodiny do konce války (nejméně 0), None pokud konec není znám."""
+        if not war.end:
+            return None
+        return max((war.end - datetime.now(timezone.utc)).total_seconds() / 3600, 0)
+
+    async def _create_attack_embed(self, attack: WarAttack, war: War, is_oprava: bool) -> Optional[discord.Embed]:
         """Vytvoří embed pro jeden útok se stejným číslováním jako hlavní embed"""
-        attacker = self._find_member_by_tag(attack.get('attackerTag'), war_data)
-        defender = self._find_member_by_tag(attack.get('defenderTag'), war_data)
+        attacker = war.member(attack.attacker_tag)
+        defender = war.member(attack.defender_tag)
 
         if not attacker or not defender:
-            return
-
-        is_our_attack = any(m.get('tag') == attacker.get('tag') for m in war_data.get('clan', {}).get('members', []))
-        discord_mention = await self._get_discord_mention(attack.get('attackerTag'))
+            return None
 
-        # Získání seřazených seznamů hráčů (stejně jako v hlavním embedu)
-        our_members_sorted = sorted(war_data.get('clan', {}).get('members', []),
-                                    key=lambda x: x.get('mapPosition', 0))
-        their_members_sorted = sorted(war_data.get('opponent', {}).get('members', []),
-                                      key=lambda x: x.get('mapPosition', 0))
+        is_our_attack = war.is_ours(attacker.tag)
+        discord_mention = await self._get_discord_mention(attack.attacker_tag)
 
-        # Nalezení pozic v seřazených seznamech (1-based)
-        attacker_pos = our_members_sorted.index(attacker) + 1 if is_our_attack else their_members_sorted.index(
-            attacker) + 1
-        defender_pos = their_members_sorted.index(defender) + 1 if is_our_attack else our_members_sorted.index(
-            defender) + 1
+        # Pozice v seřazených seznamech (1-based, stejně jako v hlavním embedu)
+        attacker_pos = attacker.position
+        defender_pos = defender.position
 
         # Zbytek původního kódu s upravenými pozicemi
         embed_color = discord.Color.red() if is_our_attack else discord.Color.blue()
         embed = discord.Embed(color=embed_color)
 
-        attacker_name = (attacker.get('name', 'Unknown'))
-        defender_name = (defender.get('name', 'Unknown'))
-        clan_name = (war_data.get('clan', {}).get('name', 'Náš klan'))
-        opponent_name = (war_data.get('opponent', {}).get('name', 'Protivník'))
-
-        left_th = attacker.get('townhallLevel', 10) if is_our_attack else defender.get('townhallLevel', 10)
-        right_th = defender.get('townhallLevel', 10) if is_our_attack else attacker.get('townhallLevel', 10)
-
-        # Kontrola oprav
-        defender_position = defender.get("mapPosition")
-        all_attacks = []
-        for side in ('clan', 'opponent'):
-            for member in war_data.get(side, {}).get('members', []):
-                all_attacks.extend(member.get('attacks', []))
+        attacker_name = attacker.name
+        defender_name = defender.name
+        clan_name = war.clan.name
+        opponent_name = war.opponent.name
 
-        duplicate_attacks = [a for a in all_attacks if
-                             a.get('defenderTag') == defender.get('tag') and a.get('order', 0) < attack.get('order', 0)]
-        is_oprava = len(duplicate_attacks) > 0
+        left_th = attacker.townhall if is_our_attack else defender.townhall
+        right_th = defender.townhall if is_our_attack else attacker.townhall
 
         # Sestavení embedu
         left_side = (
@@ -615,8 +702,8 @@ class ClanWarHandler:
 
         middle_field = (
             f"{action}\n"
-            f"{arrow}   {'⭐' * attack.get('stars', 0)}\n"
-            f"   {attack.get('destructionPercentage', 0)}%"
+            f"{arrow}   {'⭐' * attack.stars}\n"
+            f"   {attack.destruction}%"
         )
 
         embed.add_field(name="\u200b", value=left_side, inline=True)
@@ -624,106 +711,18 @@ class ClanWarHandler:
         embed.add_field(name="\u200b", value=right_side, inline=True)
 
         # Čas do konce války
-        end_time = self._parse_coc_time(war_data.get('endTime', ''))
-        remaining_hours = None
-        if end_time:
-            now = datetime.now(timezone.utc)
-            delta = end_time - now
-            remaining_hours = max(delta.total_seconds() / 3600, 0)
-
-            # Pochvala za mirror
-            if (is_our_attack and
-                attacker_pos == defender_pos and
-                attack.get("destructionPercentage", 0) == 100 and
-                remaining_hours >= 5):
-                praise_channel = self.bot.get_channel(PRAISE_CHANNEL_ID) # pošle do místnosti s pochvaly
-                discord_mention = await self._get_discord_mention(attacker.get("tag"))
-                name_or_mention = discord_mention or f"@{attacker.get('name', 'neznámý')}"
-                if praise_channel:
-                    await praise_channel.send(f"{name_or_mention}\nPochvala za krásný útok na mirror včas!")
-
-            # Varování za non-mirror
-            if is_our_attack and not is_oprava and attacker_pos != defender_pos:
-                if remaining_hours >= 5:
-                    await notify_single_warning(
-                        bot=self.bot,
-                        coc_tag=attacker.get("tag"),
-                        date_time=datetime.now().strftime("%d/%m/%Y %H:%M"),
-                        reason="clan wars útok který nebyl mirror"
-                    )
-
-                    # Oznámení do log kanálu
-                    log_channel = self.bot.get_channel(LOG_CHANNEL_ID)
-                    if log_channel:
-                        # Zjisti mirror útočníka (soupeř na stejné pozici jako útočník)
-                        mirror_enemy = (
-                            their_members_sorted[attacker_pos - 1]
-                            if attacker_pos - 1 < len(their_members_sorted)
-                            else None
-                        )
-                        mirror_name = mirror_enemy.get("name", "?") if mirror_enemy else "?"
-                        mirror_th = mirror_enemy.get("townhallLevel", 10) if mirror_enemy else 10
-                        mirror_th_emoji = TOWN_HALL_EMOJIS.get(mirror_th, "")
-
-                        # Náš hráč na pozici obránce (komu útočník "vyzral" cíl)
-                        our_defender_pos_member = (
-                            our_members_sorted[defender_pos - 1]
-                            if defender_pos - 1 < len(our_members_sorted)
-                            else None
-                        )
-                        our_at_defender_name = our_defender_pos_member.get("name", "?") if our_defender_pos_member else "?"
-                        our_at_defender_th = our_defender_pos_member.get("townhallLevel", 10) if our_defender_pos_member else 10
-                        our_at_defender_th_emoji = TOWN_HALL_EMOJIS.get(our_at_defender_th, "")
-                        our_at_defender_mention = (
-                            await self._get_discord_mention(our_defender_pos_member.get("tag"))
-                            if our_defender_pos_member else None
-                        )
-                        our_at_defender_display = our_at_defender_mention or f"**{our_at_defender_name}**"
-
-                        attacker_th_emoji = TOWN_HALL_EMOJIS.get(attacker.get("townhallLevel", 10), "")
-                        defender_th_emoji = TOWN_HALL_EMOJIS.get(defender.get("townhallLevel", 10), "")
-                        stars_str = "⭐" * attack.get("stars", 0) or "☆☆☆"
-                        destruction = attack.get("destructionPercentage", 0)
-
-                        attacker_display = discord_mention or f"**{attacker_name}**"
-
-                        log_embed = discord.Embed(
-                            title="⚠️ Non-mirror útok",
-                            color=discord.Color.orange()
-                        )
-                        log_embed.add_field(
-                            name="Útočník",
-                            value=f"**#{attacker_pos}** {attacker_th_emoji} {attacker_name}\n{attacker_display}",
-                            inline=True
-                        )
-                        log_embed.add_field(
-                            name="Zaútočil na",
-                            value=f"**#{defender_pos}** {defender_th_emoji} {defender_name}\n`{stars_str}  {destruction}%`",
-                            inline=True
-                        )
-                        log_embed.add_field(
-                            name="Mirror (měl zaútočit na)",
-                            value=f"**#{attacker_pos}** {mirror_th_emoji} {mirror_name}",
-                            inline=True
-                        )
-                        log_embed.add_field(
-                            name=f"Náš hráč na #{defender_pos} (vyžraný cíl)",
-                            value=f"**#{defender_pos}** {our_at_defender_th_emoji} {our_at_defender_name}\n{our_at_defender_display}",
-                            inline=False
-                        )
-                        log_embed.set_footer(text=f"Útok v pořadí #{attack.get('order', 0)} | Do konce war: {remaining_hours:.1f}h")
-                        await log_channel.send(embed=log_embed)
+        remaining_hours = self._remaining_hours(war)
 
         # Footer
         footer_parts = [
-            f"Útok #{attack.get('order', 0)}",
-            f"Útok trval: {attack.get('duration', 0)}s"
+            f"Útok #{attack.order}",
+            f"Útok trval: {attack.duration}s"
         ]
         if remaining_hours is not None:
             footer_parts.append(f"Do konce war: {remaining_hours:.1f}h")
 
         embed.set_footer(text=" | ".join(footer_parts))
-        await channel.send(embed=embed)
+        return embed
 
     async def check_schedule_reminder(self, war_active: bool):
         """
@@ -738,10 +737,10 @@ class ClanWarHandler:
             # Pokud není dostupná zoneinfo, použijeme lokální čas
             now = datetime.now()
 
-        print(f"🔍 [reminder] čas={now.strftime('%H:%M')}, war_active={war_active}, cwl_active={room_storage.get('cwl_active')}, last_sent={room_storage.get('last_no_war_reminder_date')}")
+        print(f"🔍 [reminder] čas={now.strftime('%H:%M')}, war_active={war_active}, cwl_active={bot_state.get(CWL_ACTIVE)}, last_sent={bot_state.get(LAST_NO_WAR_REMINDER_DATE)}")
 
         # Kontrola, zda neběží CWL (pokud běží CWL, "zapnout clan wars" nedává smysl)
-        cwl_active = room_storage.get("cwl_active") or False
+        cwl_active = bot_state.get(CWL_ACTIVE)
         if cwl_active:
             print("⏭️ [reminder] Přeskočeno — CWL je aktivní.")
             return
@@ -752,7 +751,7 @@ class ClanWarHandler:
             # Pokud není aktivní válka (ani přípravný den, ani battle day)
             if not war_active:
                 today_str = now.strftime("%Y-%m-%d")
-                last_sent = room_storage.get("last_no_war_reminder_date")
+                last_sent = bot_state.get(LAST_NO_WAR_REMINDER_DATE)
 
                 if last_sent == today_str:
                     print(f"⏭️ [reminder] Přeskočeno — dnes již odesláno ({today_str}).")
@@ -769,7 +768,7 @@ class ClanWarHandler:
                 if log_channel:
                     try:
                         await log_channel.send("čas zapnout clan wars")
-                        room_storage.set("last_no_war_reminder_date", today_str)
+                        bot_state.set(LAST_NO_WAR_REMINDER_DATE, today_str)
                         print(f"✅ [clan_war] Odeslána připomínka v {now.hour}:00")
                     except Exception as e:
                         print(f"❌ [clan_war] Chyba při odesílání připomínky: {e}")
@@ -778,50 +777,64 @@ class ClanWarHandler:
         else:
             pass  # Není 19:xx, nic neposíláme
 
-    def _find_member_by_tag(self, tag: str, war_data: dict) -> Optional[dict]:
-        """Najde člena podle tagu"""
-        if not tag:
+    def _resolve_discord_targets(self, coc_tags: list[str]) -> dict[str, tuple[int, Optional[discord.Member]]]:
+        """
+        Najde Discord účty pro celý seznam CoC tagů v jednom průchodu: index propojení
+        + cache členů guildy, bez REST volání. Vrací {tag: (discord_id, Member nebo None)}
+        jen pro propojené tagy (Member je None, pokud uživatel není na serveru).
+        """
+        guild = self.bot.get_guild(self.config['GUILD_ID'])
+        if not guild:
+            print("❌ Guild nebyla nalezena")
+
+        targets = {}
+        not_in_guild = 0
+        for tag in coc_tags:
+            discord_id = get_discord_id_by_tag(tag) if tag else None
+            if not discord_id:
+                continue
+            member = guild.get_member(discord_id) if guild else None
+            if guild and member is None:
+                not_in_guild += 1
+            targets[tag] = (discord_id, member)
+
+        if not_in_guild:
+            print(f"⚠️ {not_in_guild} propojených uživatelů není na serveru")
+        return targets
+
+    @staticmethod
+    def _mention_for(target: Optional[tuple[int, Optional[discord.Member]]]) -> Optional[str]:
+        """Mention člena serveru, jinak alespoň Discord ID; None pro nepropojený tag."""
+        if target is None:
             return None
-        for side in ('clan', 'opponent'):
-            for member in war_data.get(side, {}).get('members', []):
-                if member.get('tag') == tag:
-                    return member
-        return None
+        discord_id, member = target
+        return member.mention if member else str(discord_id)
 
     async def _get_discord_mention(self, coc_tag: str) -> Optional[str]:
         """Získá Discord ID nebo mention propojeného uživatele"""
         if not coc_tag:
             return None
+        return self._mention_for(self._resolve_discord_targets([coc_tag]).get(coc_tag))
 
-        # Normalizace tagu
-        normalized_tag = coc_tag.upper().strip()
-        if not normalized_tag.startswith("#"):
-            normalized_tag = "#" + normalized_tag
-
-        # 1. Najít Discord ID v databázi
-        discord_id = None
-        links = get_all_links()  # {discord_id: (coc_tag, coc_name)}
-
-        for did, (tag, _) in links.items():
-            if tag and tag.upper().strip() == normalized_tag:
-                discord_id = did
-                break
-
-        if not discord_id:
-            return None
+    async def _send_dms(self, recipients: list[tuple[str, str, int, Optional[discord.Member]]], content: str):
+        """
+        Pošle DM hráčům [(jméno, tag, discord_id, Member nebo None)] souběžně, max DM_CONCURRENCY najednou.
+        Uživatel se bere z cache (Member / bot.get_user), REST fetch_user jen když v cache chybí.
+        """
+        semaphore = asyncio.Semaphore(DM_CONCURRENCY)
 
-        # 2. Pokusit se najít uživatele na serveru
-        guild = self.bot.get_guild(self.config['GUILD_ID'])
-        if not guild:
-            print("❌ Guild nebyla nalezena")
-            return str(discord_id)  # Vrátíme alespoň ID
+        async def send(name: str, tag: str, discord_id: int, member: Optional[discord.Member]):
+            async with semaphore:
+                try:
+                    user = member or self.bot.get_user(discord_id) or await self.bot.fetch_user(discord_id)
+                    await user.send(content)
+                    print(f"✉️ [clan_war] [DM] Upozornění odesláno hráči {name} ({tag})")
+                except discord.Forbidden:
+                    print(f"❌ [clan_war] [DM] Nelze poslat DM hráči {name} (blokované DMs?)")
+                except Exception as e:
+                    print(f"❌ [clan_war] [DM] Chyba při odesílání DM hráči {name}: {e}")
 
-        member = guild.get_member(int(discord_id))
-        if member:
-            return member.mention  # Vrátíme mention pokud je na serveru
-        else:
-            print(f"⚠️ Uživatel s ID {discord_id} není na serveru")
-            return str(discord_id)  # Vrátíme alespoň ID
+        await asyncio.gather(*(send(*recipient) for recipient in recipients))
 
     def _parse_coc_time(self, time_str: str) -> Optional[datetime]:
         """Parsuje čas z API CoC (s cache)"""
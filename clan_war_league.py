@@ -1,29 +1,121 @@
 
+import asyncio
+
 import api_handler
-from clan_war import room_storage  # Reuse storage from clan_war.py
+from database import get_cwl_round_index, save_cwl_round_war_tag, run_db
+from state_store import bot_state, CWL_ACTIVE, CURRENT_CWL_ROUND, CWL_SEASON, CWL_CATCHUP_MODE
+
+# Kolik válek jednoho kola stahujeme najednou
+CWL_FETCH_CONCURRENCY = 4
+
+
+def is_our_war(war: dict, our_tag: str) -> bool:
+    """True, pokud je náš klan v dané válce (na straně clan nebo opponent)."""
+    our_tag = our_tag.strip().upper()
+    clan_tag = war.get("clan", {}).get("tag", "").strip().upper()
+    opp_tag = war.get("opponent", {}).get("tag", "").strip().upper()
+    return our_tag in (clan_tag, opp_tag)
+
+
+async def find_our_round_war(war_tags: list[str], config: dict,
+                             priority: int = api_handler.PRIORITY_BACKGROUND) -> tuple[str | None, dict | None, int]:
+    """
+    Stáhne války jednoho kola souběžně (max. CWL_FETCH_CONCURRENCY najednou) a najde tu naši.
+    Vrací (war_tag, data války, počet úspěšně stažených válek); pokud naše válka nebyla nalezena,
+    jsou první dvě hodnoty None.
+    """
+    semaphore = asyncio.Semaphore(CWL_FETCH_CONCURRENCY)
+
+    async def fetch(tag: str):
+        async with semaphore:
+            return tag, await api_handler.fetch_league_war(tag, config, priority=priority)
+
+    results = await asyncio.gather(*(fetch(tag) for tag in war_tags if tag != "#0"))
+
+    our_tag = config.get("CLAN_TAG", "")
+    success_fetches = 0
+    for tag, war in results:
+        if not war:
+            continue
+        success_fetches += 1
+        if is_our_war(war, our_tag):
+            return tag, war, success_fetches
+    return None, None, success_fetches
+
+
+async def iter_our_league_wars(group: dict, config: dict, priority: int = api_handler.PRIORITY_BACKGROUND,
+                               reverse: bool = False):
+    """
+    Asynchronní generátor (index kola, data naší války) přes všechna kola CWL skupiny.
+    Kola, u kterých známe náš war tag (index v SQLite), stojí nejvýš jeden požadavek –
+    ukončené války se navíc čtou z lokální cache. Neznámá kola se prohledají souběžně
+    a výsledek se do indexu uloží. `reverse=True` prochází od posledního kola.
+    """
+    league_group = api_handler.parse_league_group(group)
+    season = league_group.season
+    index = await run_db(get_cwl_round_index, season)
+    rounds = list(enumerate(league_group.rounds))
+    if reverse:
+        rounds.reverse()
+
+    for round_index, war_tags in rounds:
+        if not war_tags:
+            continue
+
+        war = None
+        known_tag = index.get(round_index)
+        if known_tag in war_tags:
+            war = await api_handler.fetch_league_war(known_tag, config, priority=priority)
+        if war is None:
+            war_tag, war, _ = await find_our_round_war(war_tags, config, priority=priority)
+            if war_tag:
+                await run_db(save_cwl_round_war_tag, season, round_index, war_tag)
+
+        if war:
+            yield round_index, war
+
 
 class ClanWarLeagueHandler:
     def __init__(self, bot, config):
         self.bot = bot
         self.config = config
 
+    async def _fetch_our_round_war(self, season: str | None, round_index: int,
+                                   war_tags: list[str]) -> tuple[dict | None, int]:
+        """
+        Najde naši válku v kole. Pokud už známe její tag, stáhne jen ji (1 požadavek),
+        jinak stáhne celé kolo souběžně a tag si zapamatuje.
+        Vrací (data naší války nebo None, počet úspěšně stažených válek).
+        """
+        known_tag = (await run_db(get_cwl_round_index, season)).get(round_index)
+        if known_tag and known_tag in war_tags:
+            war = await api_handler.fetch_league_war(known_tag, self.config)
+            if war:
+                return war, 1
+            print(f"⚠️ [CWL] Uloženou válku {known_tag} se nepodařilo stáhnout, prohledávám celé kolo.")
+
+        war_tag, war, success_fetches = await find_our_round_war(war_tags, self.config)
+        if war_tag:
+            await run_db(save_cwl_round_war_tag, season, round_index, war_tag)
+        return war, success_fetches
+
     async def handle_cwl_status(self, clan_war_handler):
         """
         Zpracovává logiku pro Clan War League (CWL).
         Kontroluje stav CWL, přepíná kola a volá zpracování válek.
         """
-        cwl_active = room_storage.get("cwl_active") or False
-        current_round = room_storage.get("current_cwl_round") or 0
-        stored_season = room_storage.get("cwl_season")
+        cwl_active = bot_state.get(CWL_ACTIVE)
+        current_round = bot_state.get(CURRENT_CWL_ROUND)
+        stored_season = bot_state.get(CWL_SEASON)
 
         if cwl_active:
             group_data = await api_handler.fetch_league_group(self.config["CLAN_TAG"], self.config)
             if group_data is False:
                 # 404 nebo neaktivní stav — CWL jednoznačně skončila
                 print("🏁 [CWL] CWL skončila (404/neaktivní stav). Resetuji cwl_active.")
-                room_storage.set("cwl_active", False)
-                room_storage.set("current_cwl_round", 0)
-                room_storage.set("cwl_season", None)
+                bot_state.set(CWL_ACTIVE, False)
+                bot_state.set(CURRENT_CWL_ROUND, 0)
+                bot_state.set(CWL_SEASON, None)
                 return
             if group_data is None:
                 # Dočasná síťová chyba — počkáme na příští pokus
@@ -36,18 +128,18 @@ class ClanWarLeagueHandler:
                 # Pokud ji ale máme a NEODPOVIDÁ, znamená to, že se stará CWL nevypla a tohle je už úplně nová liga další měsíc!
                 if stored_season:
                     print(f"🔄 [CWL] Nová sezóna CWL detekována ({current_season} vs. {stored_season}). Resetuji údaje.")
-                    room_storage.set("current_cwl_round", 0)
-                    room_storage.set("cwl_catchup_mode", True)
+                    bot_state.set(CURRENT_CWL_ROUND, 0)
+                    bot_state.set(CWL_CATCHUP_MODE, True)
                     current_round = 0
-                room_storage.set("cwl_season", current_season)
+                bot_state.set(CWL_SEASON, current_season)
 
             rounds = group_data.get("rounds", [])
             if current_round >= len(rounds):
                 # Bezpečnostní reset pokud jsme mimo rozsah
                 print("🔄 [CWL] current_cwl_round >= počet kol, resetuji.")
-                room_storage.set("cwl_active", False)
-                room_storage.set("current_cwl_round", 0)
-                room_storage.set("cwl_catchup_mode", False)
+                bot_state.set(CWL_ACTIVE, False)
+                bot_state.set(CURRENT_CWL_ROUND, 0)
+                bot_state.set(CWL_CATCHUP_MODE, False)
                 return
 
             # --- Přepracovaná iterace přes kola ---
@@ -64,49 +156,37 @@ class ClanWarLeagueHandler:
                         # Znamená to, že CWL zjevně reálně už běží aspoň od kola 0
                         # Můžeme to vynutit resetováním
                         print(f"🔄 [CWL] Objevena nekonzistence kol (aktuální {current_round} je prázdné, ale kolo 0 platí). Vracím na první kolo.")
-                        room_storage.set("current_cwl_round", 0)
-                        room_storage.set("cwl_catchup_mode", True)
+                        bot_state.set(CURRENT_CWL_ROUND, 0)
+                        bot_state.set(CWL_CATCHUP_MODE, True)
                 return
             
             active_found, ended_found = False, False
-            catchup_mode = room_storage.get("cwl_catchup_mode") or False
-            success_fetches = 0
-            our_war_found = False
-
-            for tag in war_tags:
-                if tag == "#0":
-                    continue
-                
-                war = await api_handler.fetch_league_war(tag, self.config)
-                if not war:
-                    continue
-                
-                success_fetches += 1
-                our_tag = self.config.get("CLAN_TAG", "").strip().upper()
-                clan_tag = war.get("clan", {}).get("tag", "").strip().upper()
-                opp_tag = war.get("opponent", {}).get("tag", "").strip().upper()
-                
-                if clan_tag == our_tag or opp_tag == our_tag:
-                    our_war_found = True
-                    state = war.get("state")
-                    
-                    if state == "warEnded" and catchup_mode:
-                        print(f"⏩ [CWL] Catchup: Přeskakuji zpracování ukončeného kola {current_round + 1}")
+            catchup_mode = bot_state.get(CWL_CATCHUP_MODE)
+
+            war, success_fetches = await self._fetch_our_round_war(
+                current_season or stored_season, current_round, war_tags
+            )
+            our_war_found = war is not None
+
+            if our_war_found:
+                state = war.get("state")
+
+                if state == "warEnded" and catchup_mode:
+                    print(f"⏩ [CWL] Catchup: Přeskakuji zpracování ukončeného kola {current_round + 1}")
+                    ended_found = True
+                else:
+                    if state in ("preparation", "inWar") and catchup_mode:
+                        print(f"▶️ [CWL] Catchup: Nalezeno aktivní kolo {current_round + 1}, vypínám catchup mód.")
+                        bot_state.set(CWL_CATCHUP_MODE, False)
+
+                    await clan_war_handler.process_war_data(war, attacks_per_member=1)
+                    print(f"🛡️ [CWL] Zpracováno kolo {current_round + 1} – state: {state}")
+
+                    if state in ("preparation", "inWar"):
+                        active_found = True
+                    elif state == "warEnded":
                         ended_found = True
-                    else:
-                        if state in ("preparation", "inWar") and catchup_mode:
-                            print(f"▶️ [CWL] Catchup: Nalezeno aktivní kolo {current_round + 1}, vypínám catchup mód.")
-                            room_storage.set("cwl_catchup_mode", False)
-                        
-                        await clan_war_handler.process_war_data(war, attacks_per_member=1)
-                        print(f"🛡️ [CWL] Zpracováno kolo {current_round + 1} – state: {state}")
-                        
-                        if state in ("preparation", "inWar"):
-                            active_found = True
-                        elif state == "warEnded":
-                            ended_found = True
-                    break  # Našli jsme náš zápas v tomto kole, zbytek tagů nepotřebujeme checkovat
-            
+
             # Pokud jsme nenašli žádnou náši válku (např. 404 u všech),
             # posuneme se vpřed, aby se bot nezasekl.
             # Případně pokud API vrátilo None pro všechny a kolo už muselo proběhnout.
@@ -116,12 +196,12 @@ class ClanWarLeagueHandler:
                     new_round = current_round + 1
                     if new_round >= len(rounds):
                         print("🏁 [CWL] Dokončena všechna kola – vypínám CWL.")
-                        room_storage.set("cwl_active", False)
-                        room_storage.set("current_cwl_round", 0)
-                        room_storage.set("cwl_catchup_mode", False)
+                        bot_state.set(CWL_ACTIVE, False)
+                        bot_state.set(CURRENT_CWL_ROUND, 0)
+                        bot_state.set(CWL_CATCHUP_MODE, False)
                     else:
                         print(f"➡️ [CWL] Kolo {current_round + 1} ukončeno. Přechod na další kolo: {new_round + 1}")
-                        room_storage.set("current_cwl_round", new_round)
+                        bot_state.set(CURRENT_CWL_ROUND, new_round)
             else:
                 # Nenašli jsme naši válku (možná nedostupná API 404 pro staré kolo).
                 # Pokud ale víme, že alespoň jedno API request selhalo, můžeme usoudit, že je to staré kolo.
@@ -129,7 +209,7 @@ class ClanWarLeagueHandler:
                 if success_fetches == 0 and len([t for t in war_tags if t != "#0"]) > 0:
                     # Všechny tagy selhaly posuneme
                     print(f"⚠️ [CWL] Kolo {current_round + 1} vrací 404. Posouvám na kolo {current_round + 2}.")
-                    room_storage.set("current_cwl_round", current_round + 1)
+                    bot_state.set(CURRENT_CWL_ROUND, current_round + 1)
 
         else:
             # Zkontroluj, zda začíná nová CWL sezóna
@@ -137,8 +217,8 @@ class ClanWarLeagueHandler:
             if group_data and group_data.get("state") in ("preparation", "inWar"):
                 current_season = group_data.get("season")
                 print(f"▶️ [CWL] Detekován nový CWL (sezóna: {current_season}), aktivuji.")
-                room_storage.set("cwl_active", True)
-                room_storage.set("current_cwl_round", 0)
-                room_storage.set("cwl_season", current_season)
+                bot_state.set(CWL_ACTIVE, True)
+                bot_state.set(CURRENT_CWL_ROUND, 0)
+                bot_state.set(CWL_SEASON, current_season)
                 # Aktivujeme catchup mód pro případ, že začínáme uprostřed sezóny
-                room_storage.set("cwl_catchup_mode", True)
+                bot_state.set(CWL_CATCHUP_MODE, True)
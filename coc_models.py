@@ -0,0 +1,312 @@
+"""
+Typované modely odpovědí Clash of Clans API.
+
+Odpověď se převede jednou (viz parse_* v api_handler) na kompaktní objekty se __slots__
+a předpočítanými indexy (podle tagu, podle pozice na mapě). Handlery pak nemusí
+opakovaně procházet vnořené slovníky typu `war.get('clan', {}).get('members', [])`.
+"""
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Optional
+
+COC_TIME_FORMAT = "%Y%m%dT%H%M%S.%fZ"
+
+
+def parse_coc_time(raw: str | None) -> Optional[datetime]:
+    """Převede čas z API (např. 20250509T070000.000Z) na UTC datetime, při chybě None."""
+    if not raw:
+        return None
+    try:
+        return datetime.strptime(raw, COC_TIME_FORMAT).replace(tzinfo=timezone.utc)
+    except (ValueError, TypeError):
+        return None
+
+
+# === Clan War ===
+@dataclass(slots=True)
+class WarAttack:
+    attacker_tag: str
+    defender_tag: str
+    stars: int
+    destruction: float
+    order: int
+    duration: int
+
+    @classmethod
+    def from_api(cls, data: dict) -> "WarAttack":
+        return cls(
+            attacker_tag=data.get("attackerTag", ""),
+            defender_tag=data.get("defenderTag", ""),
+            stars=data.get("stars", 0),
+            destruction=data.get("destructionPercentage", 0),
+            order=data.get("order", 0),
+            duration=data.get("duration", 0),
+        )
+
+
+@dataclass(slots=True)
+class WarMember:
+    tag: str
+    name: str
+    townhall: int
+    map_position: int
+    position: int = 0                   # 1-based pořadí v seznamu seřazeném podle mapPosition (jako v embedu)
+    attacks: list[WarAttack] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class WarClan:
+    tag: str
+    name: str
+    attacks: int
+    stars: int
+    destruction: float
+    members: list[WarMember]            # seřazeno podle mapPosition
+    by_tag: dict[str, WarMember]
+
+    @classmethod
+    def from_api(cls, data: dict, default_name: str) -> "WarClan":
+        members = [
+            WarMember(
+                tag=m.get("tag", ""),
+                name=m.get("name", "Unknown"),
+                townhall=m.get("townhallLevel", 10),
+                map_position=m.get("mapPosition", 0),
+                attacks=[WarAttack.from_api(a) for a in m.get("attacks", [])],
+            )
+            for m in data.get("members", [])
+        ]
+        members.sort(key=lambda m: m.map_position)
+        for position, member in enumerate(members, start=1):
+            member.position = position
+        return cls(
+            tag=data.get("tag", ""),
+            name=data.get("name", default_name),
+            attacks=data.get("attacks", 0),
+            stars=data.get("stars", 0),
+            destruction=data.get("destructionPercentage", 0),
+            members=members,
+            by_tag={m.tag: m for m in members},
+        )
+
+    def at(self, position: int) -> Optional[WarMember]:
+        """Člen na dané 1-based pozici, nebo None."""
+        if 1 <= position <= len(self.members):
+            return self.members[position - 1]
+        return None
+
+    def missing_attacks(self) -> list[WarMember]:
+        """Členové, kteří zatím neodehráli žádný útok."""
+        return [m for m in self.members if not m.attacks]
+
+
+@dataclass(slots=True)
+class War:
+    """Válka orientovaná tak, že `clan` je vždy náš klan."""
+    state: str
+    team_size: int
+    attacks_per_member: Optional[int]
+    preparation_start: Optional[datetime]
+    start: Optional[datetime]
+    end: Optional[datetime]
+    clan: WarClan
+    opponent: WarClan
+    # Index útoků postavený jednou pro celý snapshot války (viz _index_attacks)
+    attacks: list[WarAttack] = field(default_factory=list)                        # obě strany, podle `order`
+    attacks_by_defender: dict[str, list[WarAttack]] = field(default_factory=dict)  # tag obránce → útoky podle `order`
+    _orders: list[int] = field(default_factory=list, repr=False)                   # `order` z `attacks` pro bisect
+
+    def __post_init__(self):
+        self._index_attacks()
+
+    def _index_attacks(self):
+        self.attacks = sorted(
+            (a for side in (self.clan, self.opponent) for m in side.members for a in m.attacks),
+            key=lambda a: a.order,
+        )
+        self._orders = [a.order for a in self.attacks]
+        self.attacks_by_defender = {}
+        for attack in self.attacks:
+            self.attacks_by_defender.setdefault(attack.defender_tag, []).append(attack)
+
+    @classmethod
+    def from_api(cls, data: dict, our_tag: str = "") -> "War":
+        clan_raw, opponent_raw = data.get("clan", {}), data.get("opponent", {})
+        if our_tag and opponent_raw.get("tag", "").strip().upper() == our_tag.strip().upper():
+            clan_raw, opponent_raw = opponent_raw, clan_raw
+        return cls(
+            state=data.get("state", "unknown"),
+            team_size=data.get("teamSize", 0),
+            attacks_per_member=data.get("attacksPerMember"),
+            preparation_start=parse_coc_time(data.get("preparationStartTime")),
+            start=parse_coc_time(data.get("startTime")),
+            end=parse_coc_time(data.get("endTime")),
+            clan=WarClan.from_api(clan_raw, "Náš klan"),
+            opponent=WarClan.from_api(opponent_raw, "Protivník"),
+        )
+
+    def member(self, tag: str) -> Optional[WarMember]:
+        """Najde člena na kterékoli straně podle tagu."""
+        return self.clan.by_tag.get(tag) or self.opponent.by_tag.get(tag)
+
+    def is_ours(self, tag: str) -> bool:
+        return tag in self.clan.by_tag
+
+    def all_attacks(self) -> list[WarAttack]:
+        return self.attacks
+
+    def attacks_after(self, order: int) -> list[WarAttack]:
+        """Útoky s `order` větším než zadaný, chronologicky (bisect nad indexem)."""
+        return self.attacks[bisect_right(self._orders, order):]
+
+    def is_repeat_attack(self, attack: WarAttack) -> bool:
+        """True, pokud na stejného obránce už dříve někdo útočil (oprava)."""
+        earlier = self.attacks_by_defender.get(attack.defender_tag)
+        return bool(earlier) and earlier[0].order < attack.order
+
+
+# === Členové klanu ===
+@dataclass(slots=True)
+class ClanMember:
+    """Člen klanu; názvy polí odpovídají sloupcům tabulky clan_members (TRACKED_FIELDS)."""
+    name: str
+    tag: str
+    role: str
+    townHallLevel: int
+    league: str
+    trophies: int
+    builderBaseLeague: str
+    builderBaseTrophies: int
+    clanRank: int
+    previousClanRank: int
+    donations: int
+    donationsReceived: int
+
+    @classmethod
+    def from_api(cls, data: dict) -> "ClanMember":
+        return cls(
+            name=data.get("name"),
+            tag=data.get("tag"),
+            role=data.get("role"),
+            townHallLevel=data.get("townHallLevel"),
+            league=data.get("leagueTier", {}).get("name") or data.get("league", {}).get("name", ""),
+            trophies=data.get("trophies"),
+            builderBaseLeague=data.get("builderBaseLeague", {}).get("name", ""),
+            builderBaseTrophies=data.get("builderBaseTrophies"),
+            clanRank=data.get("clanRank"),
+            previousClanRank=data.get("previousClanRank"),
+            donations=data.get("donations", 0),
+            donationsReceived=data.get("donationsReceived", 0),
+        )
+
+    def as_row(self) -> tuple:
+        """Hodnoty v pořadí sloupců tabulky clan_members."""
+        return (self.name, self.tag, self.role, self.townHallLevel, self.league, self.trophies,
+                self.builderBaseLeague, self.builderBaseTrophies, self.clanRank, self.previousClanRank,
+                self.donations, self.donationsReceived)
+
+
+# === Capital Raid ===
+@dataclass(slots=True)
+class CapitalMember:
+    tag: str
+    name: str
+    attacks: int
+    attack_limit: int
+    looted: int
+
+    @property
+    def remaining_attacks(self) -> int:
+        return self.attack_limit - self.attacks
+
+
+@dataclass(slots=True)
+class CapitalAttack:
+    attacker_tag: str
+    attacker_name: str
+    destruction: int
+
+
+@dataclass(slots=True)
+class CapitalDistrict:
+    id: str
+    name: str
+    attacks: list[CapitalAttack]        # od nejnovějšího po nejstarší (pořadí z API)
+
+
+@dataclass(slots=True)
+class CapitalRaid:
+    state: str
+    start: Optional[datetime]
+    end: Optional[datetime]
+    total_loot: int
+    raids_completed: int
+    total_attacks: int
+    districts_destroyed: int
+    members: list[CapitalMember]
+    by_tag: dict[str, CapitalMember]
+    districts: list[CapitalDistrict]    # všechny districty ze všech napadených klanů (attackLog)
+
+    @classmethod
+    def from_api(cls, data: dict) -> "CapitalRaid":
+        members = [
+            CapitalMember(
+                tag=m.get("tag", ""),
+                name=m.get("name", "Neznámý hráč"),
+                attacks=m.get("attacks", 0),
+                attack_limit=m.get("attackLimit", 0) + m.get("bonusAttackLimit", 0),
+                looted=m.get("capitalResourcesLooted", 0),
+            )
+            for m in data.get("members", [])
+        ]
+        districts = [
+            CapitalDistrict(
+                id=str(d.get("id")),
+                name=d.get("name"),
+                attacks=[
+                    CapitalAttack(
+                        attacker_tag=a.get("attacker", {}).get("tag"),
+                        attacker_name=a.get("attacker", {}).get("name"),
+                        destruction=a.get("destructionPercent", 0),
+                    )
+                    for a in d.get("attacks", [])
+                ],
+            )
+            for raid_clan in data.get("attackLog", [])
+            for d in raid_clan.get("districts", [])
+        ]
+        return cls(
+            state=data.get("state", "unknown"),
+            start=parse_coc_time(data.get("startTime")),
+            end=parse_coc_time(data.get("endTime")),
+            total_loot=data.get("capitalTotalLoot", 0),
+            raids_completed=data.get("raidsCompleted", 0),
+            total_attacks=data.get("totalAttacks", 0),
+            districts_destroyed=data.get("enemyDistrictsDestroyed", 0),
+            members=members,
+            by_tag={m.tag: m for m in members},
+            districts=districts,
+        )
+
+    def remaining_attacks(self, tag: str) -> int:
+        member = self.by_tag.get(tag)
+        return member.remaining_attacks if member else 0
+
+
+# === CWL skupina ===
+@dataclass(slots=True)
+class LeagueGroup:
+    state: str
+    season: Optional[str]
+    clan_tags: list[str]
+    rounds: list[list[str]]             # war tagy kola bez placeholderů "#0"
+
+    @classmethod
+    def from_api(cls, data: dict) -> "LeagueGroup":
+        return cls(
+            state=data.get("state", "unknown"),
+            season=data.get("season"),
+            clan_tags=[c.get("tag") for c in data.get("clans", [])],
+            rounds=[[t for t in r.get("warTags", []) if t != "#0"] for r in data.get("rounds", [])],
+        )
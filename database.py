@@ -1,10 +1,19 @@
 import asyncio
+import functools
 import os
 import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
+from typing import Any
 
 import discord
 from discord.ui import View, Button
+import json_codec
+from coc_models import ClanMember
 from constants import ADMIN_WARNING_CHANNEL_ID, ADMIN_USER_ID
 
 # === Cesta k souboru databáze ===
@@ -20,16 +29,109 @@ TRACKED_FIELDS = [
 
 IGNORED_FOR_CHANGES = ["donations", "donationsReceived"]
 
+# === Pole ukládaná do historie (member_snapshots) ===
+# Bit i v masce `changed` = SNAPSHOT_FIELDS[i]. Pořadí neměnit, nová pole jen přidávat na konec.
+SNAPSHOT_FIELDS = [
+    "name", "role", "townHallLevel", "league", "trophies",
+    "builderBaseLeague", "builderBaseTrophies", "donations", "donationsReceived"
+]
+
+# === Sdílené spojení s databází ===
+# Jedno dlouhodobé spojení (WAL, předkompilované dotazy) místo connect() v každé funkci.
+# Async kód spouští dotazy přes `run_db` v jediném vlákně, takže neblokuje event loop.
+_conn: sqlite3.Connection | None = None
+_conn_lock = threading.RLock()
+_db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(DB_PATH, timeout=10, check_same_thread=False, cached_statements=256)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-8000")  # ~8 MB stránkové cache
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+@contextmanager
+def db_connection():
+    """
+    Sdílené spojení pro jeden blok dotazů. Blok drží zámek (spojení se používá
+    z event loopu i z DB vlákna) a tvoří jednu transakci – commit na konci, rollback při chybě.
+    """
+    global _conn
+    with _conn_lock:
+        if _conn is None:
+            _conn = _connect()
+        with _conn:
+            yield _conn
+
+async def run_db(func, *args, **kwargs):
+    """Spustí synchronní databázovou funkci v DB vlákně a počká na výsledek."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, functools.partial(func, *args, **kwargs))
+
+def run_db_sync(func, *args, **kwargs):
+    """
+    Spustí funkci v DB vlákně a synchronně počká – zachová pořadí za již naplánovanými
+    zápisy z `run_db`. Po ukončení executoru (konec procesu) se zavolá přímo.
+    """
+    try:
+        future = _db_executor.submit(func, *args, **kwargs)
+    except RuntimeError:
+        return func(*args, **kwargs)
+    return future.result()
+
+def close_db():
+    """Zavře sdílené spojení (při ukončení bota)."""
+    global _conn
+    with _conn_lock:
+        if _conn is not None:
+            try:
+                _conn.execute("PRAGMA optimize")
+            finally:
+                _conn.close()
+                _conn = None
+
 # === Funkce pro kontrolu existence databáze ===
 def database_exists() -> bool:
     """Zkontroluje, zda existuje soubor databáze."""
     return os.path.exists(DB_PATH)
 
+# === Časy varování ===
+WARNING_TIME_FORMAT = "%d/%m/%Y %H:%M"  # formát sloupců date_time / notified_at (zobrazuje se uživatelům)
+WARNING_RETENTION_DAYS = 14
+
+def _warning_ts(date_time: str | None) -> int | None:
+    """Převede čas varování ve formátu WARNING_TIME_FORMAT na epoch sekundy (None = neplatný)."""
+    try:
+        return int(datetime.strptime(date_time, WARNING_TIME_FORMAT).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+def _migrate_warning_timestamps(c: sqlite3.Cursor):
+    """Doplní do clan_warnings sloupce ts / notified_ts (epoch) a jednorázově je dopočítá ze stringů."""
+    columns = {row[1] for row in c.execute("PRAGMA table_info(clan_warnings)")}
+    for column in ("ts", "notified_ts"):
+        if column not in columns:
+            c.execute(f"ALTER TABLE clan_warnings ADD COLUMN {column} INTEGER")
+
+    rows = c.execute("""
+        SELECT rowid, date_time, notified_at FROM clan_warnings
+        WHERE ts IS NULL OR (notified_at IS NOT NULL AND notified_ts IS NULL)
+    """).fetchall()
+    if not rows:
+        return
+    c.executemany("UPDATE clan_warnings SET ts = ?, notified_ts = ? WHERE rowid = ?", [
+        (_warning_ts(date_time) or int(time.time()), _warning_ts(notified_at), rowid)
+        for rowid, date_time, notified_at in rows
+    ])
+    print(f"✅ [database] Doplněny časové sloupce u {len(rows)} varování.")
+
 # === Funkce pro vytvoření/aktualizaci struktury databáze ===
 def initialize_db():
-    """Vytvoří nebo aktualizuje tabulky v databázi (clan_members, coc_links, clan_warnings, pending_warning_proposals)."""
+    """Vytvoří nebo aktualizuje tabulky v databázi (clan_members, member_snapshots, coc_links, clan_warnings, pending_warning_proposals, server_members, CWL cache, bot_state, capital varování).
+    Volá se jednou při startu bota."""
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with db_connection() as conn:
             c = conn.cursor()
             c.execute('''
                 CREATE TABLE IF NOT EXISTS clan_members (
@@ -59,9 +161,15 @@ def initialize_db():
                     coc_tag TEXT,
                     date_time TEXT,
                     reason TEXT,
-                    notified_at TEXT
+                    notified_at TEXT,
+                    ts INTEGER,
+                    notified_ts INTEGER
                 )
             ''')
+            _migrate_warning_timestamps(c)
+            c.execute("CREATE INDEX IF NOT EXISTS idx_clan_warnings_tag_ts ON clan_warnings (coc_tag, ts)")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_clan_warnings_ts ON clan_warnings (ts)")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_coc_discord_links_tag ON coc_discord_links (coc_tag)")
             c.execute('''
                 CREATE TABLE IF NOT EXISTS pending_warning_proposals (
                     message_id INTEGER PRIMARY KEY,
@@ -72,130 +180,298 @@ def initialize_db():
                     reason TEXT
                 )
             ''')
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS cwl_war_cache (
+                    war_tag TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    cached_at TEXT
+                )
+            ''')
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS cwl_round_index (
+                    season TEXT,
+                    round INTEGER,
+                    war_tag TEXT,
+                    PRIMARY KEY (season, round)
+                )
+            ''')
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS member_snapshots (
+                    tag TEXT NOT NULL,
+                    ts INTEGER NOT NULL,
+                    resolution INTEGER NOT NULL DEFAULT 0,
+                    changed INTEGER NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (tag, ts)
+                ) WITHOUT ROWID
+            ''')
+            c.execute('''
+                CREATE INDEX IF NOT EXISTS idx_member_snapshots_resolution ON member_snapshots (resolution, ts)
+            ''')
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS server_members (
+                    discord_id TEXT PRIMARY KEY,
+                    joined_at  TEXT
+                )
+            ''')
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS bot_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL
+                )
+            ''')
+            c.execute('''
+                CREATE INDEX IF NOT EXISTS idx_bot_state_expires ON bot_state (expires_at)
+                WHERE expires_at IS NOT NULL
+            ''')
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS capital_warnings_sent (
+                    warning_id TEXT PRIMARY KEY,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+            c.execute('''
+                CREATE TABLE IF NOT EXISTS capital_warnings_pending (
+                    pending_key TEXT PRIMARY KEY,
+                    started_at REAL NOT NULL
+                )
+            ''')
             conn.commit()
             # print("✅ [database] Struktura databáze ověřena.") 
     except Exception as e:
         print(f"❌ [database] Chyba při inicializaci databáze: {e}")
 
+# === Výsledek synchronizace členů ===
+@dataclass(slots=True)
+class MemberChangeSet:
+    """Co se při synchronizaci členů změnilo (pro logování, role, úklid po odchodu)."""
+    added: list[ClanMember] = field(default_factory=list)
+    updated: list[tuple[ClanMember, list[tuple[str, Any, Any]]]] = field(default_factory=list)  # (člen, [(pole, staré, nové)])
+    removed: list[str] = field(default_factory=list)                                            # tagy
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.updated or self.removed)
+
+    def summary(self) -> str:
+        return f"+{len(self.added)} nových, ~{len(self.updated)} změněných, -{len(self.removed)} odebraných"
+
+_MEMBER_COLUMNS = ", ".join(TRACKED_FIELDS)
+_MEMBER_INSERT = f"INSERT INTO clan_members ({_MEMBER_COLUMNS}) VALUES ({', '.join('?' for _ in TRACKED_FIELDS)})"
+_MEMBER_UPDATE = f"UPDATE clan_members SET {', '.join(f'{f} = ?' for f in TRACKED_FIELDS)} WHERE tag = ?"
+_COMPARED_FIELDS = [(i, f) for i, f in enumerate(TRACKED_FIELDS) if f not in IGNORED_FOR_CHANGES]
+_SNAPSHOT_INDEXES = [TRACKED_FIELDS.index(f) for f in SNAPSHOT_FIELDS]
+_SNAPSHOT_FULL_MASK = (1 << len(SNAPSHOT_FIELDS)) - 1
+
+def _format_change(key: str, old_val, new_val) -> str:
+    if isinstance(old_val, (int, float)) and isinstance(new_val, (int, float)):
+        return f"{key} {old_val}→{new_val} ({int(new_val) - int(old_val):+})"
+    return f"{key} {old_val}→{new_val}"
+
+def _snapshot_mask(old: tuple, new: tuple) -> int:
+    """Bitová maska polí SNAPSHOT_FIELDS, která se mezi dvěma řádky clan_members liší."""
+    mask = 0
+    for bit, i in enumerate(_SNAPSHOT_INDEXES):
+        if str(old[i]) != str(new[i]):
+            mask |= 1 << bit
+    return mask
+
+def _snapshot_row(tag: str, ts: int, mask: int, row: tuple) -> tuple:
+    """Řádek member_snapshots: jen hodnoty polí z masky (v pořadí bitů) jako JSON pole."""
+    values = [row[i] for bit, i in enumerate(_SNAPSHOT_INDEXES) if mask >> bit & 1]
+    return tag, ts, mask, json_codec.dumps(values)
+
 # === Uloží nebo aktualizuje hráče ===
-def update_or_create_members(data: list[dict], bot=None):
+def update_or_create_members(data: list[ClanMember]) -> MemberChangeSet:
     """
-    Pro každý záznam člena:
-    - Pokud ještě neexistuje v databázi, přidá ho
-    - Pokud existuje, porovná změny a případně aktualizuje
-    - Hlásí změny, kromě těch, které jsou ignorované
-    - Odstraní členy, kteří už v klanu nejsou
+    Množinový rozdíl proti tabulce clan_members:
+    - aktuální řádky se načtou jedním dotazem, rozdíl se spočítá v paměti
+    - noví členové se vloží, změnění aktualizují, chybějící smažou
+    - změněná pole SNAPSHOT_FIELDS se připíší do historie member_snapshots
+    - vše jde přes executemany v jedné transakci
+    Do MemberChangeSet.updated se hlásí jen změny mimo IGNORED_FOR_CHANGES.
+    Vrací MemberChangeSet (prázdný = nic se nezměnilo). Při chybě se transakce vrátí
+    a výjimka se propustí – volající tak pozná, že zápis neproběhl.
     """
+    changes = MemberChangeSet()
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            c = conn.cursor()
-
-            c.execute("SELECT tag FROM clan_members")
-            existing_tags = {row[0] for row in c.fetchall()}
-            incoming_tags = set()
+        with db_connection() as conn:
+            existing = {row[1]: row for row in conn.execute(f"SELECT {_MEMBER_COLUMNS} FROM clan_members")}
 
+            now = int(time.time())
+            inserts, updates, snapshots, seen = [], [], [], set()
             for member in data:
-                try:
-                    values = {
-                        "name": member.get("name"),
-                        "tag": member.get("tag"),
-                        "role": member.get("role"),
-                        "townHallLevel": member.get("townHallLevel"),
-                        "townHallLevel": member.get("townHallLevel"),
-                        "league": member.get("leagueTier", {}).get("name") or member.get("league", {}).get("name", ""),
-                        "trophies": member.get("trophies"),
-                        "builderBaseLeague": member.get("builderBaseLeague", {}).get("name", ""),
-                        "builderBaseTrophies": member.get("builderBaseTrophies"),
-                        "clanRank": member.get("clanRank"),
-                        "previousClanRank": member.get("previousClanRank"),
-                        "donations": member.get("donations", 0),
-                        "donationsReceived": member.get("donationsReceived", 0)
-                    }
-
-                    tag = values["tag"]
-                    incoming_tags.add(tag)
-
-                    c.execute("SELECT * FROM clan_members WHERE tag = ?", (tag,))
-                    existing = c.fetchone()
-
-                    if not existing:
-                        c.execute("""
-                            INSERT INTO clan_members VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        """, tuple(values.values()))
-
-                        # Krásné a detailní vypsání statistik
-                        print(f"🆕 [database] Přidán nový člen: {values['name']} ({tag})")
-                        print("📊 Statistiky:")
-                        print(f" • 🏰 TownHall Level: {values.get('townHallLevel', 'N/A')}")
-                        print(f" • 🏅 League: {values.get('league', 'N/A')}")
-                        print(f" • 🏆 Trofeje: {values.get('trophies', 'N/A')}")
-                        print(f" • 🔨 Builder Base Trofeje: {values.get('builderBaseTrophies', 'N/A')}")
-                        print(f" • 🏆 Clan Rank: {values.get('clanRank', 'N/A')}")
-                        print(f" • ⬆️ Previous Clan Rank: {values.get('previousClanRank', 'N/A')}")
-                        print(f" • 🛠️ Builder Base League: {values.get('builderBaseLeague', 'N/A')}")
-                        print(f" • 👑 Role v klanu: {values.get('role', 'N/A')}")
-                    else:
-                        changes = []
-                        for i, key in enumerate(TRACKED_FIELDS):
-                            if key in IGNORED_FOR_CHANGES:
-                                continue
-                            old_val = existing[i]
-                            new_val = values[key]
-                            if str(old_val) != str(new_val):
-                                delta = ""
-                                if isinstance(old_val, (int, float)) and isinstance(new_val, (int, float)):
-                                    delta = f" ({int(new_val) - int(old_val):+})"
-                                changes.append((key, old_val, new_val, delta))
-
-                        if changes:
-                            c.execute("""
-                                UPDATE clan_members SET
-                                    name = ?, tag = ?, role = ?, townHallLevel = ?,
-                                    league = ?, trophies = ?, builderBaseLeague = ?, builderBaseTrophies = ?,
-                                    clanRank = ?, previousClanRank = ?, donations = ?, donationsReceived = ?
-                                WHERE tag = ?
-                            """, (
-                                values["name"], values["tag"], values["role"], values["townHallLevel"],
-                                values["league"], values["trophies"], values["builderBaseLeague"], values["builderBaseTrophies"],
-                                values["clanRank"], values["previousClanRank"], values["donations"], values["donationsReceived"],
-                                tag
-                            ))
-                            print(f"♻️ Změny u hráče {values['name']} ({tag}):")
-                            for change in changes:
-                                print(f"   - {change[0]} změna: {change[1]} → {change[2]}{change[3]}")
-                except Exception as member_error:
-                    print(f"❌ [database] Chyba při zpracování člena: {member_error}")
-
-            tags_to_remove = existing_tags - incoming_tags
-            for tag in tags_to_remove:
-                c.execute("DELETE FROM clan_members WHERE tag = ?", (tag,))
-                print(f"🗑️ [database] Odebrán hráč s tagem {tag} – již není v klanu.")
-
-                # Spusť úklid jen pokud je `bot` k dispozici
-                if bot:
-                    from member_tracker import cleanup_after_coc_departure
-                    asyncio.create_task(cleanup_after_coc_departure(bot, tag))
+                row = member.as_row()
+                tag = member.tag
+                seen.add(tag)
+                old = existing.get(tag)
+                if old is None:
+                    inserts.append(row)
+                    snapshots.append(_snapshot_row(tag, now, _SNAPSHOT_FULL_MASK, row))
+                    changes.added.append(member)
+                    continue
+                if old == row:
+                    continue
+                updates.append((*row, tag))
+                mask = _snapshot_mask(old, row)
+                if mask:
+                    snapshots.append(_snapshot_row(tag, now, mask, row))
+                diff = [(key, old[i], row[i]) for i, key in _COMPARED_FIELDS if str(old[i]) != str(row[i])]
+                if diff:
+                    changes.updated.append((member, diff))
+
+            changes.removed = [tag for tag in existing if tag not in seen]
+
+            if inserts:
+                conn.executemany(_MEMBER_INSERT, inserts)
+            if updates:
+                conn.executemany(_MEMBER_UPDATE, updates)
+            if changes.removed:
+                conn.executemany("DELETE FROM clan_members WHERE tag = ?", [(tag,) for tag in changes.removed])
+            if snapshots:
+                conn.executemany("INSERT OR REPLACE INTO member_snapshots (tag, ts, resolution, changed, data) "
+                                 "VALUES (?, ?, 0, ?, ?)", snapshots)
 
     except Exception as e:
         print(f"❌ [database] Chyba při zápisu do databáze: {e}")
-
-    conn.close()
+        raise
+
+    for member in changes.added:
+        print(f"🆕 [database] Nový člen: {member.name} ({member.tag}) – TH{member.townHallLevel}, "
+              f"{member.league}, {member.trophies} 🏆, role {member.role}")
+    for member, diff in changes.updated:
+        print(f"♻️ [database] {member.name} ({member.tag}): {', '.join(_format_change(*change) for change in diff)}")
+    for tag in changes.removed:
+        print(f"🗑️ [database] Odebrán hráč s tagem {tag} – již není v klanu.")
+
+    return changes
+
+# === Historie členů (member_snapshots) ===
+# Každý řádek obsahuje jen pole, která se od předchozího snímku změnila (maska + hodnoty).
+# Stav v čase T = postupné přepsání polí všemi snímky s ts <= T, proto lze sousední
+# snímky sloučit (OR masek, novější hodnota vyhrává) bez ztráty koncového stavu.
+SNAPSHOT_RESOLUTIONS = [
+    (86400, 3600),       # starší než den → hodinové rozlišení
+    (30 * 86400, 86400)  # starší než měsíc → denní rozlišení
+]
+SNAPSHOT_COMPACT_INTERVAL = 3600  # jak často spouštět slučování (s)
+_last_snapshot_compaction = 0.0
+
+def _unpack_snapshot(mask: int, data: str) -> dict:
+    values = iter(json_codec.loads(data))
+    return {field_name: next(values) for bit, field_name in enumerate(SNAPSHOT_FIELDS) if mask >> bit & 1}
+
+def _pack_snapshot(fields: dict) -> tuple[int, str]:
+    mask, values = 0, []
+    for bit, field_name in enumerate(SNAPSHOT_FIELDS):
+        if field_name in fields:
+            mask |= 1 << bit
+            values.append(fields[field_name])
+    return mask, json_codec.dumps(values)
+
+def compact_member_snapshots(now: float | None = None) -> int:
+    """
+    Sloučí staré snímky podle SNAPSHOT_RESOLUTIONS (3 min → hodina → den).
+    Snímky jednoho hráče v jednom intervalu se spojí do jednoho (s časem posledního).
+    Vrací počet odstraněných řádků.
+    """
+    now = time.time() if now is None else now
+    removed = 0
+    with db_connection() as conn:
+        for age, resolution in SNAPSHOT_RESOLUTIONS:
+            rows = conn.execute("""
+                SELECT tag, ts, changed, data FROM member_snapshots
+                WHERE resolution < ? AND ts < ?
+                ORDER BY tag, ts
+            """, (resolution, int(now - age))).fetchall()
+
+            buckets: dict[tuple[str, int], list] = {}
+            for row in rows:
+                buckets.setdefault((row[0], row[1] // resolution), []).append(row)
+
+            deletes, inserts = [], []
+            for (tag, _), bucket in buckets.items():
+                merged = {}
+                for _, ts, mask, data in bucket:
+                    merged.update(_unpack_snapshot(mask, data))
+                    deletes.append((tag, ts))
+                mask, data = _pack_snapshot(merged)
+                inserts.append((tag, bucket[-1][1], resolution, mask, data))
+
+            conn.executemany("DELETE FROM member_snapshots WHERE tag = ? AND ts = ?", deletes)
+            conn.executemany("INSERT INTO member_snapshots (tag, ts, resolution, changed, data) "
+                             "VALUES (?, ?, ?, ?, ?)", inserts)
+            removed += len(deletes) - len(inserts)
+    return removed
+
+async def compact_member_history():
+    """Spustí compact_member_snapshots nejvýš jednou za SNAPSHOT_COMPACT_INTERVAL."""
+    global _last_snapshot_compaction
+    if time.time() - _last_snapshot_compaction < SNAPSHOT_COMPACT_INTERVAL:
+        return
+    _last_snapshot_compaction = time.time()
+    removed = await run_db(compact_member_snapshots)
+    if removed:
+        print(f"🧹 [database] Historie členů zhuštěna, odstraněno {removed} snímků.")
 
 # === Hlavní řídící funkce pro práci s databází ===
-def process_clan_data(data: list[dict], bot=None):
+async def process_clan_data(data: list[ClanMember], bot=None) -> MemberChangeSet:
     """
     Univerzální funkce pro zpracování dat z API:
-    - Zajistí, že databáze a tabulky existují (migrace)
-    - Pak provede aktualizace nebo zápis hráčů
+    - Provede aktualizace nebo zápis hráčů (v DB vlákně, schéma vytváří initialize_db při startu)
+    - Pro hráče, kteří odešli z klanu, naplánuje úklid na Discordu
+    Vrací MemberChangeSet se změnami; chyba zápisu se propouští volajícímu.
     """
     if not isinstance(data, list):
-        print("❌ [database] Data nejsou ve správném formátu: očekáván seznam hráčů.")
-        return
-
-    # Vždy ověříme strukturu (pro případ nových tabulek)
-    initialize_db()
-
-    update_or_create_members(data, bot=bot)
+        raise TypeError("Data nejsou ve správném formátu: očekáván seznam hráčů.")
+
+    changes = await run_db(update_or_create_members, data)
+
+    # Spusť úklid jen pokud je `bot` k dispozici
+    if bot:
+        from member_tracker import cleanup_after_coc_departure
+        for tag in changes.removed:
+            asyncio.create_task(cleanup_after_coc_departure(bot, tag))
+
+    return changes
+
+# === Index propojení Discord ↔ CoC (v paměti) ===
+# Načte se jednou z DB, add_coc_link / remove_coc_link ho aktualizují. Aktualizace staví
+# nové slovníky a vymění je jedním přiřazením, takže čtenáři vždy vidí konzistentní stav.
+_link_index: tuple[dict[int, tuple[str, str]], dict[str, int]] | None = None  # (discord_id → (tag, jméno), tag → discord_id)
+_link_index_lock = threading.Lock()
+
+def normalize_tag(coc_tag: str) -> str:
+    """Sjednotí zápis CoC tagu: velká písmena, bez mezer, s '#' na začátku."""
+    tag = (coc_tag or "").strip().upper()
+    return tag if tag.startswith("#") else f"#{tag}"
+
+def _build_tag_index(by_discord: dict[int, tuple[str, str]]) -> dict[str, int]:
+    by_tag = {}
+    for discord_id, (tag, _) in by_discord.items():
+        if tag:
+            by_tag.setdefault(normalize_tag(tag), discord_id)  # víc účtů na jeden tag → první propojený
+    return by_tag
+
+def _get_link_index() -> tuple[dict[int, tuple[str, str]], dict[str, int]]:
+    global _link_index
+    index = _link_index
+    if index is not None:
+        return index
+
+    with _link_index_lock:
+        if _link_index is None:
+            by_discord = {}
+            try:
+                with db_connection() as conn:
+                    for discord_name, coc_tag, coc_name in conn.execute(
+                            "SELECT discord_name, coc_tag, coc_name FROM coc_discord_links ORDER BY rowid"):
+                        by_discord[int(discord_name)] = (coc_tag, coc_name)
+            except sqlite3.Error as e:
+                print(f"❌ [DATABASE] Chyba při čtení propojení: {e}")
+                return {}, {}
+            _link_index = (by_discord, _build_tag_index(by_discord))
+        return _link_index
 
 def get_all_links():
     """
@@ -203,28 +479,37 @@ def get_all_links():
     {discord_id: (coc_tag, coc_name)}
 
     Returns:
-        dict: Slovník s propojeními, nebo prázdný slovník při chybě
+        dict: Kopie slovníku s propojeními z indexu v paměti (bez dotazu do DB)
     """
-    result = {}
-    try:
-        with sqlite3.connect(DB_PATH) as conn:
-            conn.row_factory = sqlite3.Row  # Pro přístup přes názvy sloupců
-            cursor = conn.cursor()
-
-            # Získání všech propojení (přidán discord_id)
-            cursor.execute("""
-                SELECT discord_name, coc_tag, coc_name 
-                FROM coc_discord_links
-            """)
-
-            for row in cursor.fetchall():
-                result[int(row['discord_name'])] = (row['coc_tag'], row['coc_name'])
-
-
-    except sqlite3.Error as e:
-        print(f"❌ [DATABASE] Chyba při čtení propojení: {e}")
-
-    return result
+    return dict(_get_link_index()[0])
+
+def get_link_by_discord(discord_id: int | str) -> tuple[str, str] | None:
+    """(coc_tag, coc_name) propojený s Discord ID, nebo None."""
+    return _get_link_index()[0].get(int(discord_id))
+
+def get_discord_id_by_tag(coc_tag: str) -> int | None:
+    """Discord ID propojené s CoC tagem (tag se normalizuje), nebo None."""
+    return _get_link_index()[1].get(normalize_tag(coc_tag))
+
+def get_link_by_tag(coc_tag: str) -> tuple[int, str] | None:
+    """(discord_id, coc_name) pro CoC tag, nebo None."""
+    by_discord, by_tag = _get_link_index()
+    discord_id = by_tag.get(normalize_tag(coc_tag))
+    return None if discord_id is None else (discord_id, by_discord[discord_id][1])
+
+def _update_link_index(discord_id: int, link: tuple[str, str] | None):
+    """Nastaví (link) nebo odebere (None) propojení v indexu – copy-on-write."""
+    global _link_index
+    with _link_index_lock:
+        if _link_index is None:
+            return  # index se ještě nenačetl, načte se rovnou z DB
+        by_discord = dict(_link_index[0])
+        if link is None:
+            by_discord.pop(discord_id, None)
+        else:
+            by_discord.pop(discord_id, None)  # nový záznam jde na konec, stejně jako INSERT OR REPLACE v DB
+            by_discord[discord_id] = link
+        _link_index = (by_discord, _build_tag_index(by_discord))
 
 # === Přidání propojení mezi Discord jménem a CoC účtem ===
 def add_coc_link(discord_name: str, coc_tag: str, coc_name: str):
@@ -233,14 +518,15 @@ def add_coc_link(discord_name: str, coc_tag: str, coc_name: str):
     vstup: discord_name, coc_tag, coc_name
     """
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with db_connection() as conn:
             c = conn.cursor()
             c.execute("""
                 INSERT OR REPLACE INTO coc_discord_links (discord_name, coc_tag, coc_name)
                 VALUES (?, ?, ?)
             """, (discord_name, coc_tag, coc_name))
             conn.commit()
-            print(f"✅ [database] Propojení uloženo pro {discord_name} → {coc_tag} ({coc_name})")
+        _update_link_index(int(discord_name), (coc_tag, coc_name))
+        print(f"✅ [database] Propojení uloženo pro {discord_name} → {coc_tag} ({coc_name})")
     except Exception as e:
         print(f"❌ [database] Chyba při ukládání propojení: {e}")
 
@@ -250,12 +536,12 @@ def remove_coc_link(discord_name: str):
     Smaže záznam propojení podle Discord jména.
     """
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with db_connection() as conn:
             c = conn.cursor()
             c.execute("DELETE FROM coc_discord_links WHERE discord_name = ?", (discord_name,))
             conn.commit()
-            conn.close()
-            print(f"🗑️ [database] Propojení odstraněno pro Discord jméno: {discord_name}")
+        _update_link_index(int(discord_name), None)
+        print(f"🗑️ [database] Propojení odstraněno pro Discord jméno: {discord_name}")
     except Exception as e:
         print(f"❌ [database] Chyba při odstraňování propojení: {e}")
 
@@ -263,13 +549,10 @@ def get_all_members():
     """
     Vrátí všechny hráče z tabulky clan_members jako seznam slovníků.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute("SELECT name, tag, role, townHallLevel, league, trophies, builderBaseTrophies, clanRank, previousClanRank, donations, donationsReceived, builderBaseLeague FROM clan_members")
-    rows = cursor.fetchall()
-
-    conn.close()
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name, tag, role, townHallLevel, league, trophies, builderBaseTrophies, clanRank, previousClanRank, donations, donationsReceived, builderBaseLeague FROM clan_members")
+        rows = cursor.fetchall()
 
     members = []
     for row in rows:
@@ -290,10 +573,191 @@ def get_all_members():
 
     return members
 
+# === Cache ukončených CWL válek ===
+CWL_CACHE_RETENTION_DAYS = 60
+
+def get_cached_cwl_war(war_tag: str) -> dict | None:
+    """Vrátí uložená data ukončené CWL války podle war tagu, nebo None."""
+    try:
+        with db_connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT data FROM cwl_war_cache WHERE war_tag = ?", (war_tag.upper(),))
+            row = c.fetchone()
+            return json_codec.loads(row[0]) if row else None
+    except Exception as e:
+        print(f"❌ [database] Chyba při čtení CWL cache: {e}")
+        return None
+
+def save_cached_cwl_war(war_tag: str, data: dict):
+    """
+    Uloží data ukončené CWL války (warEnded se už nikdy nezmění).
+    Zároveň smaže záznamy starší než CWL_CACHE_RETENTION_DAYS.
+    """
+    try:
+        now = datetime.now()
+        with db_connection() as conn:
+            c = conn.cursor()
+            c.execute("""
+                INSERT OR REPLACE INTO cwl_war_cache (war_tag, data, cached_at)
+                VALUES (?, ?, ?)
+            """, (war_tag.upper(), json_codec.dumps(data), now.isoformat(timespec="seconds")))
+            cutoff = (now - timedelta(days=CWL_CACHE_RETENTION_DAYS)).isoformat(timespec="seconds")
+            c.execute("DELETE FROM cwl_war_cache WHERE cached_at < ?", (cutoff,))
+            conn.commit()
+    except Exception as e:
+        print(f"❌ [database] Chyba při ukládání CWL cache: {e}")
+
+def get_cwl_round_index(season: str | None) -> dict[int, str]:
+    """Vrátí {kolo: war_tag naší války} pro danou CWL sezónu."""
+    if not season:
+        return {}
+    try:
+        with db_connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT round, war_tag FROM cwl_round_index WHERE season = ?", (season,))
+            return {row[0]: row[1] for row in c.fetchall()}
+    except Exception as e:
+        print(f"❌ [database] Chyba při čtení CWL indexu kol: {e}")
+        return {}
+
+def save_cwl_round_war_tag(season: str | None, round_index: int, war_tag: str):
+    """Zapamatuje si, který war tag je v daném kole sezóny náš."""
+    if not season:
+        return
+    try:
+        with db_connection() as conn:
+            c = conn.cursor()
+            c.execute("""
+                INSERT OR REPLACE INTO cwl_round_index (season, round, war_tag)
+                VALUES (?, ?, ?)
+            """, (season, round_index, war_tag))
+            conn.commit()
+    except Exception as e:
+        print(f"❌ [database] Chyba při ukládání CWL indexu kol: {e}")
+
+# === Běhový stav bota (klíč → JSON hodnota, volitelně s expirací) ===
+def load_bot_state() -> dict[str, tuple]:
+    """Vrátí {klíč: (hodnota, expires_at)} pro všechny neexpirované záznamy."""
+    try:
+        with db_connection() as conn:
+            c = conn.cursor()
+            c.execute("SELECT key, value, expires_at FROM bot_state WHERE expires_at IS NULL OR expires_at > ?",
+                      (time.time(),))
+            return {key: (json_codec.loads(value), expires_at) for key, value, expires_at in c.fetchall()}
+    except Exception as e:
+        print(f"❌ [database] Chyba při čtení bot_state: {e}")
+        return {}
+
+def save_bot_state(changes: dict[str, tuple | None]):
+    """
+    Zapíše jen změněné klíče: {klíč: (hodnota, expires_at)} = upsert, {klíč: None} = smazání.
+    Zároveň odmaže expirované záznamy.
+    """
+    upserts = [(key, json_codec.dumps(change[0]), change[1]) for key, change in changes.items() if change is not None]
+    deletes = [(key,) for key, change in changes.items() if change is None]
+    try:
+        with db_connection() as conn:
+            c = conn.cursor()
+            if upserts:
+                c.executemany("""
+                    INSERT INTO bot_state (key, value, expires_at) VALUES (?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at
+                """, upserts)
+            if deletes:
+                c.executemany("DELETE FROM bot_state WHERE key = ?", deletes)
+            c.execute("DELETE FROM bot_state WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+            conn.commit()
+        return True
+    except Exception as e:
+        print(f"❌ [database] Chyba při zápisu bot_state: {e}")
+        return False
+
+def import_bot_state(data: dict) -> int:
+    """
+    Jednorázový import stavu (např. ze starého JSON souboru); existující klíče nepřepisuje.
+    Chyby propouští – volající smí starý soubor odstranit až po úspěšném importu.
+    """
+    rows = [(key, json_codec.dumps(value)) for key, value in data.items() if value is not None]
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.executemany("INSERT OR IGNORE INTO bot_state (key, value, expires_at) VALUES (?, ?, NULL)", rows)
+        conn.commit()
+        return c.rowcount
+
+# === Stav varování Clan Capital ===
+CAPITAL_WARNING_TTL_DAYS = 14  # jak dlouho si pamatovat odeslaná varování (raid trvá 3 dny)
+
+def load_capital_warnings() -> tuple[dict[str, float], set[str]]:
+    """Vrátí (pending {klíč: začátek odpočtu}, odeslaná neexpirovaná ID varování)."""
+    try:
+        with db_connection() as conn:
+            c = conn.cursor()
+            now = time.time()
+            c.execute("DELETE FROM capital_warnings_sent WHERE expires_at <= ?", (now,))
+            c.execute("DELETE FROM capital_warnings_pending WHERE started_at <= ?",
+                      (now - CAPITAL_WARNING_TTL_DAYS * 86400,))
+            conn.commit()
+            c.execute("SELECT pending_key, started_at FROM capital_warnings_pending")
+            pending = {key: started_at for key, started_at in c.fetchall()}
+            c.execute("SELECT warning_id FROM capital_warnings_sent")
+            sent = {row[0] for row in c.fetchall()}
+            return pending, sent
+    except Exception as e:
+        print(f"❌ [database] Chyba při načítání capital varování: {e}")
+        return {}, set()
+
+def import_capital_warnings(pending: dict[str, float], sent_ids: list[str]) -> int:
+    """
+    Jednorázový import stavu varování (starý capital_warnings.json) v jedné transakci.
+    Vrací počet importovaných záznamů. Chyby propouští – volající smí starý soubor
+    odstranit až po úspěšném importu.
+    """
+    expires_at = time.time() + CAPITAL_WARNING_TTL_DAYS * 86400
+    with db_connection() as conn:
+        conn.executemany("INSERT OR REPLACE INTO capital_warnings_pending (pending_key, started_at) VALUES (?, ?)",
+                         list(pending.items()))
+        conn.executemany("INSERT OR REPLACE INTO capital_warnings_sent (warning_id, expires_at) VALUES (?, ?)",
+                         [(warning_id, expires_at) for warning_id in sent_ids])
+        conn.commit()
+    return len(pending) + len(sent_ids)
+
+def add_capital_sent_warnings(warning_ids: list[str]) -> bool:
+    """Zapamatuje si odeslaná varování (s expirací CAPITAL_WARNING_TTL_DAYS). Vrací False při chybě."""
+    expires_at = time.time() + CAPITAL_WARNING_TTL_DAYS * 86400
+    try:
+        with db_connection() as conn:
+            conn.executemany("INSERT OR REPLACE INTO capital_warnings_sent (warning_id, expires_at) VALUES (?, ?)",
+                             [(warning_id, expires_at) for warning_id in warning_ids])
+            conn.commit()
+        return True
+    except Exception as e:
+        print(f"❌ [database] Chyba při ukládání capital varování: {e}")
+        return False
+
+def set_capital_pending(pending_key: str, started_at: float) -> bool:
+    """Uloží začátek odpočtu pro district/hráče. Vrací False při chybě."""
+    try:
+        with db_connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO capital_warnings_pending (pending_key, started_at) VALUES (?, ?)",
+                         (pending_key, started_at))
+            conn.commit()
+        return True
+    except Exception as e:
+        print(f"❌ [database] Chyba při ukládání capital odpočtu: {e}")
+        return False
+
+def delete_capital_pending(pending_key: str):
+    try:
+        with db_connection() as conn:
+            conn.execute("DELETE FROM capital_warnings_pending WHERE pending_key = ?", (pending_key,))
+            conn.commit()
+    except Exception as e:
+        print(f"❌ [database] Chyba při mazání capital odpočtu: {e}")
+
 # === Funkce pro výpis varování ===
 def fetch_warnings():
     """Vrátí list[(tag, date_time, reason)] seřazený jak je v DB."""
-    with sqlite3.connect(DB_PATH) as conn:
+    with db_connection() as conn:
         c = conn.cursor()
         c.execute("SELECT coc_tag, date_time, reason FROM clan_warnings")
         return c.fetchall()
@@ -301,7 +765,7 @@ def fetch_warnings():
 # === Funkce pro odstranění varování ===
 def remove_warning(coc_tag: str, date_time: str, reason: str):
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with db_connection() as conn:
             c = conn.cursor()
             c.execute("""
                 DELETE FROM clan_warnings WHERE coc_tag = ? AND date_time = ? AND reason = ?
@@ -315,28 +779,23 @@ def remove_warning(coc_tag: str, date_time: str, reason: str):
         print(f"❌ [database] Chyba při mazání varování: {e}")
 
 async def cleanup_old_warnings():
-    try:
-        with sqlite3.connect(DB_PATH) as conn:
-            c = conn.cursor()
-            c.execute("SELECT coc_tag, date_time, reason FROM clan_warnings")
-            rows = c.fetchall()
+    await run_db(_delete_old_warnings)
 
-            for tag, date_time, reason in rows:
-                try:
-                    dt = datetime.strptime(date_time, "%d/%m/%Y %H:%M")
-                    if (datetime.now() - dt).days > 14:
-                        c.execute("DELETE FROM clan_warnings WHERE coc_tag = ? AND date_time = ? AND reason = ?", (tag, date_time, reason))
-                        print(f"🧹 [cleanup] Odstraněno staré varování: {tag} – {date_time} – {reason}")
-                except Exception as e:
-                    print(f"❌ [cleanup] Chyba při parsování času: {date_time} – {e}")
-            conn.commit()
+def _delete_old_warnings():
+    """Smaže varování starší než WARNING_RETENTION_DAYS celých dní (jeden DELETE přes index na ts)."""
+    try:
+        cutoff = int(time.time()) - (WARNING_RETENTION_DAYS + 1) * 86400
+        with db_connection() as conn:
+            deleted = conn.execute("DELETE FROM clan_warnings WHERE ts <= ?", (cutoff,)).rowcount
+        if deleted:
+            print(f"🧹 [cleanup] Odstraněno {deleted} starých varování.")
     except Exception as e:
         print(f"❌ [cleanup] Chyba při čištění varování: {e}")
 
 # === Funkce pro správu čekajících návrhů varování ===
 def save_pending_warning(message_id, channel_id, coc_tag, coc_name, date_time, reason):
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with db_connection() as conn:
             c = conn.cursor()
             c.execute("""
                 INSERT OR REPLACE INTO pending_warning_proposals (message_id, channel_id, coc_tag, coc_name, date_time, reason)
@@ -349,7 +808,7 @@ def save_pending_warning(message_id, channel_id, coc_tag, coc_name, date_time, r
 
 def delete_pending_warning(message_id):
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        with db_connection() as conn:
             c = conn.cursor()
             c.execute("DELETE FROM pending_warning_proposals WHERE message_id = ?", (message_id,))
             conn.commit()
@@ -359,15 +818,22 @@ def delete_pending_warning(message_id):
 
 def fetch_pending_warnings():
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            conn.row_factory = sqlite3.Row
+        with db_connection() as conn:
             c = conn.cursor()
+            c.row_factory = sqlite3.Row
             c.execute("SELECT * FROM pending_warning_proposals")
             return [dict(row) for row in c.fetchall()]
     except Exception as e:
         print(f"❌ [database] Chyba při načítání návrhů varování: {e}")
         return []
 
+def _insert_warning(coc_tag: str, date_time: str, reason: str):
+    with db_connection() as conn:
+        conn.execute("""
+            INSERT INTO clan_warnings (coc_tag, date_time, reason, notified_at, ts, notified_ts)
+            VALUES (?, ?, ?, NULL, ?, NULL)
+        """, (coc_tag, date_time, reason, _warning_ts(date_time) or int(time.time())))
+
 # === Poslání varování jako zprávu na Discord ===
 class WarningReviewView(View):
     def __init__(self, coc_tag: str, coc_name: str, date_time: str, reason: str):
@@ -382,23 +848,17 @@ class WarningReviewView(View):
         try:
             # Získání jména z clan_members
             member_name = None
-            all_members = get_all_members()
+            all_members = await run_db(get_all_members)
             for member in all_members:
                 if member["tag"].upper() == self.coc_tag.upper():
                     member_name = member["name"]
                     break
 
             # Uložení varování
-            with sqlite3.connect(DB_PATH) as conn:
-                c = conn.cursor()
-                c.execute("""
-                    INSERT INTO clan_warnings (coc_tag, date_time, reason, notified_at)
-                    VALUES (?, ?, ?, NULL)
-                """, (self.coc_tag, self.date_time, self.reason))
-                conn.commit()
+            await run_db(_insert_warning, self.coc_tag, self.date_time, self.reason)
 
             # Odstranění z pending
-            delete_pending_warning(interaction.message.id)
+            await run_db(delete_pending_warning, interaction.message.id)
 
             await interaction.message.delete()
 
@@ -413,24 +873,22 @@ class WarningReviewView(View):
                 f"📝 {self.reason}"
             )
 
-            # Použij get_all_links() místo SQL dotazu
-            all_links = get_all_links()
-            for discord_id, (tag, _) in all_links.items():
-                if tag.upper() == self.coc_tag.upper():
-                    user = await interaction.client.fetch_user(discord_id)
-                    if user:
-                        try:
-                            await user.send(
-                                f"⚠️ Dostal jsi varování ⚠️.\n"
-                                f"👤 Clash of Clans tag: `{self.coc_tag}` ({self.member_name})\n"
-                                f"📆 {self.date_time}\n"
-                                f"📝 Důvod: {self.reason}"
-                            )
-                            msg += "\n📩 Hráč je na Discordu, DM zpráva byla odeslána."
-                        except Exception as dm_error:
-                            msg += "\n⚠️ Nepodařilo se odeslat DM zprávu hráči."
-                            print(f"⚠️ [confirm] DM error: {dm_error}")
-                    break  # už jsme našli odpovídající tag
+            # Propojený Discord účet z indexu v paměti
+            discord_id = get_discord_id_by_tag(self.coc_tag)
+            if discord_id:
+                user = await interaction.client.fetch_user(discord_id)
+                if user:
+                    try:
+                        await user.send(
+                            f"⚠️ Dostal jsi varování ⚠️.\n"
+                            f"👤 Clash of Clans tag: `{self.coc_tag}` ({self.member_name})\n"
+                            f"📆 {self.date_time}\n"
+                            f"📝 Důvod: {self.reason}"
+                        )
+                        msg += "\n📩 Hráč je na Discordu, DM zpráva byla odeslána."
+                    except Exception as dm_error:
+                        msg += "\n⚠️ Nepodařilo se odeslat DM zprávu hráči."
+                        print(f"⚠️ [confirm] DM error: {dm_error}")
 
             # Pošleme log zprávu
             log_channel = interaction.channel
@@ -452,8 +910,8 @@ class WarningReviewView(View):
     @discord.ui.button(label="❌ Zrušit", style=discord.ButtonStyle.red)
     async def reject(self, interaction: discord.Interaction, button: Button):
         # Odstranění z pending
-        delete_pending_warning(interaction.message.id)
-        
+        await run_db(delete_pending_warning, interaction.message.id)
+
         await interaction.message.delete()
 
         # Sestav základní zprávu
@@ -471,84 +929,105 @@ class WarningReviewView(View):
             f"❌ [review] {interaction.user.name} ({interaction.user.id}) zamítl varování: {self.coc_tag} – {self.reason}")
 
 # === Upozornění při 3+ varováních a oznámení na Discord ===
+WARNING_NOTIFY_THRESHOLD = 3
+NOTIFY_CONCURRENCY = 5  # kolik notifikací se posílá na Discord souběžně
+
+def _collect_exceeded_warnings() -> list[tuple[str, str, list[tuple[str, str]]]]:
+    """
+    Vrátí [(tag, zmínka, nová varování)] pro hráče s 3+ varováními, kteří mají něco nového.
+    Jeden dotaz: počty a poslední notifikace přes okenní funkce, jména přes JOIN na propojení a členy.
+    """
+    with db_connection() as conn:
+        rows = conn.execute("""
+            WITH w AS (
+                SELECT coc_tag, date_time, reason, ts, rowid AS rid,
+                       COUNT(*) OVER (PARTITION BY coc_tag) AS total,
+                       MAX(notified_ts) OVER (PARTITION BY coc_tag) AS last_notified
+                FROM clan_warnings
+            ),
+            links AS (
+                SELECT coc_tag, MIN(discord_name) AS discord_name, coc_name
+                FROM coc_discord_links
+                GROUP BY coc_tag
+            )
+            SELECT w.coc_tag, w.date_time, w.reason, l.coc_tag IS NOT NULL, l.discord_name, l.coc_name, m.name
+            FROM w
+            LEFT JOIN links l ON l.coc_tag = w.coc_tag
+            LEFT JOIN clan_members m ON m.tag = w.coc_tag
+            WHERE w.total >= ? AND (w.last_notified IS NULL OR w.ts > w.last_notified)
+            ORDER BY w.coc_tag, w.ts, w.rid
+        """, (WARNING_NOTIFY_THRESHOLD,)).fetchall()
+
+    result = {}
+    for tag, date_time, reason, linked, discord_name, linked_name, member_name in rows:
+        if tag not in result:
+            if linked:
+                discord_mention = f"<@{discord_name}>" if discord_name else linked_name
+            else:
+                discord_mention = f"@{member_name or 'Neznámý hráč'}"
+            result[tag] = (tag, discord_mention, [])
+        result[tag][2].append((date_time, reason))
+    return list(result.values())
+
+def _mark_warnings_notified(coc_tags: list[str], notified_at: str):
+    with db_connection() as conn:
+        conn.executemany("UPDATE clan_warnings SET notified_at = ?, notified_ts = ? WHERE coc_tag = ?",
+                         [(notified_at, _warning_ts(notified_at), tag) for tag in coc_tags])
+
 async def notify_warnings_exceed(bot: discord.Client):
     try:
         print("🔔 [notify] Kontrola vícenásobných varování...")
-        with sqlite3.connect(DB_PATH) as conn:
-            c = conn.cursor()
-            c.execute("SELECT coc_tag, COUNT(*) FROM clan_warnings GROUP BY coc_tag HAVING COUNT(*) >= 3")
-            tags = c.fetchall()
+        channel = bot.get_channel(ADMIN_WARNING_CHANNEL_ID)
+        if not channel:
+            return
 
-            for tag, count in tags:
-                # Zjisti poslední notified_at
-                c.execute("SELECT MAX(notified_at) FROM clan_warnings WHERE coc_tag = ?", (tag,))
-                last_notified = c.fetchone()[0]
-                recent_warnings = []
+        pending = await run_db(_collect_exceeded_warnings)
+        if not pending:
+            return
 
-                if last_notified:
-                    try:
-                        last_dt = datetime.strptime(last_notified, "%d/%m/%Y %H:%M")
-                        c.execute("SELECT date_time, reason FROM clan_warnings WHERE coc_tag = ?", (tag,))
-                        all = c.fetchall()
-                        recent_warnings = [
-                            (dt, reason) for (dt, reason) in all
-                            if datetime.strptime(dt, "%d/%m/%Y %H:%M") > last_dt
-                        ]
-                        if not recent_warnings:
-                            continue  # nic nového
-                    except Exception as e:
-                        print(f"⚠️ [notify] Chyba při porovnávání času pro {tag}: {e}")
-                        continue
-                else:
-                    # pokud žádný notified_at ještě nikdy nebyl
-                    c.execute("SELECT date_time, reason FROM clan_warnings WHERE coc_tag = ?", (tag,))
-                    recent_warnings = c.fetchall()
-
-                # načti jméno
-                c.execute("SELECT coc_name, discord_name FROM coc_discord_links WHERE coc_tag = ?", (tag,))
-                result = c.fetchone()
-                if result:
-                    coc_name = result[0]
-                    discord_mention = f"<@{result[1]}>" if result[1] else coc_name
-                else:
-                    c.execute("SELECT name FROM clan_members WHERE tag = ?", (tag,))
-                    name_row = c.fetchone()
-                    coc_name = name_row[0] if name_row else "Neznámý hráč"
-                    discord_mention = f"@{coc_name}"
-
-                channel = bot.get_channel(ADMIN_WARNING_CHANNEL_ID)
-                if channel:
-                    msg = (
-                            f"<@{ADMIN_USER_ID}>\n"
-                            f"**{tag}**\n"
-                            f"{discord_mention}\n"
-                            + "\n".join([f"{i + 1}. {dt} – {reason}" for i, (dt, reason) in enumerate(recent_warnings)])
-                    )
-                    await channel.send(msg)
-                    print(f"📣 [notify] Nová notifikace pro {tag} – {len(recent_warnings)} nových varování.")
+        semaphore = asyncio.Semaphore(NOTIFY_CONCURRENCY)
 
-                    now = datetime.now().strftime("%d/%m/%Y %H:%M")
-                    c.execute("UPDATE clan_warnings SET notified_at = ? WHERE coc_tag = ?", (now, tag))
-                    conn.commit()
+        async def send(tag: str, discord_mention: str, recent_warnings: list[tuple[str, str]]) -> str | None:
+            msg = (
+                    f"<@{ADMIN_USER_ID}>\n"
+                    f"**{tag}**\n"
+                    f"{discord_mention}\n"
+                    + "\n".join([f"{i + 1}. {dt} – {reason}" for i, (dt, reason) in enumerate(recent_warnings)])
+            )
+            async with semaphore:
+                try:
+                    await channel.send(msg)
+                except discord.HTTPException as e:
+                    print(f"❌ [notify] Notifikaci pro {tag} se nepodařilo odeslat: {e}")
+                    return None
+            print(f"📣 [notify] Nová notifikace pro {tag} – {len(recent_warnings)} nových varování.")
+            return tag
+
+        sent = await asyncio.gather(*(send(*item) for item in pending))
+        notified = [tag for tag in sent if tag]
+        if notified:
+            now = datetime.now().strftime(WARNING_TIME_FORMAT)
+            await run_db(_mark_warnings_notified, notified, now)
 
     except Exception as e:
         print(f"❌ [notify] Chyba při notifikaci o vícenásobných varováních: {e}")
 
 # === Rychlé upozornění na nové varování ===
+def _get_member_name(coc_tag: str) -> str:
+    with db_connection() as conn:
+        row = conn.execute("SELECT name FROM clan_members WHERE tag = ?", (coc_tag,)).fetchone()
+        return row[0] if row else "Neznámý hráč"
+
 async def notify_single_warning(bot: discord.Client, coc_tag: str, date_time: str, reason: str):
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            c = conn.cursor()
-            c.execute("SELECT name FROM clan_members WHERE tag = ?", (coc_tag,))
-            result = c.fetchone()
-            name = result[0] if result else "Neznámý hráč"
+        name = await run_db(_get_member_name, coc_tag)
 
         channel = bot.get_channel(ADMIN_WARNING_CHANNEL_ID)
         if channel:
             msg = f"{coc_tag}\n@{name}\n{date_time}\n{reason}"
             view = WarningReviewView(coc_tag, name, date_time, reason)
             sent_msg = await channel.send(msg, view=view)
-            save_pending_warning(sent_msg.id, sent_msg.channel.id, coc_tag, name, date_time, reason)
+            await run_db(save_pending_warning, sent_msg.id, sent_msg.channel.id, coc_tag, name, date_time, reason)
             print(f"📣 [notify] Návrh na varování odeslán pro {coc_tag}.")
     except Exception as e:
         print(f"❌ [notify] Chyba při posílání jednoho varování: {e}")
\ No newline at end of file
@@ -8,8 +8,10 @@ import asyncio # Import knihovny asyncio pro asynchronní programování (např.
 from scheduler import hourly_clan_update # Import funkce pro hodinovou aktualizaci členů klanu
 from bot_commands import VerifikacniView, ConfirmView # Import funkcí a tříd pro nastavení příkazů a ověřovacího pohledu
 from mod_commands import setup_mod_commands # Import funkcí pro nastavení moderátorských příkazů
-from database import fetch_pending_warnings, WarningReviewView
+from database import fetch_pending_warnings, WarningReviewView, run_db, close_db, get_all_links
 from constants import TOWN_HALL_EMOJIS, LEAGUE_EMOJIS, LOG_CHANNEL_ID
+import api_handler
+from state_store import bot_state
 import media_downloader
 import web_server
 
@@ -30,8 +32,20 @@ class MyBot(commands.Bot):
         self.timeout_levels = defaultdict(int)  # user_id -> počet porušení
         self.failed_timeout_cache = set()  # user_id -> kdo již selhal s timeoutem
         self.log_channel_id = LOG_CHANNEL_ID
+        # Sdílený klient pro CoC API (jeden pool spojení pro všechny požadavky)
+        self.coc_api = api_handler.init_client(config)
+
+    async def close(self):
+        # Nejdřív uzavřeme spojení na CoC API a zapíšeme odložený stav, pak samotného bota
+        await api_handler.close_client()
+        bot_state.flush()
+        close_db()
+        await super().close()
 
     async def setup_hook(self):
+        # Sdílený stav (včetně jednorázové migrace starého JSONu) se načte v DB vlákně, ne na event loopu
+        await run_db(bot_state.ensure_loaded)
+
         # Načti globální příkazy
         await self.load_extension("global_commands")
 
@@ -53,9 +67,12 @@ class MyBot(commands.Bot):
         except Exception as e:
             print(f"❌ [sync] Chyba guild sync: {e}")
 
+        # Index propojení Discord ↔ CoC se načte v DB vlákně, ne až při prvním příkazu na event loopu
+        await run_db(get_all_links)
+
         # Obnovení persistentních views pro varování
         try:
-            pending_warnings = fetch_pending_warnings()
+            pending_warnings = await run_db(fetch_pending_warnings)
             for pw in pending_warnings:
                 view = WarningReviewView(
                     coc_tag=pw['coc_tag'],
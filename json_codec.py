@@ -0,0 +1,51 @@
+"""
+Společný JSON kodek pro odpovědi API a stavové soubory.
+
+Pokud je nainstalovaný `orjson`, použije se (výrazně rychlejší parsování velkých
+odpovědí typu 50v50 currentwar nebo capitalraidseasons s attackLogem).
+Jinak se použije standardní `json` se stejným chováním (UTF-8, bez escapování diakritiky).
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def loads(data: bytes | str):
+        """Dekóduje JSON z bytes/str."""
+        return orjson.loads(data)
+
+    def dumps(obj, indent: bool = False) -> str:
+        """Zakóduje objekt do JSON řetězce (`indent=True` → odsazení 2 mezerami)."""
+        options = _OPTIONS | orjson.OPT_INDENT_2 if indent else _OPTIONS
+        return orjson.dumps(obj, option=options).decode("utf-8")
+
+else:
+    def loads(data: bytes | str):
+        """Dekóduje JSON z bytes/str."""
+        return json.loads(data)
+
+    def dumps(obj, indent: bool = False) -> str:
+        """Zakóduje objekt do JSON řetězce (`indent=True` → odsazení 2 mezerami)."""
+        if indent:
+            return json.dumps(obj, ensure_ascii=False, indent=2)
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def load_file(path: str):
+    """Načte JSON soubor (čte bytes, dekódování řeší kodek)."""
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+def dump_file(path: str, obj, indent: bool = False):
+    """Zapíše objekt do JSON souboru v UTF-8."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(dumps(obj, indent=indent))
@@ -0,0 +1,104 @@
+"""
+Průběžně editované zprávy (stav války, Clan Capital, herní události).
+
+Handlery vykreslují embed každý cyklus, ale Discordu ho posílají jen tehdy, když se
+opravdu změnil: pro každou zprávu si pamatujeme otisk (hash) posledního odeslaného
+obsahu a stejný obsah se znovu needituje. Otisky se ukládají do `bot_state` vedle ID
+zpráv, takže platí i po restartu. Časy v embedech jsou Discord timestampy (`<t:…:R>`),
+klient je přepočítává sám.
+
+Úprava jde přes `PartialMessage` (jen ID kanálu a zprávy) – bez `fetch_message`
+před každou editací. Pokud zpráva mezitím zmizela (NotFound), pošle se nová.
+"""
+import hashlib
+from typing import Optional
+
+import discord
+
+import json_codec
+from state_store import bot_state, live_message_key
+
+# {message_id: handle} – PartialMessage se vytváří jednou na zprávu
+_handles: dict[int, discord.PartialMessage] = {}
+# {message_id: poslední odeslaný embed} – pro úpravy footeru bez stahování zprávy
+_embeds: dict[int, discord.Embed] = {}
+
+
+def content_digest(embed: Optional[discord.Embed] = None, content: Optional[str] = None) -> str:
+    """Otisk obsahu zprávy (text + `embed.to_dict()`)."""
+    payload = [content, embed.to_dict() if embed is not None else None]
+    return hashlib.blake2b(json_codec.dumps(payload).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def is_unchanged(message_id: Optional[int], embed: Optional[discord.Embed] = None,
+                 content: Optional[str] = None) -> bool:
+    """True, pokud zpráva `message_id` už tento obsah zobrazuje."""
+    if not message_id:
+        return False
+    return bot_state.get(live_message_key(message_id)) == content_digest(embed, content)
+
+
+def remember(message_id: int, embed: Optional[discord.Embed] = None, content: Optional[str] = None):
+    """Zaznamená obsah, který zpráva právě zobrazuje (volat po úspěšném send/edit)."""
+    bot_state.set(live_message_key(message_id), content_digest(embed, content))
+    if embed is not None:
+        _embeds[message_id] = embed
+    else:
+        _embeds.pop(message_id, None)
+
+
+def forget(message_id: Optional[int]):
+    """Zapomene zprávu (smazaná zpráva, konec války/raidu)."""
+    if message_id:
+        bot_state.set(live_message_key(message_id), None)
+        _handles.pop(message_id, None)
+        _embeds.pop(message_id, None)
+
+
+def _handle(channel: discord.abc.Messageable, message_id: int) -> discord.PartialMessage:
+    handle = _handles.get(message_id)
+    if handle is None or handle.channel.id != channel.id:
+        handle = _handles[message_id] = channel.get_partial_message(message_id)
+    return handle
+
+
+async def publish(channel: discord.abc.Messageable, message_id: Optional[int], *,
+                  embed: Optional[discord.Embed] = None, content: Optional[str] = None) -> int:
+    """
+    Zobrazí obsah ve zprávě `message_id` (úprava bez fetch), případně pošle novou zprávu.
+    Stejný obsah jako minule se neposílá vůbec. Vrací ID zprávy, která obsah zobrazuje –
+    volající si ho uloží, pokud se liší od původního. Ostatní chyby Discordu propadnou.
+    """
+    if is_unchanged(message_id, embed, content):
+        return message_id
+
+    if message_id:
+        try:
+            await _handle(channel, message_id).edit(content=content, embed=embed)
+            remember(message_id, embed, content)
+            return message_id
+        except discord.NotFound:
+            print(f"⚠️ [live_message] Zpráva {message_id} nenalezena, posílám novou.")
+            forget(message_id)
+
+    message = await channel.send(content=content, embed=embed)
+    remember(message.id, embed, content)
+    return message.id
+
+
+async def set_footer(channel: discord.abc.Messageable, message_id: int, text: str):
+    """
+    Změní jen footer embedu zprávy (např. „Ukončeno“). Embed se vezme z paměti;
+    stáhne se jen tehdy, když ho neznáme (po restartu).
+    """
+    embed = _embeds.get(message_id)
+    if embed is None:
+        message = await channel.fetch_message(message_id)
+        if not message.embeds:
+            return
+        embed = message.embeds[0]
+    else:
+        embed = embed.copy()
+    embed.set_footer(text=text)
+    await _handle(channel, message_id).edit(embed=embed)
+    remember(message_id, embed)
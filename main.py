@@ -13,7 +13,11 @@ def load_config():
             "COC_API_KEY": os.getenv("COC_API_KEY"),
             "DISCORD_BOT_TOKEN": os.getenv("DISCORD_BOT_TOKEN"),
             "GUILD_ID": int(os.getenv("GUILD_ID")),
-            "CLAN_TAG": os.getenv("CLAN_TAG")
+            "CLAN_TAG": os.getenv("CLAN_TAG"),
+            # Volitelné: limit požadavků na CoC API za sekundu (token bucket v api_handler)
+            "COC_API_RATE": float(os.getenv("COC_API_RATE", "10")),
+            # Volitelné: jiná základní URL API (např. lokální mock_coc_api.py pro benchmarky)
+            "COC_API_BASE_URL": os.getenv("COC_API_BASE_URL")
         }
     except (TypeError, ValueError) as e:
         print(f"❌ Chyba v načítání konfigurace: {e}")
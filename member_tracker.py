@@ -1,4 +1,3 @@
-import sqlite3
 from datetime import datetime, timezone
 
 import asyncio
@@ -6,7 +5,7 @@ import discord
 from typing import Optional
 from discord.ext import commands
 
-from database import DB_PATH, remove_coc_link, get_all_links  # reuse existující logiku
+from database import db_connection, run_db, remove_coc_link, get_link_by_tag  # reuse existující logiku
 from constants import LOG_CHANNEL_ID, WELCOME_CHANNEL_ID as CLAN_LEAVE_LOG_ID
 
 # ~~~~~ Fronta tagů, kterým je třeba udělat "úklid" ~~~~~
@@ -14,8 +13,7 @@ _leave_queue: asyncio.Queue[str] = asyncio.Queue(maxsize=0)   # neomezená
 
 async def discord_sync_members_once(bot: discord.Client):
     """
-    • Zajistí tabulku `server_members`
-    • Přidá do ní nově přítomné lidi
+    • Přidá do tabulky `server_members` nově přítomné lidi
     • Pro zmizelé:
         – smaže řádek z `server_members`
         – zavolá remove_coc_link()
@@ -26,14 +24,34 @@ async def discord_sync_members_once(bot: discord.Client):
         print("[member_tracker] ❌ bot.guild_object není nastavené – přeskočeno")
         return
 
-    _ensure_table()
-
     now_iso = datetime.now(timezone.utc).isoformat(timespec="seconds")
 
     # aktuální uživatelé (boty ignorujeme)
     current_ids = {str(m.id) for m in guild.members if not m.bot}
 
-    with sqlite3.connect(DB_PATH) as conn:
+    to_add, to_remove = await run_db(_sync_server_members, current_ids, now_iso)
+
+    for mid in to_remove:
+        # logni do kanálu
+        channel = guild.get_channel(LOG_CHANNEL_ID)
+        if channel:
+            await channel.send(
+                f"👋 Uživatel <@{mid}> odešel ze serveru – jeho propojení bylo odstraněno."
+            )
+        print(f"[member_tracker] Odešel <@{mid}> – propojení smazáno")
+
+    if to_add or to_remove:
+        print(
+            f"[member_tracker] Sync hotová – přidáno {len(to_add)}, odstraněno {len(to_remove)}"
+        )
+
+
+# -----------------------------------------------------------
+#  interní util
+# -----------------------------------------------------------
+def _sync_server_members(current_ids: set[str], now_iso: str) -> tuple[set[str], set[str]]:
+    """Srovná tabulku server_members s aktuálními členy serveru, vrátí (přidaní, odešlí)."""
+    with db_connection() as conn:
         cur = conn.cursor()
         cur.execute("SELECT discord_id FROM server_members")
         db_ids = {row[0] for row in cur.fetchall()}
@@ -53,37 +71,8 @@ async def discord_sync_members_once(bot: discord.Client):
             remove_coc_link(mid)
             # 2) smaž z tabulky
             cur.execute("DELETE FROM server_members WHERE discord_id = ?", (mid,))
-            # 3) logni do kanálu
-            channel = guild.get_channel(LOG_CHANNEL_ID)
-            if channel:
-                await channel.send(
-                    f"👋 Uživatel <@{mid}> odešel ze serveru – jeho propojení bylo odstraněno."
-                )
-            print(f"[member_tracker] Odešel <@{mid}> – propojení smazáno")
 
-        conn.commit()
-
-    if to_add or to_remove:
-        print(
-            f"[member_tracker] Sync hotová – přidáno {len(to_add)}, odstraněno {len(to_remove)}"
-        )
-
-
-# -----------------------------------------------------------
-#  interní util
-# -----------------------------------------------------------
-def _ensure_table():
-    """Vytvoří tabulku server_members, pokud neexistuje."""
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS server_members (
-                discord_id TEXT PRIMARY KEY,
-                joined_at  TEXT
-            )
-            """
-        )
-        conn.commit()
+    return to_add, to_remove
 
 def queue_clan_departure(tag: str):
     """Volá se ze `database.py`, kdykoli je hráč odstraněn z tabulky clan_members."""
@@ -105,19 +94,12 @@ async def cleanup_after_coc_departure(bot: discord.Client, coc_tag: str):
         print("❌ [cleanup] guild_object není nastaven.")
         return
 
-    links = get_all_links()
-    discord_id = None
-    coc_name = None
-    for d_id, (tag, c_name) in links.items():
-        if tag.upper() == coc_tag:
-            discord_id = d_id
-            coc_name = c_name
-            break
-
-    if discord_id is None:
+    link = get_link_by_tag(coc_tag)
+    if link is None:
         return  # uživatel nemá propojení – nic dál
+    discord_id, coc_name = link
 
-    remove_coc_link(str(discord_id))
+    await run_db(remove_coc_link, str(discord_id))
 
     # Zkusíme získat Discord jméno pro hezčí zprávu
     discord_name = str(discord_id)
@@ -0,0 +1,424 @@
+"""
+Lokální náhrada Clash of Clans API pro offline testování a benchmarky.
+
+Server odpovídá na stejné endpointy, jaké používá api_handler (members, currentwar,
+capitalraidseasons, leaguegroup, clanwarleagues/wars, players). Data bere z nahraných
+fixture souborů, a pokud žádné nejsou, generuje syntetická data.
+
+Válka běží podle scénáře preparation → inWar → warEnded (útoky přibývají v čase),
+CWL postupuje po kolech. Lze přidat umělou latenci a 429 odpovědi.
+Odpovědi nesou ETag + Cache-Control a na If-None-Match vrací 304.
+
+Spuštění:
+    python mock_coc_api.py --port 8090 --team-size 15 --prep 60 --battle 300 --latency 0.05
+    COC_API_BASE_URL=http://127.0.0.1:8090/v1 python main.py
+
+Nahrání fixture souborů z živého API (potřebuje COC_API_KEY a CLAN_TAG v .env):
+    python mock_coc_api.py --record fixtures
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from datetime import datetime, timezone
+
+from aiohttp import web
+
+DEFAULT_PORT = 8090
+DEFAULT_CLAN_TAG = "#MOCK2PQ"
+COC_TIME_FORMAT = "%Y%m%dT%H%M%S.000Z"
+
+
+def _coc_time(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime(COC_TIME_FORMAT)
+
+
+def _norm_tag(tag: str) -> str:
+    return "#" + tag.replace("%23", "").lstrip("#").upper()
+
+
+def _fixture_name(key: str) -> str:
+    return key.replace("#", "").replace("/", "_") + ".json"
+
+
+# === Generátory syntetických dat ===
+def make_members(clan_tag: str, count: int, rng: random.Random) -> list[dict]:
+    """Seznam členů klanu ve formátu /clans/{tag}/members."""
+    roles = ["leader"] + ["coLeader"] * 2 + ["admin"] * 5 + ["member"] * max(count - 8, 0)
+    members = []
+    for i in range(count):
+        trophies = rng.randint(1500, 5500)
+        members.append({
+            "tag": f"#P{clan_tag.lstrip('#')}{i:02d}",
+            "name": f"Hráč {i + 1}",
+            "role": roles[i] if i < len(roles) else "member",
+            "townHallLevel": rng.randint(10, 17),
+            "expLevel": rng.randint(100, 300),
+            "leagueTier": {"id": 105000000 + i, "name": "Legend League"},
+            "trophies": trophies,
+            "builderBaseTrophies": rng.randint(1000, 5000),
+            "builderBaseLeague": {"id": 44000000, "name": "Ruby League I"},
+            "clanRank": i + 1,
+            "previousClanRank": i + 1,
+            "donations": rng.randint(0, 3000),
+            "donationsReceived": rng.randint(0, 3000),
+        })
+    return members
+
+
+def _war_side(clan_tag: str, name: str, team_size: int, rng: random.Random) -> dict:
+    members = []
+    for i in range(team_size):
+        members.append({
+            "tag": f"#W{clan_tag.lstrip('#')}{i:02d}",
+            "name": f"{name} {i + 1}",
+            "townhallLevel": max(10, 17 - i // 3),
+            "mapPosition": i + 1,
+            "attacks": [],
+        })
+    rng.shuffle(members)  # API nevrací členy seřazené podle mapPosition
+    return {"tag": clan_tag, "name": name, "clanLevel": 20, "attacks": 0, "stars": 0,
+            "destructionPercentage": 0.0, "members": members}
+
+
+class WarScript:
+    """
+    Scénář jedné války: časy fází a předem vygenerovaný plán útoků.
+    Stav i počet odehraných útoků se odvozují od aktuálního času.
+    """
+
+    def __init__(self, clan_tag: str, opponent_tag: str, team_size: int, attacks_per_member: int,
+                 prep_seconds: float, battle_seconds: float, start_at: float, seed: int, fill_ratio: float = 0.9):
+        self.clan_tag = clan_tag
+        self.opponent_tag = opponent_tag
+        self.team_size = team_size
+        self.attacks_per_member = attacks_per_member
+        self.prep_start = start_at
+        self.battle_start = start_at + prep_seconds
+        self.end = self.battle_start + battle_seconds
+        rng = random.Random(seed)
+        self._clan = _war_side(clan_tag, "Náš klan", team_size, rng)
+        self._opponent = _war_side(opponent_tag, "Soupeř", team_size, rng)
+        self._plan = self._plan_attacks(rng, fill_ratio)
+
+    def _plan_attacks(self, rng: random.Random, fill_ratio: float) -> list[dict]:
+        plan = []
+        for side, other in ((self._clan, self._opponent), (self._opponent, self._clan)):
+            targets = {m["mapPosition"]: m["tag"] for m in other["members"]}
+            for member in side["members"]:
+                for n in range(self.attacks_per_member):
+                    if rng.random() > fill_ratio:
+                        continue
+                    # Většinou mirror, občas jiný cíl
+                    pos = member["mapPosition"] if n == 0 and rng.random() < 0.8 else rng.randint(1, self.team_size)
+                    stars = rng.choices([0, 1, 2, 3], weights=[1, 2, 4, 5])[0]
+                    plan.append({
+                        "attackerTag": member["tag"],
+                        "defenderTag": targets[pos],
+                        "stars": stars,
+                        "destructionPercentage": 100 if stars == 3 else rng.randint(30, 99),
+                        "duration": rng.randint(60, 180),
+                        "_at": rng.random(),
+                    })
+        plan.sort(key=lambda a: a["_at"])
+        for order, attack in enumerate(plan, start=1):
+            attack["order"] = order
+        return plan
+
+    def state(self, now: float) -> str:
+        if now < self.battle_start:
+            return "preparation"
+        if now < self.end:
+            return "inWar"
+        return "warEnded"
+
+    def snapshot(self, now: float) -> dict:
+        """Data války ve formátu /currentwar v čase `now`."""
+        state = self.state(now)
+        if state == "preparation":
+            done = 0
+        elif state == "inWar":
+            done = int(len(self._plan) * (now - self.battle_start) / (self.end - self.battle_start))
+        else:
+            done = len(self._plan)
+        attacks = [{k: v for k, v in a.items() if k != "_at"} for a in self._plan[:done]]
+
+        sides = {}
+        for side in (self._clan, self._opponent):
+            copy = dict(side)
+            copy["members"] = [dict(m, attacks=[]) for m in side["members"]]
+            sides[side["tag"]] = copy
+        member_side = {m["tag"]: sides[side["tag"]] for side in (self._clan, self._opponent) for m in side["members"]}
+        members_by_tag = {m["tag"]: m for s in sides.values() for m in s["members"]}
+
+        best: dict[str, tuple[int, int]] = {}
+        for attack in attacks:
+            attacker = members_by_tag[attack["attackerTag"]]
+            attacker["attacks"].append(attack)
+            side = member_side[attack["attackerTag"]]
+            side["attacks"] += 1
+            prev = best.get(attack["defenderTag"], (0, 0))
+            best[attack["defenderTag"]] = max(prev, (attack["stars"], attack["destructionPercentage"]))
+
+        for side in sides.values():
+            defender_tags = {m["tag"] for m in (self._opponent if side["tag"] == self.clan_tag else self._clan)["members"]}
+            side_best = [v for t, v in best.items() if t in defender_tags]
+            side["stars"] = sum(stars for stars, _ in side_best)
+            side["destructionPercentage"] = round(sum(d for _, d in side_best) / self.team_size, 2)
+            for member in side["members"]:
+                if not member["attacks"]:
+                    del member["attacks"]
+
+        return {
+            "state": state,
+            "teamSize": self.team_size,
+            "attacksPerMember": self.attacks_per_member,
+            "preparationStartTime": _coc_time(self.prep_start),
+            "startTime": _coc_time(self.battle_start),
+            "endTime": _coc_time(self.end),
+            "clan": sides[self.clan_tag],
+            "opponent": sides[self.opponent_tag],
+        }
+
+
+def make_capital_raid(members: list[dict], now: float, rng: random.Random) -> dict:
+    """Probíhající Capital Raid ve formátu položky /capitalraidseasons."""
+    raiders = members[: min(len(members), 30)]
+    attack_log = []
+    for c in range(3):
+        districts = []
+        for d in range(8):
+            attacks = []
+            destruction = 0
+            while destruction < 100 and len(attacks) < 6:
+                attacker = rng.choice(raiders)
+                destruction = min(100, destruction + rng.randint(20, 60))
+                attacks.insert(0, {"attacker": {"tag": attacker["tag"], "name": attacker["name"]},
+                                   "destructionPercent": destruction, "stars": destruction // 34})
+            districts.append({"id": 70000000 + d, "name": f"District {d + 1}", "districtHallLevel": 5,
+                              "destructionPercent": destruction, "attackCount": len(attacks), "attacks": attacks})
+        attack_log.append({"defender": {"tag": f"#RAID{c}", "name": f"Raid klan {c + 1}"},
+                           "attackCount": sum(d["attackCount"] for d in districts), "districts": districts})
+
+    raid_members = [{"tag": m["tag"], "name": m["name"], "attacks": rng.randint(1, 6), "attackLimit": 5,
+                     "bonusAttackLimit": 1, "capitalResourcesLooted": rng.randint(0, 30000)} for m in raiders]
+    return {
+        "state": "ongoing",
+        "startTime": _coc_time(now - 3600),
+        "endTime": _coc_time(now + 3 * 86400),
+        "capitalTotalLoot": sum(m["capitalResourcesLooted"] for m in raid_members),
+        "raidsCompleted": 2,
+        "totalAttacks": sum(m["attacks"] for m in raid_members),
+        "enemyDistrictsDestroyed": 20,
+        "members": raid_members,
+        "attackLog": attack_log,
+    }
+
+
+class MockCocApi:
+    """Stav mock serveru: scénáře, fixtures, latence a vkládání chyb."""
+
+    def __init__(self, clan_tag: str = DEFAULT_CLAN_TAG, team_size: int = 15, members: int = 50,
+                 prep_seconds: float = 60, battle_seconds: float = 300, cwl: bool = False,
+                 fixtures_dir: str | None = None, latency: float = 0.0, rate_limit_every: int = 0,
+                 seed: int = 42):
+        self.clan_tag = _norm_tag(clan_tag)
+        self.fixtures_dir = fixtures_dir
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.requests = 0
+        self.rate_limited = 0
+        self.not_modified = 0
+        self.started = time.time()
+        rng = random.Random(seed)
+        self.members = make_members(self.clan_tag, members, rng)
+        self.capital = make_capital_raid(self.members, self.started, rng)
+        self.war = WarScript(self.clan_tag, "#MOCKOPP", team_size, 2, prep_seconds, battle_seconds,
+                             self.started, seed)
+
+        # CWL: 8 klanů, 7 kol po 4 válkách, kola jdou za sebou
+        self.cwl = cwl
+        self.cwl_rounds: list[list[tuple[str, WarScript]]] = []
+        if cwl:
+            clans = [self.clan_tag] + [f"#CWL{i}" for i in range(1, 8)]
+            round_length = prep_seconds + battle_seconds
+            for r in range(7):
+                start = self.started + r * round_length
+                pairs = [(clans[0], clans[r + 1])] + [
+                    (a, b) for a, b in zip([c for c in clans[1:] if c != clans[r + 1]][:3],
+                                           [c for c in clans[1:] if c != clans[r + 1]][3:])
+                ]
+                wars = [(f"#CWLW{r}{i}", WarScript(a, b, team_size, 1, prep_seconds, battle_seconds, start, seed + r * 10 + i))
+                        for i, (a, b) in enumerate(pairs)]
+                self.cwl_rounds.append(wars)
+
+    # --- data endpointů ---
+    def _fixture(self, key: str) -> dict | None:
+        if not self.fixtures_dir:
+            return None
+        path = os.path.join(self.fixtures_dir, _fixture_name(key))
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return None
+
+    def league_group(self, now: float) -> dict | None:
+        if not self.cwl:
+            return None
+        rounds = []
+        for wars in self.cwl_rounds:
+            revealed = now >= wars[0][1].prep_start
+            rounds.append({"warTags": [tag if revealed else "#0" for tag, _ in wars]})
+        last = self.cwl_rounds[-1][0][1]
+        state = "warEnded" if now >= last.end else ("inWar" if now >= self.cwl_rounds[0][0][1].battle_start else "preparation")
+        return {"state": state, "season": datetime.fromtimestamp(self.started).strftime("%Y-%m"),
+                "clans": [{"tag": self.clan_tag, "name": "Náš klan"}] + [{"tag": f"#CWL{i}", "name": f"CWL {i}"} for i in range(1, 8)],
+                "rounds": rounds}
+
+    def league_war(self, war_tag: str, now: float) -> dict | None:
+        for wars in self.cwl_rounds:
+            for tag, script in wars:
+                if tag == war_tag:
+                    return script.snapshot(now)
+        return None
+
+    def resolve(self, kind: str, tag: str | None, now: float) -> dict | None:
+        """Vrátí data pro endpoint (fixture má přednost před syntetickými daty)."""
+        key = f"{kind}/{tag}" if tag and kind in ("leaguewar", "player") else kind
+        fixture = self._fixture(key)
+        if fixture is not None:
+            return fixture
+        if kind == "members":
+            return {"items": self.members}
+        if kind == "currentwar":
+            return {"state": "notInWar"} if self.cwl else self.war.snapshot(now)
+        if kind == "capitalraidseasons":
+            return {"items": [self.capital]}
+        if kind == "leaguegroup":
+            return self.league_group(now)
+        if kind == "leaguewar":
+            return self.league_war(tag, now)
+        if kind == "player":
+            member = next((m for m in self.members if m["tag"] == tag), None)
+            return dict(member, heroes=[], heroEquipment=[]) if member else None
+        return None
+
+    # --- HTTP ---
+    async def handle(self, request: web.Request, kind: str, tag: str | None = None) -> web.Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency * random.uniform(0.5, 1.5))
+
+        if self.rate_limit_every and self.requests % self.rate_limit_every == 0:
+            self.rate_limited += 1
+            return web.json_response({"reason": "requestThrottled"}, status=429, headers={"Retry-After": "1"})
+
+        data = self.resolve(kind, tag, time.time())
+        if data is None:
+            return web.json_response({"reason": "notFound"}, status=404)
+
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        headers = {"ETag": etag, "Cache-Control": "public max-age=30"}
+        if request.headers.get("If-None-Match") == etag:
+            self.not_modified += 1
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=body, content_type="application/json", headers=headers)
+
+    def make_app(self) -> web.Application:
+        def route(kind: str):
+            async def handler(request: web.Request):
+                raw = request.match_info.get("tag") or request.match_info.get("war_tag")
+                return await self.handle(request, kind, _norm_tag(raw) if raw else None)
+            return handler
+
+        async def stats(request: web.Request):
+            return web.json_response({"requests": self.requests, "rate_limited": self.rate_limited,
+                                      "not_modified": self.not_modified,
+                                      "uptime": round(time.time() - self.started, 1)})
+
+        app = web.Application()
+        app.router.add_get("/v1/clans/{tag}/members", route("members"))
+        app.router.add_get("/v1/clans/{tag}/currentwar", route("currentwar"))
+        app.router.add_get("/v1/clans/{tag}/currentwar/leaguegroup", route("leaguegroup"))
+        app.router.add_get("/v1/clans/{tag}/capitalraidseasons", route("capitalraidseasons"))
+        app.router.add_get("/v1/clanwarleagues/wars/{war_tag}", route("leaguewar"))
+        app.router.add_get("/v1/players/{tag}", route("player"))
+        app.router.add_get("/stats", stats)
+        return app
+
+
+async def start_mock_server(mock: MockCocApi, port: int = DEFAULT_PORT) -> web.AppRunner:
+    """Spustí mock server na pozadí (pro použití z benchmarků); vrací runner pro `cleanup()`."""
+    runner = web.AppRunner(mock.make_app())
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    print(f"🧪 [mock_coc_api] Běží na http://127.0.0.1:{port}/v1")
+    return runner
+
+
+async def record_fixtures(config: dict, out_dir: str):
+    """Stáhne aktuální odpovědi živého API a uloží je jako fixture soubory pro mock server."""
+    import api_handler
+
+    os.makedirs(out_dir, exist_ok=True)
+    clan_tag = config["CLAN_TAG"]
+
+    def save(key: str, data):
+        if not data:
+            print(f"⚠️ [mock_coc_api] {key}: žádná data, přeskakuji.")
+            return
+        with open(os.path.join(out_dir, _fixture_name(key)), "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        print(f"💾 [mock_coc_api] Uloženo {key}")
+
+    try:
+        save("members", await api_handler.fetch_clan_members_list(clan_tag, config))
+        save("currentwar", await api_handler.fetch_current_war(clan_tag, config))
+        capital = await api_handler.fetch_current_capital(clan_tag, config)
+        save("capitalraidseasons", {"items": [capital]} if capital else None)
+        group = await api_handler.fetch_league_group(clan_tag, config)
+        if group:
+            save("leaguegroup", group)
+            for round_data in group.get("rounds", []):
+                for war_tag in round_data.get("warTags", []):
+                    if war_tag != "#0":
+                        save(f"leaguewar/{war_tag}", await api_handler.fetch_league_war(war_tag, config))
+    finally:
+        await api_handler.close_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lokální mock Clash of Clans API")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--clan-tag", default=os.getenv("CLAN_TAG", DEFAULT_CLAN_TAG))
+    parser.add_argument("--fixtures", help="adresář s nahranými JSON odpověďmi")
+    parser.add_argument("--members", type=int, default=50, help="počet syntetických členů klanu")
+    parser.add_argument("--team-size", type=int, default=15)
+    parser.add_argument("--prep", type=float, default=60, help="délka přípravy (s)")
+    parser.add_argument("--battle", type=float, default=300, help="délka battle day (s)")
+    parser.add_argument("--cwl", action="store_true", help="simulovat CWL místo klasické války")
+    parser.add_argument("--latency", type=float, default=0.0, help="průměrná přidaná latence (s)")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="každý N-tý požadavek vrátí 429")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--record", metavar="DIR", help="nahrát odpovědi živého API do adresáře a skončit")
+    args = parser.parse_args()
+
+    if args.record:
+        from main import load_config
+        asyncio.run(record_fixtures(load_config(), args.record))
+        return
+
+    mock = MockCocApi(clan_tag=args.clan_tag, team_size=args.team_size, members=args.members,
+                      prep_seconds=args.prep, battle_seconds=args.battle, cwl=args.cwl,
+                      fixtures_dir=args.fixtures, latency=args.latency,
+                      rate_limit_every=args.rate_limit_every, seed=args.seed)
+    print(f"🧪 [mock_coc_api] http://127.0.0.1:{args.port}/v1 (klan {mock.clan_tag})")
+    web.run_app(mock.make_app(), host="127.0.0.1", port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,4 @@
 import asyncio
-import json
 import os
 from pathlib import Path
 
@@ -10,12 +9,14 @@ from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 import api_handler
+import json_codec
 from api_handler import fetch_current_war
 from bot_commands import VerifikacniView
 from clan_war import ClanWarHandler
+from clan_war_league import iter_our_league_wars
 from constants import HEROES_EMOJIS, TOWN_HALL_EMOJIS, max_heroes_lvls
 from database import remove_warning, fetch_warnings, notify_single_warning, get_all_links, remove_coc_link, \
-    add_coc_link, get_all_members
+    add_coc_link, get_all_members, get_link_by_discord, get_link_by_tag, run_db
 from role_giver import update_roles
 
 from constants import (
@@ -45,47 +46,6 @@ from constants import (
 )
 
 
-# === Sdílené ID úložiště ===
-THIS_DIR = os.path.dirname(os.path.abspath(__file__))
-ROOM_IDS_PATH = os.path.join(THIS_DIR, "discord_rooms_ids.json")
-
-class RoomIdStorage:
-    def __init__(self):
-        self.data = {}
-        self.load()
-
-    def load(self):
-        try:
-            if os.path.exists(ROOM_IDS_PATH):
-                with open(ROOM_IDS_PATH, "r") as f:
-                    self.data = json.load(f)
-        except Exception as e:
-            print(f"[clan_war] [discord_rooms_ids] Chyba při čtení: {e}")
-            self.data = {}
-
-    def save(self):
-        try:
-            with open(ROOM_IDS_PATH, "w") as f:
-                json.dump(self.data, f)
-        except Exception as e:
-            print(f"[clan_war] [discord_rooms_ids] Chyba při zápisu: {e}")
-
-    def get(self, key: str, default=None):
-        self.load()
-        return self.data.get(key, default)
-
-    def set(self, key: str, value):
-        self.load()
-        self.data[key] = value
-        self.save()
-
-    def remove(self, key: str):
-        self.load()
-        if key in self.data:
-            del self.data[key]
-            self.save()
-
-room_storage = RoomIdStorage()
 async def setup_mod_commands(bot):
 
     # === Role/permission helpers ===
@@ -309,8 +269,7 @@ async def setup_mod_commands(bot):
         resolved_tag = None
         if uzivatel:
             # dohledání tagu podle označeného uživatele
-            links = get_all_links()  # {discord_id: (coc_tag, coc_name)} :contentReference[oaicite:2]{index=2}
-            entry = links.get(int(uzivatel.id))
+            entry = get_link_by_discord(uzivatel.id)
             if not entry or not entry[0]:
                 await send_ephemeral(interaction, f"❌ Uživatel {uzivatel.mention} nemá propojený CoC účet.")
                 return
@@ -320,8 +279,7 @@ async def setup_mod_commands(bot):
             resolved_tag = coc_tag.strip().upper()
         else:
             # nebyl zadán ani uzivatel ani tag → zkusíme volajícího
-            links = get_all_links()  # :contentReference[oaicite:3]{index=3}
-            entry = links.get(int(interaction.user.id))
+            entry = get_link_by_discord(interaction.user.id)
             if not entry or not entry[0]:
                 await send_ephemeral(
                     interaction,
@@ -395,18 +353,14 @@ async def setup_mod_commands(bot):
         # Zpracování podle vstupu
         if uzivatel:
             # Hledání podle Discord uživatele
-            links = get_all_links()
-            coc_tag = None
-            for discord_id, (tag, _) in links.items():
-                if int(discord_id) == uzivatel.id:
-                    coc_tag = tag
-                    break
+            link = get_link_by_discord(uzivatel.id)
+            coc_tag = link[0] if link else None
 
             if not coc_tag:
                 await send_ephemeral(interaction, f"❌ Uživatel {uzivatel.mention} nemá propojený CoC účet")
                 return
 
-        rows = fetch_warnings()
+        rows = await run_db(fetch_warnings)
         filtered_rows = []
 
         if coc_tag:
@@ -421,12 +375,8 @@ async def setup_mod_commands(bot):
             filtered_rows = [row for row in rows if row[0] == coc_tag]
         else:
             # místo všech varování použít tag volajícího
-            links = get_all_links()
-            user_tag = None
-            for discord_id, (tag, _) in links.items():
-                if int(discord_id) == interaction.user.id:
-                    user_tag = tag
-                    break
+            link = get_link_by_discord(interaction.user.id)
+            user_tag = link[0] if link else None
 
             if not user_tag:
                 await send_ephemeral(interaction, "❌ Nemáš propojený CoC účet.")
@@ -441,10 +391,9 @@ async def setup_mod_commands(bot):
 
         header = "🔶 **Seznam varování**\n"
         lines = []
-        all_links = get_all_links()
-
         for i, (tag, dt, reason) in enumerate(filtered_rows, 1):
-            coc_name = next((name for _, (t, name) in all_links.items() if t == tag), "Neznámý hráč")
+            link = get_link_by_tag(tag)
+            coc_name = link[1] if link else "Neznámý hráč"
             lines.append(f"{i}. {tag} ({coc_name}) | {dt} | {reason}")
 
         msg = header + "\n".join(lines)
@@ -461,7 +410,7 @@ async def setup_mod_commands(bot):
         if not interaction.user.guild_permissions.administrator:
             await send_ephemeral(interaction, "❌ Tento příkaz může použít pouze moderátor.")
             return
-        remove_warning(coc_tag, date_time, reason)
+        await run_db(remove_warning, coc_tag, date_time, reason)
         await send_ephemeral(interaction, "🗑️ Varování odstraněno (pokud existovalo).")
 
     @bot.tree.command(
@@ -496,7 +445,7 @@ async def setup_mod_commands(bot):
 
         # a) Zkusíme najít CWL válku (aktivní vyhledání)
         cwl_candidate = None
-        group = await api_handler.fetch_league_group(our_tag, bot.config)
+        group = await api_handler.fetch_league_group(our_tag, bot.config, priority=api_handler.PRIORITY_INTERACTIVE)
         
         if group and group.get('state') != 'notInWar':
             # Změna: Projdeme všechna kola aktivně, nespoléháme na 'current_cwl_round'
@@ -516,49 +465,29 @@ async def setup_mod_commands(bot):
                 if state == "warEnded": return 1
                 return 0
 
-            # Proiterujeme všechna dostupná kola
-            for r in rounds:
-                war_tags = r.get("warTags", [])
-                for tag in war_tags:
-                    if tag == "#0": 
-                        continue
-                    
-                    # Optimalizace: Nestahovat data, pokud už jedno inWar máme?
-                    # Raději budeme přesní. Ale API calls mohou být drahé. 
-                    # Nicméně /kdo_neodehral se nevolá často.
-                    
-                    w = await api_handler.fetch_league_war(tag, bot.config)
-                    if not w:
-                        continue
-                    
-                    c_tag = w.get('clan', {}).get('tag', '').upper()
-                    o_tag = w.get('opponent', {}).get('tag', '').upper()
-                    
-                    if our_tag == c_tag or our_tag == o_tag:
-                        s = w.get("state")
-                        sc = get_state_score(s)
-                        
-                        # Pokud najdeme inWar, bereme ho hned a končíme hledání
-                        if s == "inWar":
-                            cwl_candidate = w
-                            best_cwl_score = 3
-                            break
-                        
-                        # Jinak bereme pokud je lepší než co máme (např. preparation je lepší než ended)
-                        # Pokud jsou dvě shodné (např. dvě ended), bereme tu pozdější (v poli rounds)
-                        # Protože iterujeme od začátku do konce, pozdější přepíše dřívější, 
-                        # pokud dáme >=. Ale 'warEnded' předchozího kola vs 'preparation' dalšího?
-                        # Preparation (2) > Ended (1). Takže OK.
-                        if sc >= best_cwl_score:
-                            cwl_candidate = w
-                            best_cwl_score = sc
-                            
-                if best_cwl_score == 3:
-                     # Máme aktivní válku, není třeba hledat v dalších kolech
-                     break
+            # Proiterujeme všechna dostupná kola – ukončená kola se čtou z lokální cache,
+            # kola se známým war tagem stojí nejvýš jeden požadavek
+            async for _, w in iter_our_league_wars(group, bot.config, priority=api_handler.PRIORITY_INTERACTIVE):
+                s = w.get("state")
+                sc = get_state_score(s)
+
+                # Pokud najdeme inWar, bereme ho hned a končíme hledání
+                if s == "inWar":
+                    cwl_candidate = w
+                    best_cwl_score = 3
+                    break
+
+                # Jinak bereme pokud je lepší než co máme (např. preparation je lepší než ended)
+                # Pokud jsou dvě shodné (např. dvě ended), bereme tu pozdější (v poli rounds)
+                # Protože iterujeme od začátku do konce, pozdější přepíše dřívější,
+                # pokud dáme >=. Ale 'warEnded' předchozího kola vs 'preparation' dalšího?
+                # Preparation (2) > Ended (1). Takže OK.
+                if sc >= best_cwl_score:
+                    cwl_candidate = w
+                    best_cwl_score = sc
 
         # b) Zkusíme najít klasickou CW
-        cw_candidate = await fetch_current_war(bot.clan_tag, bot.config)
+        cw_candidate = await fetch_current_war(bot.clan_tag, bot.config, priority=api_handler.PRIORITY_INTERACTIVE)
 
         # c) Vyhodnocení priority: Active CWL > Active CW > Ended CWL > Ended CW
         def get_war_score(w):
@@ -755,7 +684,7 @@ async def setup_mod_commands(bot):
             coc_tag = f"#{coc_tag}"
 
         try:
-            add_coc_link(str(uzivatel.id), coc_tag, coc_name)
+            await run_db(add_coc_link, str(uzivatel.id), coc_tag, coc_name)
 
             role = interaction.guild.get_role(ROLE_VERIFIED)
             if role:
@@ -797,7 +726,7 @@ async def setup_mod_commands(bot):
         uzivatel = uzivatel or interaction.user
 
         try:
-            remove_coc_link(str(uzivatel.id))
+            await run_db(remove_coc_link, str(uzivatel.id))
 
             role = interaction.guild.get_role(ROLE_VERIFIED)
             if role and role in uzivatel.roles:
@@ -1089,7 +1018,7 @@ async def setup_mod_commands(bot):
 
         await interaction.response.defer(thinking=True, ephemeral=True)
 
-        clan_members = get_all_members()
+        clan_members = await run_db(get_all_members)
         user_mapping = get_all_links()
 
         if not clan_members or not user_mapping:
@@ -1551,28 +1480,11 @@ async def setup_mod_commands(bot):
         await interaction.response.defer(ephemeral=True, thinking=True)
 
         try:
-            links = get_all_links()
-            members = get_all_members()
-
-            # Získání všech možných ID reprezentací uživatele
-            discord_ids_to_check = [
-                str(interaction.user.id),  # String ID
-                interaction.user.id,  # Integer ID
-                f"<@{interaction.user.id}>"  # Mention formát
-            ]
-
-            coc_tag = None
-            coc_name = None
+            members = await run_db(get_all_members)
 
-            # Prohledáme všechny možné formáty ID
-            for discord_id in discord_ids_to_check:
-                if discord_id in links:
-                    coc_tag, coc_name = links[discord_id]
-                    break
+            coc_tag, coc_name = get_link_by_discord(interaction.user.id) or (None, None)
 
             if not coc_tag:
-                # Debug výpis pro kontrolu
-                print(f"[DEBUG] User {interaction.user.id} not found in links. Available links: {links}")
                 await interaction.followup.send(
                     "❌ Nemáš propojený účet. Propoj ho nejdříve pomocí ověření nebo příkazu `/propoj_ucet`.\n"
                     f"Pokud si myslíš, že je to chyba, kontaktuj administrátora a uveď své ID: `{interaction.user.id}`",
@@ -1693,48 +1605,51 @@ async def setup_mod_commands(bot):
         if hasattr(bot, 'clan_tag'):
             embed.add_field(name="⚔️ Coc Config", value=f"**Clan Tag:** {bot.clan_tag}", inline=False)
 
+        api_stats = api_handler.api_stats()
+        if api_stats:
+            embed.add_field(
+                name="📡 CoC API",
+                value=(
+                    f"**Tokeny:** {api_stats['bucket_level']}/{api_stats['bucket_capacity']} ({api_stats['rate']}/s)\n"
+                    f"**Čekání na token:** {api_stats['throttled']}\n"
+                    f"**429 Rate limit:** {api_stats['rate_limited']} | **Opakování:** {api_stats['retries']}\n"
+                    f"**Cache:** {api_stats['cache_hits']} hit | {api_stats['not_modified']}× 304 | "
+                    f"{api_stats['coalesced']}× sdílený dotaz"
+                ),
+                inline=False
+            )
+
         files_to_send = []
         if hasattr(bot, 'clan_tag') and hasattr(bot, 'config'):
             import io
-            import json
             
             # 1. Fetch normal war
-            cw_data = await api_handler.fetch_current_war(bot.clan_tag, bot.config)
-            cw_str = json.dumps(cw_data, indent=2, ensure_ascii=False) if cw_data else '{"error": "Bez dat"}'
+            cw_data = await api_handler.fetch_current_war(bot.clan_tag, bot.config,
+                                                         priority=api_handler.PRIORITY_INTERACTIVE)
+            cw_str = json_codec.dumps(cw_data, indent=True) if cw_data else '{"error": "Bez dat"}'
             cw_file = discord.File(io.BytesIO(cw_str.encode("utf-8")), filename="current_war_api.json")
             files_to_send.append(cw_file)
                 
             # 2. Fetch CWL group
-            cwl_data = await api_handler.fetch_league_group(bot.clan_tag, bot.config)
-            cwl_str = json.dumps(cwl_data, indent=2, ensure_ascii=False) if cwl_data else '{"error": "Bez dat"}'
+            cwl_data = await api_handler.fetch_league_group(bot.clan_tag, bot.config,
+                                                            priority=api_handler.PRIORITY_INTERACTIVE)
+            cwl_str = json_codec.dumps(cwl_data, indent=True) if cwl_data else '{"error": "Bez dat"}'
             cwl_file = discord.File(io.BytesIO(cwl_str.encode("utf-8")), filename="cwl_group_api.json")
             files_to_send.append(cwl_file)
 
             # 3. Pokud existuje CWL, pokusíme se najít naši aktuální / probíhající CWL válku
             if cwl_data and 'clans' in cwl_data and 'rounds' in cwl_data:
                 our_war_data = None
-                our_clan_tag = bot.clan_tag.replace("#", "")
-                
                 # Projdeme kola od konce (poslední nejdřív, pro nalezení aktivní války)
-                rounds = reversed(cwl_data.get('rounds', []))
-                for round_data in rounds:
-                    war_tags = [wt for wt in round_data.get('warTags', []) if wt != "#0"]
-                    if not war_tags:
-                        continue
-                        
-                    for war_tag in war_tags:
-                        war_data = await api_handler.fetch_league_war(war_tag, bot.config)
-                        if war_data and war_data.get("state") not in ["notInWar"]:
-                            c1 = war_data.get("clan", {}).get("tag", "").replace("#", "")
-                            c2 = war_data.get("opponent", {}).get("tag", "").replace("#", "")
-                            if c1 == our_clan_tag or c2 == our_clan_tag:
-                                our_war_data = war_data
-                                break
-                    if our_war_data:
+                async for _, war_data in iter_our_league_wars(cwl_data, bot.config,
+                                                              priority=api_handler.PRIORITY_INTERACTIVE,
+                                                              reverse=True):
+                    if war_data.get("state") not in ["notInWar"]:
+                        our_war_data = war_data
                         break
-                        
+
                 if our_war_data:
-                    ow_str = json.dumps(our_war_data, indent=2, ensure_ascii=False)
+                    ow_str = json_codec.dumps(our_war_data, indent=True)
                     ow_file = discord.File(io.BytesIO(ow_str.encode("utf-8")), filename="our_cwl_war_api.json")
                     files_to_send.append(ow_file)
                 else:
@@ -1,13 +1,12 @@
 import asyncio
-import json
-import os
 from datetime import datetime
 
 import aiohttp
 
 import api_handler
-from api_handler import fetch_clan_members_list, fetch_player_data
-from database import process_clan_data, get_all_links, get_all_members, cleanup_old_warnings
+from api_handler import fetch_clan_members_list, fetch_player_data, ChangeTracker
+from database import process_clan_data, get_all_links, get_all_members, cleanup_old_warnings, run_db, \
+    compact_member_history
 from member_tracker import discord_sync_members_once
 from role_giver import update_roles
 from api_handler import fetch_current_war, fetch_current_capital
@@ -15,6 +14,7 @@ from clan_war import ClanWarHandler
 from clan_capital import ClanCapitalHandler
 from game_events import GameEventsHandler
 from clan_war_league import ClanWarLeagueHandler
+from state_store import bot_state, CWL_ACTIVE, CURRENT_CWL_ROUND
 
 
 
@@ -22,51 +22,13 @@ from clan_war_league import ClanWarLeagueHandler
 # === Stav pozastavení hodinového updatu ===
 is_hourly_paused = False
 
-THIS_DIR = os.path.dirname(os.path.abspath(__file__))
-ROOM_IDS_PATH = os.path.join(THIS_DIR, "discord_rooms_ids.json")
-class RoomIdStorage:
-    def __init__(self):
-        self.data = {}
-        self.load()
-
-    def load(self):
-        try:
-            if os.path.exists(ROOM_IDS_PATH):
-                with open(ROOM_IDS_PATH, "r") as f:
-                    self.data = json.load(f)
-        except Exception as e:
-            print(f"[clan_war] [discord_rooms_ids] Chyba při čtení: {e}")
-            self.data = {}
-
-    def save(self):
-        try:
-            with open(ROOM_IDS_PATH, "w") as f:
-                json.dump(self.data, f)
-        except Exception as e:
-            print(f"[clan_war] [discord_rooms_ids] Chyba při zápisu: {e}")
-
-    def get(self, key: str, default=None):
-        self.load()
-        return self.data.get(key, default)
-
-    def set(self, key: str, value):
-        self.load()
-        self.data[key] = value
-        self.save()
-
-    def remove(self, key: str):
-        self.load()
-        if key in self.data:
-            del self.data[key]
-            self.save()
-
-room_storage = RoomIdStorage()
+
 # === Funkce pro hodinové tahání dat ===
 async def hourly_clan_update(config: dict, bot):
     # Získání nebo vytvoření ClanWarHandleru
     clan_war_handler = getattr(bot, "clan_war_handler", None)  # Pokus o získání existujícího handleru z bot objektu
-    current_cwl_round = room_storage.get("current_cwl_round") or 0  # Načtení aktuálního kola CWL z úložiště
-    cwl_active = room_storage.get("cwl_active") or False  # Načtení stavu CWL z úložiště
+    current_cwl_round = bot_state.get(CURRENT_CWL_ROUND)  # Načtení aktuálního kola CWL z úložiště
+    cwl_active = bot_state.get(CWL_ACTIVE)  # Načtení stavu CWL z úložiště
     cwl_group_data = None  # Inicializace proměnné pro data CWL skupiny
 
     # Pokud ClanWarHandler neexistuje, vytvoříme nový
@@ -83,10 +45,14 @@ async def hourly_clan_update(config: dict, bot):
 
     # Vytvoření handleru pro Clan Capital (vždy nová instance)
     clan_capital_handler = ClanCapitalHandler(bot, config)
+    await clan_capital_handler.load_warnings()
 
     # Vytvoření handleru pro CWL
     clan_war_league_handler = ClanWarLeagueHandler(bot, config)
 
+    # Sledování změn seznamu členů (nezměněná data z cache se nezpracovávají znovu)
+    members_changes = ChangeTracker()
+
     # Hlavní smyčka
     while True:
         if not is_hourly_paused:
@@ -110,21 +76,28 @@ async def hourly_clan_update(config: dict, bot):
             print("🔁 [Scheduler] Spouštím aktualizaci seznamu členů klanu...")
             try:
                 data = await fetch_clan_members_list(config["CLAN_TAG"], config)
-                if data:
-                    print(f"✅ [Scheduler] Načteno {len(data.get('items', []))} členů klanu.")
-                    process_clan_data(data.get("items", []), bot=bot)
+                if data and members_changes.is_unchanged(data):
+                    print("ℹ️ [Scheduler] Seznam členů se nezměnil, přeskakuji zápis do databáze.")
+                elif data:
+                    members = api_handler.parse_members(data)
+                    print(f"✅ [Scheduler] Načteno {len(members)} členů klanu.")
+                    changes = await process_clan_data(members, bot=bot)
+                    if changes:
+                        print(f"📋 [Scheduler] Členové: {changes.summary()}")
+                    # Jen po potvrzeném zápisu – při chybě DB se stejná data zpracují znovu
+                    members_changes.mark_seen(data)
                 else:
                     print("⚠️ [Scheduler] Nepodařilo se získat seznam členů klanu.")
             except (aiohttp.ClientError, asyncio.TimeoutError) as e:
                 print(f"❌ [Scheduler] Chyba při načítání členů klanu: {e}")
             except Exception as e:
-                print(f"❌ [Scheduler] Neočekávaná chyba při fetch_clan_members_list: {e}")
+                print(f"❌ [Scheduler] Chyba při aktualizaci seznamu členů klanu: {e}")
 
             # === Aktualizace rolí ===
             try:
                 print("🔄 [Scheduler] Spouštím automatickou aktualizaci rolí...")
                 links = get_all_links()
-                members = get_all_members()
+                members = await run_db(get_all_members)
                 await update_roles(guild, links, members)
                 print("✅ [Scheduler] Aktualizace rolí dokončena.")
             except Exception as e:
@@ -153,6 +126,12 @@ async def hourly_clan_update(config: dict, bot):
             except Exception as e:
                 print(f"❌ [Scheduler] Chyba při mazání varování: {e}")
 
+            # === HISTORIE ČLENŮ ===
+            try:
+                await compact_member_history()
+            except Exception as e:
+                print(f"❌ [Scheduler] Chyba při zhušťování historie členů: {e}")
+
             # === CLAN WAR and CLAN WAR LEAGUE ===
             try:
                 # --- Normální války ---
@@ -208,7 +187,7 @@ async def verification_check_loop(bot, player_tag, user, verification_channel, c
     pause_hourly_update()
 
     try:
-        player_data = await fetch_player_data(player_tag, config)
+        player_data = await fetch_player_data(player_tag, config, priority=api_handler.PRIORITY_INTERACTIVE)
         if not player_data:
             raise ValueError("Nepodařilo se načíst data hráče")
 
@@ -220,7 +199,7 @@ async def verification_check_loop(bot, player_tag, user, verification_channel, c
         for try_num in range(1, 7):  # 6 pokusů
             await asyncio.sleep(300)
 
-            player_data = await fetch_player_data(player_tag, config)
+            player_data = await fetch_player_data(player_tag, config, priority=api_handler.PRIORITY_INTERACTIVE)
             if not player_data:
                 continue
 
@@ -0,0 +1,234 @@
+"""
+Jediné sdílené úložiště běhového stavu bota (ID zpráv, flagy připomínek, CWL kolo…).
+
+Všechny moduly čtou a zapisují přes `bot_state` s typovanými klíči (StateKey), takže
+existuje jen jedna kopie dat v paměti a nikdo nepřepíše klíče ostatních.
+Stav se ukládá do tabulky `bot_state` v SQLite (odloženě, jen změněné klíče),
+změny lze sledovat přes `subscribe`.
+"""
+import asyncio
+import atexit
+import os
+import time
+from typing import Any, Callable, Generic, TypeVar
+
+import json_codec
+from database import load_bot_state, save_bot_state, import_bot_state, run_db, run_db_sync
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+LEGACY_STATE_PATH = os.path.join(THIS_DIR, "discord_rooms_ids.json")  # starý JSON soubor, jen pro migraci
+FLUSH_DELAY = 2.0  # za kolik sekund po poslední změně se stav zapíše do databáze
+
+T = TypeVar("T")
+
+
+class StateKey(Generic[T]):
+    """
+    Pojmenovaný klíč stavu s typem hodnoty a výchozí hodnotou.
+    `ttl` (sekundy) = hodnota po této době od zápisu expiruje a vrací se výchozí.
+    """
+    __slots__ = ("name", "type", "default", "ttl")
+
+    def __init__(self, name: str, type_: type, default: T | None = None, ttl: float | None = None):
+        self.name = name
+        self.type = type_
+        self.default = default
+        self.ttl = ttl
+
+    def __repr__(self) -> str:
+        return f"StateKey({self.name!r})"
+
+
+# === Známé klíče ===
+WAR_STATUS_MESSAGE = StateKey("war_status_message", int)
+LAST_WAR_EVENT_ORDER = StateKey("last_war_event_order", int, 0)
+LAST_WAR_RULES_ORDER = StateKey("last_war_rules_order", int, 0)  # checkpoint pochval / varování za útoky
+CURRENT_WAR_START_TIME = StateKey("current_war_start_time", str)
+LAST_NO_WAR_REMINDER_DATE = StateKey("last_no_war_reminder_date", str, ttl=2 * 86400)
+
+CWL_ACTIVE = StateKey("cwl_active", bool, False)
+CURRENT_CWL_ROUND = StateKey("current_cwl_round", int, 0)
+CWL_SEASON = StateKey("cwl_season", str)
+CWL_CATCHUP_MODE = StateKey("cwl_catchup_mode", bool, False)
+
+CAPITAL_STATUS_MESSAGE = StateKey("capital_status_message", int)
+CAPITAL_START_TIME = StateKey("capital_start_time", str)
+
+GAME_EVENTS_MESSAGE = StateKey("game_events_message", int)
+
+WAR_REMINDER_PREFIX = "war_reminder_"
+WAR_REMINDER_TTL = 3 * 86400  # válka (příprava + boj) trvá max. 2 dny
+
+
+def war_reminder_key(hours: int) -> StateKey[bool]:
+    """Flag, že připomínka `hours` hodin před koncem války už byla odeslána."""
+    return StateKey(f"{WAR_REMINDER_PREFIX}{hours}h", bool, False, ttl=WAR_REMINDER_TTL)
+
+
+LIVE_MESSAGE_PREFIX = "live_message_"
+LIVE_MESSAGE_TTL = 30 * 86400  # otisk zprávy, kterou už 30 dní nikdo neupravil, zahodíme
+
+
+def live_message_key(message_id: int) -> StateKey[str]:
+    """Otisk obsahu, který průběžně editovaná zpráva `message_id` právě zobrazuje."""
+    return StateKey(f"{LIVE_MESSAGE_PREFIX}{message_id}", str, ttl=LIVE_MESSAGE_TTL)
+
+
+Listener = Callable[[str, Any], None]
+
+
+class StateStore:
+    """
+    Stav držený v paměti. Z databáze se načte jednou (při startu bota v DB vlákně,
+    jinak líně při prvním přístupu), čtení jde jen z paměti. Změny se sloučí a po FLUSH_DELAY
+    se zapíšou jen změněné klíče jedním upsertem v DB vlákně. Při ukončení bota se zapíše
+    okamžitě (`flush`).
+    """
+
+    def __init__(self, legacy_path: str = LEGACY_STATE_PATH):
+        self.legacy_path = legacy_path
+        self._data: dict[str, Any] = {}
+        self._expires: dict[str, float] = {}
+        self._listeners: dict[str, list[Listener]] = {}
+        self._dirty: set[str] = set()
+        self._loaded = False
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._writes: set[asyncio.Task] = set()  # běžící zápisy na pozadí
+
+    def load(self):
+        self._migrate_legacy_file()
+        self._data, self._expires = {}, {}
+        for name, (value, expires_at) in load_bot_state().items():
+            self._data[name] = value
+            if expires_at is not None:
+                self._expires[name] = expires_at
+        self._loaded = True
+
+    def _migrate_legacy_file(self):
+        """Jednorázově převede starý discord_rooms_ids.json do databáze a soubor přejmenuje."""
+        if not os.path.exists(self.legacy_path):
+            return
+        try:
+            # import_bot_state chybu propustí → soubor se přejmenuje jen po potvrzeném zápisu
+            imported = import_bot_state(json_codec.load_file(self.legacy_path))
+            os.replace(self.legacy_path, f"{self.legacy_path}.migrated")
+            print(f"✅ [state_store] Migrováno {imported} klíčů z {self.legacy_path} do databáze")
+        except Exception as e:
+            print(f"❌ [state_store] Chyba při migraci {self.legacy_path} (soubor ponechán): {e}")
+
+    def ensure_loaded(self):
+        """
+        Načte stav, pokud ještě načtený není. Bot to volá při startu v DB vlákně
+        (`await run_db(bot_state.ensure_loaded)`); líné načtení při prvním `get` je jen pojistka.
+        """
+        if not self._loaded:
+            self.load()
+
+    def _take_changes(self) -> dict[str, tuple | None]:
+        """Vybere neuložené změny: {klíč: (hodnota, expires_at)}, None = smazat."""
+        dirty, self._dirty = self._dirty, set()
+        return {
+            name: (self._data[name], self._expires.get(name)) if name in self._data else None
+            for name in dirty
+        }
+
+    def flush(self):
+        """Okamžitě zapíše změněné klíče do databáze (počká na dokončení)."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        changes = self._take_changes()
+        if changes and not run_db_sync(save_bot_state, changes):
+            self._dirty |= changes.keys()  # zkusí se znovu při další změně / ukončení
+
+    def _flush_in_background(self):
+        self._flush_handle = None
+        changes = self._take_changes()
+        if changes:
+            task = asyncio.ensure_future(self._write(changes))
+            self._writes.add(task)
+            task.add_done_callback(self._writes.discard)
+
+    async def _write(self, changes: dict[str, tuple | None]):
+        if not await run_db(save_bot_state, changes):
+            self._dirty |= changes.keys()
+
+    def _schedule_flush(self, name: str):
+        self._dirty.add(name)
+        if self._flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Mimo event loop (skripty, start) není kdo by zápis odložil
+            self.flush()
+            return
+        self._flush_handle = loop.call_later(FLUSH_DELAY, self._flush_in_background)
+
+    def _notify(self, name: str, value):
+        for prefix, listeners in self._listeners.items():
+            if name.startswith(prefix):
+                for listener in list(listeners):
+                    try:
+                        listener(name, value)
+                    except Exception as e:
+                        print(f"❌ [state_store] Chyba v posluchači {name}: {e}")
+
+    # --- veřejné API ---
+    def get(self, key: StateKey[T]) -> T:
+        self.ensure_loaded()
+        expires_at = self._expires.get(key.name)
+        if expires_at is not None and expires_at <= time.time():
+            self.delete(key)
+        value = self._data.get(key.name)
+        return key.default if value is None else value
+
+    def set(self, key: StateKey[T], value: T | None):
+        """Uloží hodnotu (None = smazat klíč). Typ hodnoty musí odpovídat klíči."""
+        if value is None:
+            self.delete(key)
+            return
+        if not isinstance(value, key.type):
+            raise TypeError(f"{key.name}: očekáván {key.type.__name__}, dostal {type(value).__name__}")
+        self.ensure_loaded()
+        if key.ttl is not None:
+            self._expires[key.name] = time.time() + key.ttl
+        elif self._data.get(key.name) == value:
+            return
+        changed = self._data.get(key.name) != value
+        self._data[key.name] = value
+        self._schedule_flush(key.name)
+        if changed:
+            self._notify(key.name, value)
+
+    def delete(self, key: StateKey):
+        self.ensure_loaded()
+        self._expires.pop(key.name, None)
+        if key.name in self._data:
+            del self._data[key.name]
+            self._schedule_flush(key.name)
+            self._notify(key.name, None)
+
+    def delete_prefix(self, prefix: str) -> int:
+        """Smaže všechny klíče začínající na `prefix`, vrátí jejich počet."""
+        self.ensure_loaded()
+        names = [name for name in self._data if name.startswith(prefix)]
+        for name in names:
+            del self._data[name]
+            self._expires.pop(name, None)
+            self._schedule_flush(name)
+            self._notify(name, None)
+        return len(names)
+
+    def subscribe(self, key: StateKey | str, listener: Listener) -> Callable[[], None]:
+        """
+        Zavolá `listener(název, nová_hodnota)` při každé změně klíče
+        (řetězec = všechny klíče s tímto prefixem). Vrací funkci pro odhlášení.
+        """
+        prefix = key.name if isinstance(key, StateKey) else key
+        self._listeners.setdefault(prefix, []).append(listener)
+        return lambda: self._listeners[prefix].remove(listener)
+
+
+bot_state = StateStore()
+atexit.register(bot_state.flush)  # pojistka, kdyby se bot neukončil přes close()
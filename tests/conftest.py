@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Čistá databáze v dočasném adresáři (sdílené spojení i index propojení se vynulují)."""
+    database.close_db()
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "test.sqlite3"))
+    monkeypatch.setattr(database, "_link_index", None)
+    database.initialize_db()
+    yield database
+    database.close_db()
@@ -0,0 +1,146 @@
+import asyncio
+import types
+from contextlib import asynccontextmanager
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import api_handler
+from api_handler import CocApiClient
+
+ENDPOINT = "clans/%23US/members"
+
+
+class FakeApi:
+    """Lokální CoC API: jeden JSON dokument s ETagem a Cache-Control, na If-None-Match vrací 304."""
+
+    def __init__(self, max_age: int | None = 30):
+        self.body = {"items": [{"tag": "#A", "name": "A"}]}
+        self.version = 1
+        self.max_age = max_age
+        self.delay = 0.0
+        self.requests: list[str | None] = []     # If-None-Match každého požadavku
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.version}"'
+
+    def change(self, **fields):
+        self.body = {"items": [{**self.body["items"][0], **fields}]}
+        self.version += 1
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests.append(request.headers.get("If-None-Match"))
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        headers = {"ETag": self.etag}
+        if self.max_age is not None:
+            headers["Cache-Control"] = f"public max-age={self.max_age}"
+        if request.headers.get("If-None-Match") == self.etag:
+            return web.Response(status=304, headers=headers)
+        return web.json_response(self.body, headers=headers)
+
+
+@asynccontextmanager
+async def running(api: FakeApi):
+    """Spustí FakeApi a vrátí CocApiClient, který na něj míří."""
+    app = web.Application()
+    app.router.add_get("/v1/{path:.*}", api.handle)
+    server = TestServer(app)
+    await server.start_server()
+    client = CocApiClient({"COC_API_KEY": "test", "COC_API_BASE_URL": str(server.make_url("/v1"))})
+    try:
+        yield client
+    finally:
+        await client.close()
+        await server.close()
+
+
+def frozen_clock(monkeypatch) -> list[float]:
+    """Ručně posouvané hodiny pro api_handler (max-age a token bucket)."""
+    clock = [1000.0]
+    monkeypatch.setattr(api_handler, "time", types.SimpleNamespace(monotonic=lambda: clock[0]))
+    return clock
+
+
+def test_fresh_entry_is_served_from_memory(monkeypatch):
+    frozen_clock(monkeypatch)
+    api = FakeApi(max_age=30)
+
+    async def run():
+        async with running(api) as client:
+            first = await client.get(ENDPOINT, cache=True)
+            second = await client.get(ENDPOINT, cache=True)
+            assert not first.from_cache and second.from_cache
+            assert second.data == api.body and second.revision == first.revision
+            assert len(api.requests) == 1 and client.cache_hits == 1
+
+    asyncio.run(run())
+
+
+def test_expired_entry_is_revalidated_with_etag(monkeypatch):
+    clock = frozen_clock(monkeypatch)
+    api = FakeApi(max_age=30)
+
+    async def run():
+        async with running(api) as client:
+            first = await client.get(ENDPOINT, cache=True)
+
+            clock[0] += 31
+            revalidated = await client.get(ENDPOINT, cache=True)
+            assert api.requests == [None, api.etag]
+            assert revalidated.from_cache and client.not_modified == 1
+            assert revalidated.revision == first.revision and revalidated.data == first.data
+
+            # 304 obnovil max-age → další dotaz jde z paměti
+            await client.get(ENDPOINT, cache=True)
+            assert len(api.requests) == 2
+
+    asyncio.run(run())
+
+
+def test_changed_content_gets_new_revision(monkeypatch):
+    clock = frozen_clock(monkeypatch)
+    api = FakeApi(max_age=30)
+
+    async def run():
+        async with running(api) as client:
+            first = await client.get(ENDPOINT, cache=True)
+            api.change(name="B")
+            clock[0] += 31
+            changed = await client.get(ENDPOINT, cache=True)
+            assert not changed.from_cache
+            assert changed.data["items"][0]["name"] == "B"
+            assert changed.revision != first.revision
+
+    asyncio.run(run())
+
+
+def test_missing_max_age_revalidates_every_time(monkeypatch):
+    frozen_clock(monkeypatch)
+    api = FakeApi(max_age=None)
+
+    async def run():
+        async with running(api) as client:
+            revisions = {(await client.get(ENDPOINT, cache=True)).revision for _ in range(3)}
+            assert api.requests == [None, api.etag, api.etag]
+            assert len(revisions) == 1 and client.not_modified == 2
+
+    asyncio.run(run())
+
+
+def test_payload_is_independent_of_cache(monkeypatch):
+    frozen_clock(monkeypatch)
+    api = FakeApi(max_age=30)
+
+    async def run():
+        async with running(api) as client:
+            payload = api_handler._payload(await client.get(ENDPOINT, cache=True))
+            payload["items"][0]["name"] = "upraveno"
+            payload["items"].append({"tag": "#Z"})
+
+            cached = await client.get(ENDPOINT, cache=True)
+            assert cached.from_cache and cached.data == api.body
+            assert api_handler._payload(cached) == api.body
+
+    asyncio.run(run())
@@ -0,0 +1,101 @@
+import asyncio
+import types
+
+import pytest
+
+import clan_war
+import state_store
+from coc_models import War
+from constants import WAR_EVENTS_CHANNEL_ID
+from war_diff import NewAttack
+
+OUR_TAG = "#US"
+START = "20260101T100000.000Z"
+
+
+def make_war(attack_count: int) -> War:
+    """Válka, ve které soupeř provedl `attack_count` útoků (obrany – bez pochval a varování)."""
+    def member(tag: str, position: int, attacks: list[dict]) -> dict:
+        return {"tag": tag, "name": tag, "mapPosition": position, "townhallLevel": 15, "attacks": attacks}
+
+    size = max(attack_count, 1)
+    ours = [member(f"#A{i}", i, []) for i in range(1, size + 1)]
+    theirs = [member(f"#X{i}", i, [{"attackerTag": f"#X{i}", "defenderTag": f"#A{i}", "stars": 2,
+                                     "destructionPercentage": 80, "order": i}] if i <= attack_count else [])
+              for i in range(1, size + 1)]
+    return War.from_api({
+        "state": "inWar",
+        "teamSize": size,
+        "startTime": START,
+        "clan": {"tag": OUR_TAG, "name": "us", "members": ours},
+        "opponent": {"tag": "#THEM", "name": "them", "members": theirs},
+    }, OUR_TAG)
+
+
+class FeedChannel:
+    def __init__(self, fail_on_call: int | None = None):
+        self.batches: list[list[int]] = []      # pořadová čísla útoků v každé zprávě
+        self.fail_on_call = fail_on_call
+        self.calls = 0
+
+    async def send(self, embeds):
+        self.calls += 1
+        if self.calls == self.fail_on_call:
+            raise RuntimeError("Discord nedostupný")
+        assert len(embeds) <= clan_war.ATTACK_FEED_BATCH
+        self.batches.append([int(embed.footer.text.split(" | ")[0].split("#")[-1]) for embed in embeds])
+
+
+@pytest.fixture
+def store(db, tmp_path, monkeypatch):
+    new_store = state_store.StateStore(legacy_path=str(tmp_path / "discord_rooms_ids.json"))
+    monkeypatch.setattr(clan_war, "bot_state", new_store)
+    yield new_store
+    new_store.flush()
+
+
+def make_handler(channel: FeedChannel) -> clan_war.ClanWarHandler:
+    bot = types.SimpleNamespace(get_channel=lambda channel_id: channel if channel_id == WAR_EVENTS_CHANNEL_ID else None,
+                                get_guild=lambda guild_id: None)
+    handler = clan_war.ClanWarHandler(bot, {"CLAN_TAG": OUR_TAG, "GUILD_ID": 1})
+    handler._differ = clan_war.WarDiffer(START)
+    return handler
+
+
+async def feed_cycle(handler: clan_war.ClanWarHandler, war: War) -> bool:
+    """Jeden cyklus feedu: NewAttack události → zařazení do dávky → odeslání."""
+    events = [e for e in handler._differ.diff(war, START) if isinstance(e, NewAttack)]
+    assert await handler.events.publish(events) == []
+    return await handler._flush_attack_feed()
+
+
+@pytest.mark.parametrize("attack_count, batch_sizes", [(10, [10]), (11, [10, 1]), (20, [10, 10])])
+def test_attacks_are_sent_in_batches_of_ten(store, attack_count, batch_sizes):
+    channel = FeedChannel()
+    handler = make_handler(channel)
+
+    assert asyncio.run(feed_cycle(handler, make_war(attack_count)))
+
+    assert [len(batch) for batch in channel.batches] == batch_sizes
+    assert [order for batch in channel.batches for order in batch] == list(range(1, attack_count + 1))
+    assert handler._differ.last_order == attack_count
+    assert store.get(state_store.LAST_WAR_EVENT_ORDER) == attack_count
+
+
+def test_failed_batch_is_resent_from_checkpoint(store):
+    channel = FeedChannel(fail_on_call=2)
+    handler = make_handler(channel)
+    war = make_war(20)
+
+    async def run():
+        assert not await feed_cycle(handler, war)
+        assert handler._differ.last_order == 10          # první dávka prošla, druhá ne
+
+        assert await feed_cycle(handler, war)
+        assert channel.batches == [list(range(1, 11)), list(range(11, 21))]
+        assert handler._differ.last_order == 20
+
+        assert await feed_cycle(handler, war)            # nic nového → nic se neposílá
+        assert channel.calls == 3
+
+    asyncio.run(run())
@@ -0,0 +1,76 @@
+import threading
+
+
+def reload_index(db):
+    """Index znovu načtený z DB (pro porovnání s inkrementálně udržovaným)."""
+    db._link_index = None
+    return db._get_link_index()
+
+
+def test_lookups_in_both_directions(db):
+    db.add_coc_link("111", "#abc", "Alfa")
+    assert db.get_link_by_discord(111) == ("#abc", "Alfa")
+    assert db.get_discord_id_by_tag(" #ABC ") == 111
+    assert db.get_link_by_tag("abc") == (111, "Alfa")
+    assert db.get_link_by_discord("999") is None and db.get_link_by_tag("#NONE") is None
+
+
+def test_update_replaces_index_instead_of_mutating(db):
+    db.add_coc_link("111", "#A", "Alfa")
+    before = db._get_link_index()
+    snapshot = (dict(before[0]), dict(before[1]))
+
+    db.add_coc_link("222", "#B", "Beta")
+    db.remove_coc_link("111")
+
+    assert (before[0], before[1]) == snapshot          # čtenář se starým indexem vidí konzistentní stav
+    assert db._get_link_index() is not before
+    assert db.get_all_links() == {222: ("#B", "Beta")}
+
+
+def test_get_all_links_returns_copy(db):
+    db.add_coc_link("111", "#A", "Alfa")
+    links = db.get_all_links()
+    links.clear()
+    assert db.get_link_by_discord(111) == ("#A", "Alfa")
+
+
+def test_incremental_index_matches_database(db):
+    db.add_coc_link("111", "#A", "Alfa")
+    db.add_coc_link("222", "#A", "Alfa 2")             # druhý účet na stejný tag
+    db.add_coc_link("333", "#C", "Cecílie")
+    db.add_coc_link("111", "#B", "Beta")               # přepropojení
+    assert db.get_discord_id_by_tag("#A") == 222
+
+    db.remove_coc_link("333")
+    incremental = db._get_link_index()
+    assert incremental == reload_index(db)
+
+
+def test_readers_never_see_half_updated_index(db):
+    db.get_all_links()
+    stop = threading.Event()
+    errors = []
+
+    def reader():
+        while not stop.is_set():
+            by_discord, by_tag = db._get_link_index()
+            for tag, discord_id in by_tag.items():
+                if db.normalize_tag(by_discord[discord_id][0]) != tag:
+                    errors.append((tag, discord_id))
+
+    readers = [threading.Thread(target=reader) for _ in range(3)]
+    for thread in readers:
+        thread.start()
+    try:
+        for i in range(200):
+            db.add_coc_link(str(1000 + i % 20), f"#T{i % 7}", f"hráč {i}")
+            if i % 3 == 0:
+                db.remove_coc_link(str(1000 + i % 20))
+    finally:
+        stop.set()
+        for thread in readers:
+            thread.join()
+
+    assert errors == []
+    assert db._get_link_index() == reload_index(db)
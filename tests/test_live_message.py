@@ -0,0 +1,132 @@
+import asyncio
+import itertools
+import types
+
+import discord
+import pytest
+
+import live_message
+import state_store
+
+
+class FakeMessage:
+    def __init__(self, channel: "FakeChannel", message_id: int):
+        self.channel = channel
+        self.id = message_id
+
+    async def edit(self, content=None, embed=None):
+        if self.id in self.channel.deleted:
+            raise discord.NotFound(types.SimpleNamespace(status=404, reason="Not Found"), "Unknown Message")
+        self.channel.edits.append((self.id, content, embed.to_dict() if embed else None))
+
+
+class FakeChannel:
+    def __init__(self):
+        self.id = 42
+        self.sent: list[int] = []
+        self.edits: list[tuple] = []
+        self.deleted: set[int] = set()
+        self._ids = itertools.count(1000)
+
+    def get_partial_message(self, message_id: int) -> FakeMessage:
+        return FakeMessage(self, message_id)
+
+    async def send(self, content=None, embed=None) -> FakeMessage:
+        message = FakeMessage(self, next(self._ids))
+        self.sent.append(message.id)
+        return message
+
+
+@pytest.fixture
+def store(db, tmp_path, monkeypatch):
+    """Čerstvý bot_state nad testovací DB a prázdné paměťové cache live_message."""
+    new_store = state_store.StateStore(legacy_path=str(tmp_path / "discord_rooms_ids.json"))
+    monkeypatch.setattr(live_message, "bot_state", new_store)
+    monkeypatch.setattr(live_message, "_handles", {})
+    monkeypatch.setattr(live_message, "_embeds", {})
+    yield new_store
+    new_store.flush()
+
+
+def status_embed(state: str) -> discord.Embed:
+    embed = discord.Embed(title="Stav války", description=state)
+    embed.add_field(name="Útoky", value="3/30")
+    return embed
+
+
+def test_digest_depends_only_on_content():
+    assert live_message.content_digest(status_embed("inWar")) == live_message.content_digest(status_embed("inWar"))
+    assert live_message.content_digest(status_embed("inWar")) != live_message.content_digest(status_embed("warEnded"))
+    assert live_message.content_digest(status_embed("inWar")) != live_message.content_digest(status_embed("inWar"), "x")
+
+
+def test_unchanged_content_is_not_edited(store):
+    channel = FakeChannel()
+
+    async def run():
+        message_id = await live_message.publish(channel, None, embed=status_embed("preparation"))
+        assert channel.sent == [message_id]
+
+        assert await live_message.publish(channel, message_id, embed=status_embed("preparation")) == message_id
+        assert channel.edits == []
+
+        assert await live_message.publish(channel, message_id, embed=status_embed("inWar")) == message_id
+        assert await live_message.publish(channel, message_id, embed=status_embed("inWar")) == message_id
+        assert [edit[0] for edit in channel.edits] == [message_id]
+        assert channel.sent == [message_id]
+
+    asyncio.run(run())
+
+
+def test_missing_message_is_replaced(store):
+    channel = FakeChannel()
+
+    async def run():
+        old_id = await live_message.publish(channel, None, embed=status_embed("preparation"))
+        channel.deleted.add(old_id)
+
+        new_id = await live_message.publish(channel, old_id, embed=status_embed("inWar"))
+        assert new_id != old_id and channel.sent == [old_id, new_id]
+        assert store.get(state_store.live_message_key(old_id)) is None
+        assert live_message.is_unchanged(new_id, status_embed("inWar"))
+
+    asyncio.run(run())
+
+
+def test_digest_survives_restart(store, tmp_path, monkeypatch):
+    channel = FakeChannel()
+
+    async def first_run() -> int:
+        return await live_message.publish(channel, None, embed=status_embed("inWar"))
+
+    message_id = asyncio.run(first_run())
+    store.flush()
+
+    # Nový proces: prázdný stav v paměti, otisky se načtou z DB
+    restarted = state_store.StateStore(legacy_path=str(tmp_path / "discord_rooms_ids.json"))
+    monkeypatch.setattr(live_message, "bot_state", restarted)
+    monkeypatch.setattr(live_message, "_handles", {})
+    monkeypatch.setattr(live_message, "_embeds", {})
+
+    async def second_run():
+        assert await live_message.publish(channel, message_id, embed=status_embed("inWar")) == message_id
+        assert channel.edits == [] and channel.sent == [message_id]
+
+    asyncio.run(second_run())
+
+
+def test_set_footer_uses_remembered_embed(store):
+    channel = FakeChannel()
+
+    async def run():
+        message_id = await live_message.publish(channel, None, embed=status_embed("warEnded"))
+        await live_message.set_footer(channel, message_id, "Ukončeno")
+
+        (edited_id, _, embed), = channel.edits
+        assert edited_id == message_id and embed["footer"] == {"text": "Ukončeno"}
+
+        # Footer je teď součástí zobrazeného obsahu → stejný embed s footerem se znovu needituje
+        ended = status_embed("warEnded").set_footer(text="Ukončeno")
+        assert live_message.is_unchanged(message_id, ended)
+
+    asyncio.run(run())
@@ -0,0 +1,86 @@
+import pytest
+
+from test_member_sync import member
+
+NOW = 1_800_000_000
+HOUR, DAY = 3600, 86400
+
+
+def snapshot_rows(db, tag: str) -> list[tuple[int, int, str]]:
+    with db.db_connection() as conn:
+        return conn.execute("SELECT ts, changed, data FROM member_snapshots WHERE tag = ? ORDER BY ts",
+                            (tag,)).fetchall()
+
+
+def replay(db, rows) -> list[tuple[int, dict]]:
+    """[(ts, úplný stav)] – stav po každém snímku (delty se postupně přepisují)."""
+    states, state = [], {}
+    for ts, mask, data in rows:
+        state.update(db._unpack_snapshot(mask, data))
+        states.append((ts, dict(state)))
+    return states
+
+
+def field_series(db, rows, field_name: str) -> list[tuple[int, object]]:
+    return [(ts, state[field_name]) for ts, state in replay(db, rows)]
+
+
+@pytest.fixture
+def history(db, monkeypatch):
+    """Hráč #A s historií změn: před 40 dny, před 2 dny (dvě různé hodiny) a v poslední hodině."""
+    clock = [0]
+    monkeypatch.setattr(db.time, "time", lambda: clock[0])
+
+    def sync(at: int, **fields):
+        clock[0] = at
+        db.update_or_create_members([member("#A", **fields)])
+
+    sync(NOW - 40 * DAY, trophies=4000)
+    sync(NOW - 40 * DAY + 600, trophies=4100)
+    sync(NOW - 40 * DAY + 2 * HOUR, trophies=4100, role="elder")
+    sync(NOW - 40 * DAY + 5 * HOUR, trophies=4000, role="elder")     # návrat na dřívější hodnotu
+    sync(NOW - 2 * DAY, trophies=4500, role="elder")
+    sync(NOW - 2 * DAY + 180, trophies=4550, role="elder", townHallLevel=16)
+    sync(NOW - 2 * DAY + 2 * HOUR, trophies=4600, role="elder", townHallLevel=16)
+    sync(NOW - 600, trophies=5000, role="coLeader", townHallLevel=16)
+    sync(NOW - 420, trophies=5050, role="coLeader", townHallLevel=16)
+    return db
+
+
+def test_deltas_store_only_changed_fields(history):
+    rows = snapshot_rows(history, "#A")
+    assert len(rows) == 9
+    assert rows[0][1] == history._SNAPSHOT_FULL_MASK
+    assert history._unpack_snapshot(rows[1][1], rows[1][2]) == {"trophies": 4100}
+    assert history._unpack_snapshot(rows[2][1], rows[2][2]) == {"role": "elder"}
+
+    final = replay(history, rows)[-1][1]
+    current = member("#A", trophies=5050, role="coLeader", townHallLevel=16).as_row()
+    assert final == {f: current[history.TRACKED_FIELDS.index(f)] for f in history.SNAPSHOT_FIELDS}
+
+
+def test_compaction_keeps_reconstructed_series(history):
+    before = snapshot_rows(history, "#A")
+
+    removed = history.compact_member_snapshots(now=NOW)
+    after = snapshot_rows(history, "#A")
+    assert removed == len(before) - len(after) > 0
+
+    # Po zhuštění zbývá jeden snímek na den (>30 dní), na hodinu (>1 den) a čerstvé beze změny
+    assert [ts for ts, _, _ in after] == [
+        NOW - 40 * DAY + 5 * HOUR,
+        NOW - 2 * DAY + 180,
+        NOW - 2 * DAY + 2 * HOUR,
+        NOW - 600,
+        NOW - 420,
+    ]
+
+    # Řada každého pole v okamžicích, které zhuštění zachovalo, je shodná s řadou před ním
+    kept = {ts for ts, _, _ in after}
+    for field_name in history.SNAPSHOT_FIELDS:
+        expected = [(ts, value) for ts, value in field_series(history, before, field_name) if ts in kept]
+        assert field_series(history, after, field_name) == expected, field_name
+
+    # Opakované zhuštění už nic nemění
+    assert history.compact_member_snapshots(now=NOW) == 0
+    assert snapshot_rows(history, "#A") == after
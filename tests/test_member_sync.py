@@ -0,0 +1,64 @@
+import dataclasses
+
+import pytest
+
+from coc_models import ClanMember
+
+
+def member(tag: str, **fields) -> ClanMember:
+    values = dict(name=tag.lstrip("#"), tag=tag, role="member", townHallLevel=15, league="Legend League",
+                  trophies=5000, builderBaseLeague="", builderBaseTrophies=3000, clanRank=1,
+                  previousClanRank=1, donations=0, donationsReceived=0)
+    values.update(fields)
+    return ClanMember(**values)
+
+
+def stored_rows(db) -> dict[str, tuple]:
+    with db.db_connection() as conn:
+        return {row[1]: row for row in conn.execute(f"SELECT {', '.join(db.TRACKED_FIELDS)} FROM clan_members")}
+
+
+def test_first_sync_adds_everyone(db):
+    changes = db.update_or_create_members([member("#A"), member("#B")])
+    assert [m.tag for m in changes.added] == ["#A", "#B"]
+    assert not changes.updated and not changes.removed
+    assert set(stored_rows(db)) == {"#A", "#B"}
+
+
+def test_diff_reports_added_updated_removed(db):
+    db.update_or_create_members([member("#A"), member("#B"), member("#C")])
+
+    changes = db.update_or_create_members([
+        member("#A"),                       # beze změny
+        member("#B", trophies=5100),        # změna
+        member("#D"),                       # nový
+    ])
+
+    assert [m.tag for m in changes.added] == ["#D"]
+    assert [(m.tag, diff) for m, diff in changes.updated] == [("#B", [("trophies", 5000, 5100)])]
+    assert changes.removed == ["#C"]
+    assert set(stored_rows(db)) == {"#A", "#B", "#D"}
+    assert stored_rows(db)["#B"] == member("#B", trophies=5100).as_row()
+
+
+def test_unchanged_sync_is_empty(db):
+    members = [member("#A"), member("#B")]
+    db.update_or_create_members(members)
+    assert not db.update_or_create_members(members)
+
+
+def test_donations_are_stored_but_not_reported(db):
+    db.update_or_create_members([member("#A")])
+    changes = db.update_or_create_members([member("#A", donations=50)])
+    assert not changes
+    assert stored_rows(db)["#A"][db.TRACKED_FIELDS.index("donations")] == 50
+
+
+def test_write_failure_is_raised_and_rolled_back(db):
+    db.update_or_create_members([member("#A")])
+    duplicate = [member("#B"), dataclasses.replace(member("#B"), role="elder")]  # dvakrát stejný PRIMARY KEY
+
+    with pytest.raises(Exception):
+        db.update_or_create_members([member("#A", trophies=6000), *duplicate])
+
+    assert stored_rows(db) == {"#A": member("#A").as_row()}
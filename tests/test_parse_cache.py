@@ -0,0 +1,31 @@
+from collections import OrderedDict
+
+import api_handler
+from api_handler import ApiPayload
+
+
+def test_parse_once_reuses_model_and_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(api_handler, "_parsed", OrderedDict())
+    monkeypatch.setattr(api_handler, "MAX_CACHE_ENTRIES", 2)
+    built = []
+
+    def parse(endpoint: str, revision: int):
+        def build(payload):
+            built.append((endpoint, revision))
+            return object()
+        return api_handler._parse_once("test", ApiPayload({}, endpoint, revision), build)
+
+    war = parse("war", 1)
+    members = parse("members", 1)
+    assert parse("war", 1) is war                 # stejná revize → stejný model, war je teď nejčerstvější
+
+    parse("capital", 1)                           # plno → vypadne nejdéle nepoužitý (members)
+    assert parse("war", 1) is war
+    assert parse("members", 1) is not members
+    assert built == [("war", 1), ("members", 1), ("capital", 1), ("members", 1)]
+
+
+def test_payload_without_revision_is_not_memoized(monkeypatch):
+    monkeypatch.setattr(api_handler, "_parsed", OrderedDict())
+    models = [api_handler._parse_once("test", {}, lambda d: object()) for _ in range(2)]
+    assert models[0] is not models[1] and not api_handler._parsed
@@ -0,0 +1,76 @@
+import asyncio
+
+from api_handler import PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from test_api_cache import ENDPOINT, FakeApi, running
+
+
+def test_concurrent_requests_share_one_fetch():
+    api = FakeApi()
+    api.delay = 0.05
+
+    async def run():
+        async with running(api) as client:
+            responses = await asyncio.gather(*(client.get(ENDPOINT) for _ in range(3)))
+            assert len(api.requests) == 1 and client.coalesced == 2
+            assert all(resp.status == 200 and resp.data == api.body for resp in responses)
+            assert not client._inflight
+
+    asyncio.run(run())
+
+
+def test_different_priority_or_cache_is_not_coalesced():
+    api = FakeApi()
+    api.delay = 0.05
+
+    async def run():
+        async with running(api) as client:
+            background, interactive, cached = await asyncio.gather(
+                client.get(ENDPOINT, priority=PRIORITY_BACKGROUND),
+                client.get(ENDPOINT, priority=PRIORITY_INTERACTIVE),
+                client.get(ENDPOINT, cache=True),
+            )
+            assert len(api.requests) == 3 and client.coalesced == 0
+            assert background.revision is None and cached.revision is not None
+
+    asyncio.run(run())
+
+
+def test_cancelled_leader_does_not_cancel_waiters():
+    api = FakeApi()
+    api.delay = 0.05
+
+    async def run():
+        async with running(api) as client:
+            leader = asyncio.create_task(client.get(ENDPOINT))
+            await asyncio.sleep(0.01)
+            waiters = [asyncio.create_task(client.get(ENDPOINT)) for _ in range(3)]
+            await asyncio.sleep(0.01)
+
+            leader.cancel()
+            responses = await asyncio.gather(*waiters)
+
+            assert leader.cancelled()
+            assert all(resp.status == 200 and resp.data == api.body for resp in responses)
+            assert len(api.requests) == 2      # původní dotaz + jeden společný nový
+            assert not client._inflight
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_does_not_cancel_leader():
+    api = FakeApi()
+    api.delay = 0.05
+
+    async def run():
+        async with running(api) as client:
+            leader = asyncio.create_task(client.get(ENDPOINT))
+            await asyncio.sleep(0.01)
+            waiter = asyncio.create_task(client.get(ENDPOINT))
+            await asyncio.sleep(0.01)
+
+            waiter.cancel()
+            resp = await leader
+            assert waiter.cancelled()
+            assert resp.status == 200 and len(api.requests) == 1
+
+    asyncio.run(run())
@@ -0,0 +1,67 @@
+import asyncio
+import time
+
+from api_handler import TokenBucket, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+
+
+async def drain(bucket: TokenBucket):
+    while bucket.level >= 1:
+        await bucket.acquire()
+
+
+def test_burst_passes_without_waiting():
+    async def run():
+        bucket = TokenBucket(rate=1.0, capacity=5)
+        for _ in range(5):
+            await bucket.acquire()
+        assert bucket.throttled == 0
+
+    asyncio.run(run())
+
+
+def test_interactive_overtakes_queued_background():
+    async def run():
+        bucket = TokenBucket(rate=100.0, capacity=1)
+        await drain(bucket)
+        served = []
+
+        async def request(name: str, priority: int):
+            await bucket.acquire(priority)
+            served.append(name)
+
+        tasks = [asyncio.create_task(request("scheduler-1", PRIORITY_BACKGROUND)),
+                 asyncio.create_task(request("scheduler-2", PRIORITY_BACKGROUND))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request("slash", PRIORITY_INTERACTIVE)))
+        await asyncio.gather(*tasks)
+
+        assert served == ["slash", "scheduler-1", "scheduler-2"]
+        assert bucket.throttled == 3
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_does_not_consume_token():
+    async def run():
+        bucket = TokenBucket(rate=50.0, capacity=1)
+        await drain(bucket)
+        cancelled = asyncio.create_task(bucket.acquire(PRIORITY_INTERACTIVE))
+        waiting = asyncio.create_task(bucket.acquire(PRIORITY_BACKGROUND))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+
+        await asyncio.wait_for(waiting, timeout=1)
+        assert bucket.level < 1          # token dostal jen čekající požadavek
+
+    asyncio.run(run())
+
+
+def test_pause_blocks_all_lanes():
+    async def run():
+        bucket = TokenBucket(rate=1000.0, capacity=10)
+        bucket.pause(0.1)
+        started = time.monotonic()
+        await bucket.acquire(PRIORITY_INTERACTIVE)
+        assert time.monotonic() - started >= 0.09
+
+    asyncio.run(run())
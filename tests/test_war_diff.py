@@ -0,0 +1,108 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from coc_models import War
+from war_diff import WarDiffer, WarEventBus, NewWar, StateChanged, NewAttack
+
+OUR_TAG = "#US"
+START = "20260101T100000.000Z"
+
+
+def make_war(state: str, attacks: list[dict] = (), start_time: str = START) -> War:
+    def member(tag: str, position: int, member_attacks: list[dict]) -> dict:
+        return {"tag": tag, "name": tag, "mapPosition": position, "townhallLevel": 15, "attacks": member_attacks}
+
+    return War.from_api({
+        "state": state,
+        "teamSize": 1,
+        "startTime": start_time,
+        "clan": {"tag": OUR_TAG, "name": "us", "members": [member("#A", 1, list(attacks))]},
+        "opponent": {"tag": "#THEM", "name": "them", "members": [member("#X", 1, [])]},
+    }, OUR_TAG)
+
+
+def attack(order: int) -> dict:
+    return {"attackerTag": "#A", "defenderTag": "#X", "stars": 3, "destructionPercentage": 100, "order": order}
+
+
+def types_of(events) -> list[str]:
+    return [type(e).__name__ for e in events]
+
+
+def test_first_snapshot_emits_new_war_and_state():
+    differ = WarDiffer()
+    assert types_of(differ.diff(make_war("preparation"), START)) == ["NewWar", "StateChanged"]
+
+
+def test_committed_snapshot_is_not_reported_again():
+    differ = WarDiffer()
+    war = make_war("preparation")
+    differ.diff(war, START)
+    differ.commit(war, START)
+    assert differ.diff(make_war("preparation"), START) == []
+
+
+def test_new_attacks_follow_checkpoint():
+    differ = WarDiffer(START)
+    war = make_war("inWar", [attack(1), attack(2)])
+    events = [e for e in differ.diff(war, START) if isinstance(e, NewAttack)]
+    assert [e.attack.order for e in events] == [1, 2]
+
+    differ.checkpoint(1)
+    differ.commit(war, START)
+    events = [e for e in differ.diff(war, START) if isinstance(e, NewAttack)]
+    assert [e.attack.order for e in events] == [2]
+
+
+def test_new_war_resets_checkpoint_once():
+    differ = WarDiffer(START, last_order=5)
+    war = make_war("preparation", start_time="20260201T100000.000Z")
+    assert isinstance(differ.diff(war, "20260201T100000.000Z")[0], NewWar)
+    assert differ.last_order == 0
+
+    differ.checkpoint(3)
+    differ.diff(war, "20260201T100000.000Z")   # opakovaný diff bez commit
+    assert differ.last_order == 3
+
+
+def test_failed_state_handler_is_redelivered():
+    differ = WarDiffer(START)
+    bus = WarEventBus()
+    delivered = []
+    fail_next = False
+
+    async def on_state(event: StateChanged):
+        nonlocal fail_next
+        if fail_next:
+            fail_next = False
+            raise RuntimeError("Discord nedostupný")
+        delivered.append((event.previous, event.current))
+
+    bus.subscribe(StateChanged, on_state)
+
+    async def cycle(war: War):
+        failed = await bus.publish(differ.diff(war, START))
+        if not failed:
+            differ.commit(war, START)
+        return failed
+
+    async def run():
+        nonlocal fail_next
+        assert await cycle(make_war("preparation")) == []
+        delivered.clear()
+
+        # Přechod na inWar: první doručení selže, snapshot se nepotvrdí
+        fail_next = True
+        failed = await cycle(make_war("inWar"))
+        assert types_of(failed) == ["StateChanged"]
+        assert delivered == []
+
+        # Další snapshot stejného stavu přechod doručí znovu, po potvrzení už ne
+        assert await cycle(make_war("inWar")) == []
+        assert await cycle(make_war("inWar")) == []
+        assert delivered == [("preparation", "inWar")]
+
+    asyncio.run(run())
@@ -0,0 +1,133 @@
+import asyncio
+import time
+import types
+from datetime import datetime, timedelta
+
+import discord
+
+from test_member_sync import member
+
+WARNING_FORMAT = "%d/%m/%Y %H:%M"
+
+
+def at(days_ago: float) -> str:
+    return (datetime.now() - timedelta(days=days_ago)).strftime(WARNING_FORMAT)
+
+
+def test_legacy_string_timestamps_are_backfilled(db):
+    with db.db_connection() as conn:
+        conn.execute("INSERT INTO clan_warnings (coc_tag, date_time, reason, notified_at) VALUES (?, ?, ?, ?)",
+                     ("#A", "31/12/2025 23:59", "útok", "01/01/2026 08:00"))
+        conn.execute("INSERT INTO clan_warnings (coc_tag, date_time, reason) VALUES (?, ?, ?)",
+                     ("#B", "nesmysl", "útok"))
+
+    db.initialize_db()
+
+    with db.db_connection() as conn:
+        rows = dict((tag, (ts, notified_ts)) for tag, ts, notified_ts in
+                    conn.execute("SELECT coc_tag, ts, notified_ts FROM clan_warnings"))
+    assert rows["#A"] == (int(datetime(2025, 12, 31, 23, 59).timestamp()),
+                          int(datetime(2026, 1, 1, 8, 0).timestamp()))
+    assert rows["#B"][0] is not None and rows["#B"][1] is None   # neplatný čas → čas migrace
+
+
+def test_old_warnings_are_deleted_by_ts(db):
+    for tag, days_ago in (("#OLD", db.WARNING_RETENTION_DAYS + 2), ("#NEW", 1)):
+        db._insert_warning(tag, at(days_ago), "útok")
+
+    db._delete_old_warnings()
+
+    assert [tag for tag, _, _ in db.fetch_warnings()] == ["#NEW"]
+
+
+def test_warning_queries_use_indexes(db):
+    with db.db_connection() as conn:
+        def plan(sql: str, *params) -> str:
+            return " ".join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+
+        assert "idx_clan_warnings_ts" in plan("DELETE FROM clan_warnings WHERE ts <= ?", int(time.time()))
+        assert "idx_clan_warnings_tag_ts" in plan("SELECT * FROM clan_warnings WHERE coc_tag = ? ORDER BY ts", "#A")
+        assert "idx_coc_discord_links_tag" in plan("SELECT * FROM coc_discord_links WHERE coc_tag = ?", "#A")
+
+
+def per_user_reference(db) -> list[tuple[str, str, list[tuple[str, str]]]]:
+    """Původní logika (dotazy po hráčích) nad normalizovanými časy – referenční výsledek."""
+    result = []
+    with db.db_connection() as c:
+        tags = c.execute("SELECT coc_tag FROM clan_warnings GROUP BY coc_tag HAVING COUNT(*) >= ? ORDER BY coc_tag",
+                         (db.WARNING_NOTIFY_THRESHOLD,)).fetchall()
+        for (tag,) in tags:
+            last = c.execute("SELECT MAX(notified_ts) FROM clan_warnings WHERE coc_tag = ?", (tag,)).fetchone()[0]
+            recent = c.execute("SELECT date_time, reason FROM clan_warnings WHERE coc_tag = ? AND (? IS NULL OR ts > ?) "
+                               "ORDER BY ts, rowid", (tag, last, last)).fetchall()
+            if not recent:
+                continue
+            link = c.execute("SELECT coc_name, discord_name FROM coc_discord_links WHERE coc_tag = ? "
+                             "ORDER BY discord_name LIMIT 1", (tag,)).fetchone()
+            if link:
+                mention = f"<@{link[1]}>" if link[1] else link[0]
+            else:
+                name = c.execute("SELECT name FROM clan_members WHERE tag = ?", (tag,)).fetchone()
+                mention = f"@{name[0] if name else 'Neznámý hráč'}"
+            result.append((tag, mention, recent))
+    return result
+
+
+def seed_warnings(db):
+    db.update_or_create_members([member("#C", name="Cecílie")])
+    db.add_coc_link("222", "#A", "Alfa")
+    db.add_coc_link("111", "#A", "Alfa 2")             # dva Discord účty na jeden tag
+    db.add_coc_link("333", "#D", "Delta")
+
+    for days_ago in (6, 5, 4):
+        db._insert_warning("#A", at(days_ago), f"A {days_ago}")    # nikdy neoznámeno
+    for days_ago in (6, 5):
+        db._insert_warning("#B", at(days_ago), f"B {days_ago}")    # pod limitem
+    for days_ago in (6, 5, 4):
+        db._insert_warning("#C", at(days_ago), f"C {days_ago}")
+    for days_ago in (6, 5, 4):
+        db._insert_warning("#D", at(days_ago), f"D {days_ago}")
+    db._mark_warnings_notified(["#C", "#D"], at(3))
+    db._insert_warning("#C", at(1), "C 1")                         # nové po oznámení
+    for days_ago in (2, 6, 4):
+        db._insert_warning("#E", at(days_ago), f"E {days_ago}")    # vloženo mimo pořadí, neznámý hráč
+
+
+def test_collect_matches_per_user_logic(db):
+    seed_warnings(db)
+
+    collected = db._collect_exceeded_warnings()
+
+    assert collected == per_user_reference(db)
+    assert [(tag, mention, [reason for _, reason in recent]) for tag, mention, recent in collected] == [
+        ("#A", "<@111>", ["A 6", "A 5", "A 4"]),
+        ("#C", "@Cecílie", ["C 1"]),
+        ("#E", "@Neznámý hráč", ["E 6", "E 4", "E 2"]),
+    ]
+
+
+class FakeChannel:
+    def __init__(self, failing: set[str] = frozenset()):
+        self.failing = failing
+        self.sent: list[str] = []
+
+    async def send(self, msg: str):
+        tag = msg.splitlines()[1].strip("*")
+        if tag in self.failing:
+            raise discord.HTTPException(types.SimpleNamespace(status=500, reason="Server Error"), "nedostupné")
+        self.sent.append(tag)
+
+
+def test_notify_marks_only_delivered_tags(db):
+    seed_warnings(db)
+    channel = FakeChannel(failing={"#C"})
+    bot = types.SimpleNamespace(get_channel=lambda channel_id: channel)
+
+    asyncio.run(db.notify_warnings_exceed(bot))
+    assert sorted(channel.sent) == ["#A", "#E"]
+    assert [tag for tag, _, _ in db._collect_exceeded_warnings()] == ["#C"]
+
+    channel.failing = set()
+    asyncio.run(db.notify_warnings_exceed(bot))
+    assert sorted(channel.sent) == ["#A", "#C", "#E"]
+    assert db._collect_exceeded_warnings() == []
@@ -2,7 +2,7 @@ import discord
 import asyncio
 from datetime import datetime, timedelta
 
-from database import get_all_links, get_all_members
+from database import get_all_links, get_all_members, run_db
 from role_giver import update_roles
 
 from constants import (
@@ -156,7 +156,7 @@ async def succesful_verification(bot, user, verification_channel, selected_item,
     try:
         # Zapsání uživatele do databáze
         from database import add_coc_link
-        add_coc_link(user.id, coc_tag, coc_name)
+        await run_db(add_coc_link, user.id, coc_tag, coc_name)
         print(f"✅ [verification] Uživatel {user} zapsán do databáze coc_discord_links.")
     except Exception as e:
         print(f"❌ [verification] Chyba při zápisu do databáze: {e}")
@@ -217,7 +217,7 @@ async def update_role_when_new_member(bot, user):
     print(f"🔄 [verification] Updatím role pro uživatele {user}...")
     guild = bot.get_guild(bot.guild_object.id)  # Správně získáme guildu přes instanci bota
     links = get_all_links()
-    members = get_all_members()
+    members = await run_db(get_all_members)
     await update_roles(guild, links, members)
 
 async def process_verification(bot, player_data, user, verification_channel, selected_item=None):
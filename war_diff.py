@@ -0,0 +1,156 @@
+"""
+Porovnání dvou snapshotů války a typované události pro ClanWarHandler.
+
+`WarDiffer.diff` porovná aktuální War s předchozím snapshotem a vrátí seznam událostí
+(nová válka, změna stavu, nové útoky, změna soupisky, změna skóre/destrukce).
+`WarEventBus` je doručí posluchačům, kteří se přihlásili k danému typu události –
+status embed, feed útoků, připomínky a varování tak pracují jen tehdy, když se jich
+změna týká.
+
+Snapshot se stane „předchozím“ až po `commit` – volající ho zavolá jen po úspěšném
+doručení, takže události, jejichž posluchač selhal, vzniknou při dalším diffu znovu.
+Nové útoky se neurčují podle předchozího snapshotu, ale podle checkpointu `last_order`
+(posun až po úspěšném zpracování), takže po restartu se neztratí ani neopakují.
+"""
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+
+from coc_models import War, WarAttack
+
+
+# === Události ===
+@dataclass(slots=True)
+class WarEvent:
+    war: War                            # aktuální snapshot
+
+
+@dataclass(slots=True)
+class NewWar(WarEvent):
+    """Začala jiná válka (změnil se startTime) – checkpoint útoků je vynulovaný."""
+    start_time: str
+
+
+@dataclass(slots=True)
+class StateChanged(WarEvent):
+    previous: Optional[str]             # None = první snapshot po startu bota / nové válce
+    current: str
+
+
+@dataclass(slots=True)
+class NewAttack(WarEvent):
+    attack: WarAttack
+    is_ours: bool
+    is_repeat: bool                     # na obránce už dříve někdo útočil (oprava)
+
+
+@dataclass(slots=True)
+class MembersChanged(WarEvent):
+    added: list[str] = field(default_factory=list)      # tagy
+    removed: list[str] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class DestructionChanged(WarEvent):
+    """Změnily se souhrnné hodnoty (hvězdy, destrukce, počet útoků) některé ze stran."""
+    clan: tuple[int, float, int]        # (hvězdy, destrukce %, útoky)
+    opponent: tuple[int, float, int]
+
+
+def _totals(side) -> tuple[int, float, int]:
+    return side.stars, side.destruction, side.attacks
+
+
+# === Porovnání snapshotů ===
+class WarDiffer:
+    """Drží předchozí snapshot, startTime aktuální války a checkpoint zpracovaných útoků."""
+
+    def __init__(self, start_time: Optional[str] = None, last_order: int = 0):
+        self.previous: Optional[War] = None
+        self.start_time = start_time            # válka posledního potvrzeného snapshotu
+        self.last_order = last_order
+        self._order_start_time = start_time     # válka, ke které patří checkpoint `last_order`
+
+    def checkpoint(self, order: int):
+        """Útoky do `order` včetně jsou zpracované, další diff je už nevrátí."""
+        self.last_order = max(self.last_order, order)
+
+    def diff(self, war: War, start_time: Optional[str]) -> list[WarEvent]:
+        """
+        Vrátí události mezi předchozím a aktuálním snapshotem. Předchozí snapshot se nemění –
+        po úspěšném doručení událostí je potřeba zavolat `commit`.
+        """
+        events: list[WarEvent] = []
+        previous = self.previous
+        previous_state = previous.state if previous else None
+
+        if start_time and start_time != self._order_start_time:
+            # Checkpoint útoků patří ke staré válce → nová začíná od nuly (jen jednou,
+            # i když se NewWar kvůli chybě posluchače doručuje opakovaně)
+            self._order_start_time = start_time
+            self.last_order = 0
+
+        if start_time and start_time != self.start_time:
+            previous = None                 # soupiska ani skóre se mezi válkami neporovnávají
+            events.append(NewWar(war, start_time))
+
+        if previous is None or war.state != previous_state:
+            events.append(StateChanged(war, previous_state, war.state))
+
+        if previous is not None:
+            old_tags = {m.tag for side in (previous.clan, previous.opponent) for m in side.members}
+            new_tags = {m.tag for side in (war.clan, war.opponent) for m in side.members}
+            if old_tags != new_tags:
+                events.append(MembersChanged(war, sorted(new_tags - old_tags), sorted(old_tags - new_tags)))
+
+        for attack in war.attacks_after(self.last_order):
+            events.append(NewAttack(war, attack, war.is_ours(attack.attacker_tag), war.is_repeat_attack(attack)))
+
+        if previous is not None:
+            clan, opponent = _totals(war.clan), _totals(war.opponent)
+            if clan != _totals(previous.clan) or opponent != _totals(previous.opponent):
+                events.append(DestructionChanged(war, clan, opponent))
+
+        return events
+
+    def commit(self, war: War, start_time: Optional[str]):
+        """Potvrdí snapshot jako předchozí (volat až po úspěšném doručení událostí z `diff`)."""
+        self.previous = war
+        if start_time:
+            self.start_time = start_time
+
+
+# === Doručování událostí ===
+Handler = Callable[[WarEvent], Awaitable[None]]
+
+
+class WarEventBus:
+    """Asynchronní doručování událostí posluchačům podle typu události."""
+
+    def __init__(self):
+        self._handlers: dict[type, list[Handler]] = {}
+
+    def subscribe(self, event_type: type, handler: Handler) -> Callable[[], None]:
+        """Přihlásí `handler` k typu události. Vrací funkci pro odhlášení."""
+        self._handlers.setdefault(event_type, []).append(handler)
+        return lambda: self._handlers[event_type].remove(handler)
+
+    async def publish(self, events: list[WarEvent]) -> list[WarEvent]:
+        """
+        Doručí události v pořadí. Když posluchač selže, v této dávce už další události
+        nedostane (zachová se pořadí – např. útoky se pak zpracují znovu od checkpointu).
+        Vrací události, jejichž posluchač selhal (prázdný seznam = vše doručeno).
+        """
+        failed_handlers: set[Handler] = set()
+        failed_events: list[WarEvent] = []
+        for event in events:
+            for handler in list(self._handlers.get(type(event), [])):
+                if handler in failed_handlers:
+                    continue
+                try:
+                    await handler(event)
+                except Exception as e:
+                    failed_handlers.add(handler)
+                    failed_events.append(event)
+                    print(f"❌ [war_diff] Chyba v posluchači {getattr(handler, '__name__', handler)} "
+                          f"pro {type(event).__name__}: {e}")
+        return failed_events